@@ -3,6 +3,14 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the production entry point (see the Start Command in README.md):
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+
+Long-lived streams such as /api/v1/leaderboard/stream/ and the async
+/api/v1/ai-chat/ with its concurrency limiter need an event loop; under WSGI
+every stream holds a worker and the limiter limits nothing.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -112,6 +112,13 @@ else:
         }
     }
 
+# Cache
+# Defaults to a per-process memory cache; set CACHE_URL (e.g. redis://...) to share
+# cached state and invalidations between workers and management commands.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -149,7 +156,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -164,6 +171,9 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Add and check the user's token_version (see users/authentication.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
 }
 
 # CORS
@@ -209,3 +219,79 @@ if not DEBUG:
 # File Upload Settings - Increased for ZIP homework submissions
 FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
+
+# Leaderboard rank lookups (see game/ranking.py)
+LEADERBOARD_RANK_INDEX = env('LEADERBOARD_RANK_INDEX', default='game.ranking.InMemoryRankIndex')
+LEADERBOARD_RANK_INDEX_TTL = env.int('LEADERBOARD_RANK_INDEX_TTL', default=30)  # seconds
+
+# Typing attempt ingestion (see game/ingest.py): 'direct' or 'buffered'
+TYPING_INGEST_MODE = env('TYPING_INGEST_MODE', default='direct')
+TYPING_INGEST_BATCH_SIZE = env.int('TYPING_INGEST_BATCH_SIZE', default=200)
+TYPING_INGEST_MAX_DELAY = env.int('TYPING_INGEST_MAX_DELAY', default=5)  # seconds
+
+# Active season cache (see game/seasons.py)
+SEASON_CACHE_TIMEOUT = env.int('SEASON_CACHE_TIMEOUT', default=300)  # seconds
+
+# Live leaderboard stream (see game/live.py); serve through config.asgi
+LEADERBOARD_STREAM_INTERVAL = env.float('LEADERBOARD_STREAM_INTERVAL', default=1.0)  # seconds between updates
+LEADERBOARD_STREAM_REFRESH = env.int('LEADERBOARD_STREAM_REFRESH', default=15)  # max snapshot age
+LEADERBOARD_STREAM_MAX_SECONDS = env.int('LEADERBOARD_STREAM_MAX_SECONDS', default=300)  # clients reconnect after this
+LEADERBOARD_STREAM_TICKET_TTL = env.int('LEADERBOARD_STREAM_TICKET_TTL', default=30)  # seconds to open the stream with a ticket
+
+# Archived typing attempts of compacted seasons (see game/compaction.py)
+TYPING_ARCHIVE_DIR = env('TYPING_ARCHIVE_DIR', default=str(BASE_DIR / 'archives'))
+
+# Daily activity tracking (see users/activity.py)
+ACTIVITY_FLUSH_INTERVAL = env.int('ACTIVITY_FLUSH_INTERVAL', default=30)  # seconds between batched writes
+ACTIVITY_FLUSH_SIZE = env.int('ACTIVITY_FLUSH_SIZE', default=500)  # pending touches that force a flush
+
+# Cached JWT principal (see users/authentication.py). Off without a shared cache: invalidations
+# would only reach the worker that made the change
+PRINCIPAL_CACHE_TIMEOUT = env.int('PRINCIPAL_CACHE_TIMEOUT', default=60 if env('CACHE_URL', default='') else 0)  # seconds
+
+# Wall-clock time zone of group schedules (see users/schedule.py)
+SCHEDULE_TIME_ZONE = env('SCHEDULE_TIME_ZONE', default=TIME_ZONE)
+
+# Cached attendance reports per group and month (see users/reports.py)
+ATTENDANCE_REPORT_CACHE_TIMEOUT = env.int('ATTENDANCE_REPORT_CACHE_TIMEOUT', default=3600)  # seconds
+
+# Streaming CSV/XLSX exports (see users/exports.py)
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)  # rows fetched per database round trip
+
+# Admin dashboard metrics snapshots (see users/metrics.py)
+DASHBOARD_METRICS_MAX_AGE = env.int('DASHBOARD_METRICS_MAX_AGE', default=300)  # seconds before a refresh is triggered
+DASHBOARD_METRICS_CACHE_TIMEOUT = env.int('DASHBOARD_METRICS_CACHE_TIMEOUT', default=3600)  # seconds
+
+# AI tutor chat (see users/ai.py); serve /api/v1/ai-chat/ through config.asgi
+AI_PROVIDER = env('AI_PROVIDER', default='users.ai.GeminiProvider')  # or users.ai.EchoProvider locally
+GEMINI_API_KEY = env('GEMINI_API_KEY', default='')
+GEMINI_MODEL = env('GEMINI_MODEL', default='gemini-pro')
+AI_MAX_CONCURRENCY = env.int('AI_MAX_CONCURRENCY', default=4)  # provider calls at once per process
+AI_MAX_QUEUE = env.int('AI_MAX_QUEUE', default=16)  # chats waiting for a slot before new ones are turned away
+AI_QUEUE_TIMEOUT = env.int('AI_QUEUE_TIMEOUT', default=10)  # seconds to wait for a slot
+AI_RESPONSE_TIMEOUT = env.int('AI_RESPONSE_TIMEOUT', default=30)  # seconds to wait for each chunk of a reply
+
+# AI tutor reply cache (see users/ai_cache.py)
+AI_CACHE_SIZE = env.int('AI_CACHE_SIZE', default=1000)  # replies kept per process; 0 disables the cache
+AI_CACHE_TTL = env.int('AI_CACHE_TTL', default=3600)  # seconds
+AI_CACHE_SIMILARITY = env.float('AI_CACHE_SIMILARITY', default=0)  # shingle overlap for near-duplicates; 0 is exact only
+
+# Token-bucket throttles (see users/throttling.py): "<n>/<period>" allows bursts of n, refilled at n per period
+TOKEN_BUCKET_STORE = env('TOKEN_BUCKET_STORE', default='local')  # 'cache' shares buckets between workers
+TOKEN_BUCKET_RATES = {
+    'ai_chat': {
+        'user': env('AI_CHAT_USER_RATE', default='10/min'),
+        'global': env('AI_CHAT_GLOBAL_RATE', default='120/min'),
+    },
+    'typing_attempt': {
+        'user': env('TYPING_ATTEMPT_USER_RATE', default='20/min'),
+        'global': env('TYPING_ATTEMPT_GLOBAL_RATE', default='2000/min'),
+    },
+    'blog_like': {
+        'user': env('BLOG_LIKE_USER_RATE', default='30/min'),
+    },
+}
+
+# Teacher coin awards (see users/views.py)
+COIN_AWARD_MAX_AMOUNT = env.int('COIN_AWARD_MAX_AMOUNT', default=100)  # per student, single and bulk awards
+COIN_AWARD_MAX_TOTAL = env.int('COIN_AWARD_MAX_TOTAL', default=2000)  # all students of one bulk award
@@ -0,0 +1,12 @@
+import django_filters
+from .models import HomeworkSubmission
+
+
+class HomeworkSubmissionFilter(django_filters.FilterSet):
+    course = django_filters.NumberFilter(field_name='lesson__course')
+    created_after = django_filters.DateFilter(field_name='created_at', lookup_expr='date__gte')
+    created_before = django_filters.DateFilter(field_name='created_at', lookup_expr='date__lte')
+
+    class Meta:
+        model = HomeworkSubmission
+        fields = ['status', 'lesson', 'student', 'reviewed_by']
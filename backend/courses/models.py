@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
@@ -15,6 +16,8 @@ class Course(models.Model):
     description = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    # Bumped on every change to the course or its lessons; course and lesson ETags derive from it
+    content_version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ['order']
@@ -22,6 +25,18 @@ class Course(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            self.bump_content_version(self.pk)
+            self.refresh_from_db(fields=['content_version'])
+
+    @staticmethod
+    def bump_content_version(course_id):
+        # Queryset update() and bulk_update() skip this; call it after them
+        Course.objects.filter(pk=course_id).update(content_version=F('content_version') + 1)
+
 class Lesson(models.Model):
     class Type(models.TextChoices):
         NORMAL = 'NORMAL', 'Normal'
@@ -42,6 +57,21 @@ class Lesson(models.Model):
     def __str__(self):
         return f"{self.course.title} - {self.index}. {self.title}"
 
+    def save(self, *args, **kwargs):
+        if self.pk:
+            # Moving a lesson changes the course it left too
+            Course.objects.filter(lessons=self).exclude(pk=self.course_id).update(
+                content_version=F('content_version') + 1
+            )
+        super().save(*args, **kwargs)
+        Course.bump_content_version(self.course_id)
+
+    def delete(self, *args, **kwargs):
+        course_id = self.course_id
+        result = super().delete(*args, **kwargs)
+        Course.bump_content_version(course_id)
+        return result
+
 class Progress(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='progress', on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
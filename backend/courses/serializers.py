@@ -18,6 +18,19 @@ class CourseDetailSerializer(serializers.ModelSerializer):
         model = Course
         fields = ['id', 'title', 'description', 'order', 'lessons']
 
+class LessonOutlineSerializer(serializers.ModelSerializer):
+    """Lesson without its texts, for course navigation"""
+    class Meta:
+        model = Lesson
+        fields = ['id', 'index', 'title', 'lesson_type']
+
+class CourseOutlineSerializer(serializers.ModelSerializer):
+    lessons = LessonOutlineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'order', 'content_version', 'lessons']
+
 class ProgressSerializer(serializers.ModelSerializer):
     course_title = serializers.ReadOnlyField(source='course.title')
     
@@ -164,6 +164,53 @@ class CourseViewSetTest(APITestCase):
         response = self.client.delete(self.course_detail_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_course_detail_hides_inactive_lessons(self):
+        Lesson.objects.create(course=self.course, index=2, title='Draft', is_active=False)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.course_detail_url)
+        self.assertEqual([lesson['index'] for lesson in response.data['lessons']], [1])
+
+    def test_outline_omits_lesson_texts(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('course-outline', args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['lessons'],
+            [{'id': self.lesson.id, 'index': 1, 'title': 'Test Lesson', 'lesson_type': 'NORMAL'}]
+        )
+
+    def test_course_etag_revalidation(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('course-outline', args=[self.course.id])
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, self.client.get(self.course_detail_url)['ETag'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.lesson.title = 'Renamed'
+        self.lesson.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lesson_etag_changes_with_course_content(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('lesson-detail', args=[self.lesson.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Lesson.objects.create(course=self.course, index=2, title='Next Lesson')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_inactive_course_outline_not_found(self):
+        self.course.is_active = False
+        self.course.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('course-outline', args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class ProgressViewSetTest(APITestCase):
     def setUp(self):
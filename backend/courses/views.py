@@ -4,21 +4,75 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control
+from users.models import CoinLedgerEntry
+from users.ledger import post_entry
+from users.exports import export_response, rows
+from .filters import HomeworkSubmissionFilter
 from .models import Course, Lesson, Progress, HomeworkSubmission
 from .serializers import (
-    CourseSerializer, CourseDetailSerializer, LessonSerializer,
+    CourseSerializer, CourseDetailSerializer, CourseOutlineSerializer, LessonSerializer,
     ProgressSerializer, HomeworkSubmissionSerializer, AdminHomeworkSubmissionSerializer
 )
 
+def conditional_response(request, etag, build):
+    """
+    304 when If-None-Match matches the strong `etag`, otherwise build() with
+    the ETag set. Clients must revalidate before reusing a copy.
+    """
+    etag = f'"{etag}-{request.accepted_renderer.format}"'
+    response = get_conditional_response(request, etag=etag) or build()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    retrieve returns the course with the texts of its active lessons; outline
+    returns only lesson ids, indexes, titles and types, and lesson texts are
+    then fetched one at a time from lessons/<id>/. Both carry a strong ETag
+    made from Course.content_version, checked before any lesson is loaded.
+    """
     queryset = Course.objects.filter(is_active=True)
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        lessons = Lesson.objects.filter(is_active=True)
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(Prefetch('lessons', queryset=lessons))
+        if self.action == 'outline':
+            lessons = lessons.only('id', 'course_id', 'index', 'title', 'lesson_type')
+            return queryset.prefetch_related(Prefetch('lessons', queryset=lessons))
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return CourseDetailSerializer
+        if self.action == 'outline':
+            return CourseOutlineSerializer
         return CourseSerializer
 
+    def _versioned(self, request, representation, build):
+        pk = self.kwargs['pk']
+        try:
+            version = Course.objects.filter(pk=pk, is_active=True).values_list('content_version', flat=True).first()
+        except (TypeError, ValueError):
+            version = None
+        if version is None:
+            return build()  # 404
+        return conditional_response(request, f'course-{pk}-{representation}-v{version}', build)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._versioned(request, 'full', lambda: super(CourseViewSet, self).retrieve(request, *args, **kwargs))
+
+    @action(detail=True, methods=['get'])
+    def outline(self, request, pk=None):
+        return self._versioned(request, 'outline', lambda: Response(self.get_serializer(self.get_object()).data))
+
 
 class AdminCourseViewSet(viewsets.ModelViewSet):
     """ViewSet for admins to manage courses"""
@@ -43,6 +97,19 @@ class LessonViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            return super(LessonViewSet, self).retrieve(request, *args, **kwargs)
+
+        pk = self.kwargs['pk']
+        try:
+            version = self.get_queryset().filter(pk=pk).values_list('course__content_version', flat=True).first()
+        except (TypeError, ValueError):
+            version = None
+        if version is None:
+            return build()  # 404
+        return conditional_response(request, f'lesson-{pk}-v{version}', build)
+
 class ProgressViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ProgressSerializer
@@ -93,6 +160,7 @@ class AdminHomeworkSubmissionViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAdminUser]
     serializer_class = AdminHomeworkSubmissionSerializer
     queryset = HomeworkSubmission.objects.all().select_related('student', 'lesson', 'lesson__course', 'reviewed_by').order_by('-created_at')
+    filterset_class = HomeworkSubmissionFilter
 
     @action(detail=True, methods=['post'], url_path='accept')
     def accept_submission(self, request, pk=None):
@@ -114,9 +182,10 @@ class AdminHomeworkSubmissionViewSet(viewsets.ModelViewSet):
 
             # Award coins to student
             if coins_reward > 0:
-                student = submission.student
-                student.coins += coins_reward
-                student.save()
+                post_entry(
+                    submission.student, coins_reward,
+                    CoinLedgerEntry.Reason.HOMEWORK, reference=f'homework:{submission.id}'
+                )
 
         return Response(self.get_serializer(submission).data)
 
@@ -154,3 +223,21 @@ class AdminHomeworkSubmissionViewSet(viewsets.ModelViewSet):
         submission.save()
 
         return Response(self.get_serializer(submission).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream submissions as CSV/XLSX. Takes ?status=, ?course=, ?lesson=, ?student=, ?reviewed_by=,
+        ?created_after= / ?created_before= and ?filetype=
+        """
+        submissions = self.filter_queryset(self.get_queryset()).order_by('id')
+        header = [
+            'id', 'student_id', 'student', 'course', 'lesson_id', 'lesson', 'file', 'status',
+            'teacher_comment', 'coins_reward', 'reviewed_by', 'reviewed_at', 'created_at'
+        ]
+        data = rows(
+            submissions, 'id', 'student_id', 'student__username', 'lesson__course__title', 'lesson_id',
+            'lesson__title', 'file', 'status', 'teacher_comment', 'coins_reward', 'reviewed_by__username',
+            'reviewed_at', 'created_at'
+        )
+        return export_response(request, 'homework-submissions', header, data)
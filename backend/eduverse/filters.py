@@ -0,0 +1,12 @@
+import django_filters
+from .models import HomeworkSubmission
+
+
+class HomeworkSubmissionFilter(django_filters.FilterSet):
+    graded = django_filters.BooleanFilter(field_name='graded_at', lookup_expr='isnull', exclude=True)
+    submitted_after = django_filters.DateFilter(field_name='submitted_at', lookup_expr='date__gte')
+    submitted_before = django_filters.DateFilter(field_name='submitted_at', lookup_expr='date__lte')
+
+    class Meta:
+        model = HomeworkSubmission
+        fields = ['homework', 'student', 'graded_by']
@@ -1,11 +1,31 @@
 from rest_framework import serializers
+from users.entitlements import is_entitled
 from .models import EduverseCategory, EduverseVideo, BlogPost, Homework, HomeworkSubmission
 
 class EduverseVideoSerializer(serializers.ModelSerializer):
+    """Premium videos of users without premium come back with is_locked and no video_url"""
+    is_locked = serializers.SerializerMethodField()
+
     class Meta:
         model = EduverseVideo
         fields = '__all__'
 
+    def _entitled(self):
+        # Checked once per response; nested and list serializers share the root's context
+        if 'entitled' not in self.context:
+            request = self.context.get('request')
+            self.context['entitled'] = request is not None and is_entitled(request.user)
+        return self.context['entitled']
+
+    def get_is_locked(self, obj):
+        return obj.is_premium and not self._entitled()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data['is_locked']:
+            data['video_url'] = None
+        return data
+
 class EduverseCategorySerializer(serializers.ModelSerializer):
     videos = EduverseVideoSerializer(many=True, read_only=True)
     
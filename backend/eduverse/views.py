@@ -10,6 +10,9 @@ from .serializers import (
 )
 
 from users.permissions import IsPremiumUser
+from users.exports import export_response, rows
+from users.throttling import BlogLikeThrottle
+from .filters import HomeworkSubmissionFilter
 
 class EduverseCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = EduverseCategory.objects.all()
@@ -30,7 +33,7 @@ class BlogPostViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=[BlogLikeThrottle])
     def like(self, request, pk=None):
         post = self.get_object()
         post.like_count += 1
@@ -72,6 +75,7 @@ class HomeworkSubmissionViewSet(viewsets.ModelViewSet):
     serializer_class = HomeworkSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
+    filterset_class = HomeworkSubmissionFilter
     
     def get_queryset(self):
         user = self.request.user
@@ -172,7 +176,7 @@ class HomeworkSubmissionViewSet(viewsets.ModelViewSet):
         # Award points to student
         student = submission.student
         student.points += points_earned
-        student.save()
+        student.save(update_fields=['points'])
         
         return Response({
             'message': 'Homework graded successfully',
@@ -180,6 +184,26 @@ class HomeworkSubmissionViewSet(viewsets.ModelViewSet):
             'student_total_points': student.points
         })
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream submissions as CSV/XLSX (teachers get their own homework's, admins all).
+        Takes ?homework=, ?student=, ?graded=, ?graded_by=, ?submitted_after= / ?submitted_before= and ?filetype=
+        """
+        if request.user.role not in ['TEACHER', 'ADMIN']:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        submissions = self.filter_queryset(self.get_queryset()).order_by('id')
+        header = [
+            'id', 'homework_id', 'homework', 'student_id', 'student', 'content', 'file_url',
+            'points_earned', 'submitted_at', 'graded_at', 'graded_by', 'feedback'
+        ]
+        data = rows(
+            submissions, 'id', 'homework_id', 'homework__title', 'student_id', 'student__username', 'content',
+            'file_url', 'points_earned', 'submitted_at', 'graded_at', 'graded_by__username', 'feedback'
+        )
+        return export_response(request, 'eduverse-submissions', header, data)
+
 
 # Admin ViewSets for Eduverse Management
 
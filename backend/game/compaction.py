@@ -0,0 +1,125 @@
+"""
+Compaction of completed seasons.
+
+compact_season() rolls every student's attempts of a completed season up into
+one TypingSeasonSummary row, writes the raw rows to a gzipped CSV file in
+TYPING_ARCHIVE_DIR and deletes them, so TypingAttempt only holds seasons that
+are still being played.
+"""
+import csv
+import gzip
+import os
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import Floor
+from django.utils import timezone
+from .models import TypingAttempt, TypingSeasonSummary
+
+HISTOGRAM_BUCKET = 10  # WPM per histogram bucket
+
+ARCHIVE_FIELDS = [
+    'id', 'student_id', 'season_id', 'wpm', 'accuracy', 'score', 'energy_gain', 'coins_reward', 'created_at'
+]
+
+
+def archive_path(season):
+    archive_dir = Path(getattr(settings, 'TYPING_ARCHIVE_DIR', settings.BASE_DIR / 'archives'))
+    return archive_dir / f'typing_attempts_season_{season.id}.csv.gz'
+
+
+def export_attempts(season, path):
+    """Write the season's raw attempts to a gzipped CSV file. Returns the row count."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    rows = (
+        TypingAttempt.objects
+        .filter(season=season)
+        .order_by('id')
+        .values_list(*ARCHIVE_FIELDS)
+        .iterator(chunk_size=2000)
+    )
+
+    count = 0
+    with gzip.open(tmp_path, 'wt', newline='') as archive:
+        writer = csv.writer(archive)
+        writer.writerow(ARCHIVE_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        archive.flush()
+        os.fsync(archive.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def build_summaries(season):
+    attempts = TypingAttempt.objects.filter(season=season)
+
+    histograms = {}
+    buckets = (
+        attempts
+        .annotate(bucket=Floor(F('wpm') / HISTOGRAM_BUCKET))
+        .values('student', 'bucket')
+        .annotate(count=Count('id'))
+    )
+    for row in buckets:
+        key = str(int(row['bucket']) * HISTOGRAM_BUCKET)
+        histograms.setdefault(row['student'], {})[key] = row['count']
+
+    totals = (
+        attempts
+        .values('student')
+        .annotate(
+            attempts_count=Count('id'),
+            total_score=Sum('score'),
+            best_score=Max('score'),
+            best_wpm=Max('wpm'),
+            avg_wpm=Avg('wpm'),
+            avg_accuracy=Avg('accuracy'),
+            first_attempt_at=Min('created_at'),
+            last_attempt_at=Max('created_at')
+        )
+    )
+    return [
+        TypingSeasonSummary(
+            season=season,
+            student_id=row['student'],
+            attempts_count=row['attempts_count'],
+            total_score=round(row['total_score'], 2),
+            best_score=row['best_score'],
+            best_wpm=row['best_wpm'],
+            avg_wpm=round(row['avg_wpm'], 2),
+            avg_accuracy=round(row['avg_accuracy'], 2),
+            wpm_histogram=histograms.get(row['student'], {}),
+            first_attempt_at=row['first_attempt_at'],
+            last_attempt_at=row['last_attempt_at']
+        )
+        for row in totals
+    ]
+
+
+def compact_season(season, keep_raw=False):
+    """
+    Summarize and archive a completed season.
+    Returns (summaries_count, archived_count); archived_count is 0 with keep_raw.
+    """
+    if not season.is_completed:
+        raise ValueError(f'Season "{season.title}" is not completed')
+    if season.compacted_at:
+        raise ValueError(f'Season "{season.title}" is already compacted')
+
+    archived = 0
+    if not keep_raw:
+        # The archive is written before anything is deleted; a failed run is simply repeated
+        archived = export_attempts(season, archive_path(season))
+
+    with transaction.atomic():
+        summaries = TypingSeasonSummary.objects.bulk_create(build_summaries(season), batch_size=500)
+        if not keep_raw:
+            TypingAttempt.objects.filter(season=season).delete()
+        season.compacted_at = timezone.now()
+        season.save(update_fields=['compacted_at'])
+
+    return len(summaries), archived
@@ -0,0 +1,146 @@
+"""
+Buffered ingestion of typing attempts.
+
+With TYPING_INGEST_MODE = 'buffered' a POST to /typing/ only inserts a
+PendingTypingAttempt row. Pending rows are moved into TypingAttempt in
+batches by flush_pending(): one bulk_create, one standings update and one
+ledger posting for the coins of the batch and one UPDATE per student with
+their latest and best WPM.
+
+Once TYPING_INGEST_BATCH_SIZE attempts were queued by this process or
+TYPING_INGEST_MAX_DELAY seconds passed since its last flush, the request that
+notices moves one batch after it commits, so no single request drains a
+backlog. Run the flush_typing_attempts command from cron to bound the delay
+when traffic stops or outpaces the request path. Pending rows live in the database, so nothing is
+lost if a worker dies before flushing.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from users.models import User, CoinLedgerEntry
+from users.ledger import post_entries
+from .models import PendingTypingAttempt, TypingAttempt
+from .scoring import calculate_score, calculate_coins_reward
+from .standings import record_attempts
+from .percentiles import record_bests, GLOBAL_SCOPE
+
+_state_lock = threading.Lock()
+_state = {'queued': 0, 'last_flush': time.monotonic()}
+
+
+def is_buffered():
+    return getattr(settings, 'TYPING_INGEST_MODE', 'direct') == 'buffered'
+
+
+def enqueue_attempt(student, season, wpm, accuracy):
+    """Stage an attempt and return an unsaved TypingAttempt describing it"""
+    pending = PendingTypingAttempt.objects.create(
+        student=student,
+        season=season,
+        wpm=wpm,
+        accuracy=accuracy,
+        score=calculate_score(wpm, accuracy),
+        coins_reward=calculate_coins_reward(wpm, accuracy)
+    )
+
+    with _state_lock:
+        _state['queued'] += 1
+        due = (
+            _state['queued'] >= getattr(settings, 'TYPING_INGEST_BATCH_SIZE', 200)
+            or time.monotonic() - _state['last_flush'] >= getattr(settings, 'TYPING_INGEST_MAX_DELAY', 5)
+        )
+        if due:
+            _state['queued'] = 0
+            _state['last_flush'] = time.monotonic()
+    if due:
+        transaction.on_commit(flush_batch)
+
+    return TypingAttempt(
+        student=student,
+        season=season,
+        wpm=pending.wpm,
+        accuracy=pending.accuracy,
+        score=pending.score,
+        coins_reward=pending.coins_reward,
+        created_at=pending.created_at
+    )
+
+
+def flush_batch(batch_size=None, wait=False):
+    """
+    Move one batch of pending attempts into TypingAttempt. Returns the number
+    moved. Rows locked by a concurrent flush are skipped unless `wait` is set.
+    """
+    batch_size = batch_size or getattr(settings, 'TYPING_INGEST_BATCH_SIZE', 200)
+
+    with transaction.atomic():
+        pending = list(
+            PendingTypingAttempt.objects
+            .select_for_update(skip_locked=not wait)
+            .order_by('id')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        attempts = TypingAttempt.objects.bulk_create([
+            TypingAttempt(
+                student_id=row.student_id,
+                season_id=row.season_id,
+                wpm=row.wpm,
+                accuracy=row.accuracy,
+                score=row.score,
+                coins_reward=row.coins_reward,
+                created_at=row.created_at
+            )
+            for row in pending
+        ])
+        record_attempts(attempts)
+
+        # Rows are ordered by id, so the last one seen per student is the latest attempt
+        deltas = {}
+        for row in pending:
+            coins, best, _ = deltas.get(row.student_id, (0, 0, 0))
+            deltas[row.student_id] = (coins + row.coins_reward, max(best, row.wpm), row.wpm)
+
+        previous_bests = dict(
+            User.objects
+            .select_for_update()
+            .filter(pk__in=deltas)
+            .values_list('pk', 'max_wpm')
+        )
+        record_bests(GLOBAL_SCOPE, [
+            (previous_bests.get(student_id, 0), best)
+            for student_id, (_, best, _) in deltas.items()
+        ])
+
+        post_entries(
+            {student_id: coins for student_id, (coins, _, _) in deltas.items()},
+            CoinLedgerEntry.Reason.TYPING,
+            reference=f'typing-batch:{attempts[0].id}-{attempts[-1].id}'
+        )
+        for student_id, (_, best, last) in deltas.items():
+            User.objects.filter(pk=student_id).update(
+                last_wpm=last,
+                max_wpm=Greatest(F('max_wpm'), best)
+            )
+
+        PendingTypingAttempt.objects.filter(id__in=[row.id for row in pending]).delete()
+
+    return len(pending)
+
+
+def flush_pending(batch_size=None, wait=False):
+    """
+    Flush pending attempts until none are left. Returns the number moved.
+    With `wait`, rows held by a concurrent flush are waited for rather than
+    skipped, so every attempt staged before the call has been moved on return.
+    """
+    total = 0
+    while True:
+        moved = flush_batch(batch_size, wait=wait)
+        total += moved
+        if not moved:
+            return total
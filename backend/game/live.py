@@ -0,0 +1,157 @@
+"""
+Server-sent leaderboard updates.
+
+Writers call broker.publish(season_id) after their standings change commits.
+Each stream wakes up every LEADERBOARD_STREAM_INTERVAL seconds and, when the
+season's version moved, sends the diff against what that client last saw, so
+a burst of attempts turns into one update per interval. The top-N snapshot
+for a version is computed once and shared by every subscriber.
+
+The broker lives in process memory. Attempts handled by other workers do not
+publish here, so snapshots are also refreshed every
+LEADERBOARD_STREAM_REFRESH seconds.
+
+Browser EventSource connections can not send an Authorization header, and an
+access token in the URL would end up in access logs and browser history. The
+client instead asks leaderboard/stream/ticket/ for a signed ticket that only
+opens this season's stream and expires after LEADERBOARD_STREAM_TICKET_TTL
+seconds.
+"""
+import asyncio
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, StreamingHttpResponse
+from users.models import User
+from users.authentication import authenticate_jwt
+from .ranking import competition_ranks
+from .seasons import get_active_season
+from .standings import top_standings
+
+STREAM_SIZE = 10
+TICKET_SALT = 'game.live.leaderboard-stream'
+
+
+def issue_stream_ticket(user, season):
+    return signing.dumps({'user': user.pk, 'season': season.id, 'token_version': user.token_version}, salt=TICKET_SALT)
+
+
+def stream_ticket_user(ticket, season):
+    """Whether `ticket` is unexpired, for `season` and held by a user who may still sign in"""
+    try:
+        data = signing.loads(ticket, salt=TICKET_SALT, max_age=getattr(settings, 'LEADERBOARD_STREAM_TICKET_TTL', 30))
+    except signing.BadSignature:
+        return False
+    if data.get('season') != season.id:
+        return False
+    return User.objects.filter(pk=data.get('user'), is_active=True, token_version=data.get('token_version')).exists()
+
+
+class LeaderboardBroker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._snapshots = {}
+
+    def publish(self, season_id):
+        with self._lock:
+            self._versions[season_id] = self._versions.get(season_id, 0) + 1
+
+    def version(self, season_id):
+        return self._versions.get(season_id, 0)
+
+    def snapshot(self, season, version, max_age):
+        """Top entries of a season, recomputed at most once per version (or after max_age seconds)"""
+        with self._lock:
+            cached = self._snapshots.get(season.id)
+            if cached and cached[0] == version and time.monotonic() - cached[1] < max_age:
+                return cached[2]
+
+        standings = list(top_standings(season, limit=STREAM_SIZE))
+        ranks = competition_ranks([(s.student_id, s.total_score) for s in standings], 1, 0)
+        entries = [
+            {
+                'rank': rank,
+                'user_id': standing.student_id,
+                'username': standing.student.username,
+                'avatar_url': standing.student.avatar_url,
+                'total_score': round(standing.total_score, 2),
+                'attempts_count': standing.attempts_count,
+                'best_wpm': round(standing.best_wpm, 2)
+            }
+            for (rank, _, _), standing in zip(ranks, standings)
+        ]
+
+        with self._lock:
+            self._snapshots[season.id] = (version, time.monotonic(), entries)
+        return entries
+
+
+broker = LeaderboardBroker()
+
+
+def leaderboard_diff(old, new):
+    """Entries that are new or changed rank/score, and user ids that left the list"""
+    previous = {entry['user_id']: entry for entry in old}
+    changed = [entry for entry in new if previous.get(entry['user_id']) != entry]
+    current_ids = {entry['user_id'] for entry in new}
+    removed = [user_id for user_id in previous if user_id not in current_ids]
+    return {'changed': changed, 'removed': removed}
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _stream(season):
+    interval = getattr(settings, 'LEADERBOARD_STREAM_INTERVAL', 1)
+    refresh = getattr(settings, 'LEADERBOARD_STREAM_REFRESH', 15)
+    deadline = time.monotonic() + getattr(settings, 'LEADERBOARD_STREAM_MAX_SECONDS', 300)
+    snapshot = sync_to_async(broker.snapshot)
+
+    entries = await snapshot(season, broker.version(season.id), refresh)
+    yield 'retry: 3000\n\n'
+    yield _event('snapshot', {'season_id': season.id, 'leaderboard': entries})
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+
+        current = await sync_to_async(get_active_season)()
+        if current is None or current.id != season.id:
+            yield _event('season_ended', {'season_id': season.id})
+            return
+
+        latest = await snapshot(season, broker.version(season.id), refresh)
+        diff = leaderboard_diff(entries, latest)
+        if diff['changed'] or diff['removed']:
+            yield _event('diff', diff)
+            entries = latest
+
+        yield _event('tick', {'time_remaining': season.time_remaining()})
+
+
+async def leaderboard_stream(request):
+    """
+    GET /api/v1/leaderboard/stream/?ticket=<stream ticket>, or with an Authorization header.
+    Streams `snapshot`, then `diff`, `tick` and `season_ended` events.
+    Clients reconnect, with a new ticket, when the stream closes after
+    LEADERBOARD_STREAM_MAX_SECONDS.
+    """
+    ticket = request.GET.get('ticket')
+    if not ticket and await sync_to_async(authenticate_jwt)(request) is None:
+        return HttpResponse(status=401)
+
+    season = await sync_to_async(get_active_season)()
+    if season is None:
+        return HttpResponse(status=204)
+    if ticket and not await sync_to_async(stream_ticket_user)(ticket, season):
+        return HttpResponse(status=401)
+
+    response = StreamingHttpResponse(_stream(season), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
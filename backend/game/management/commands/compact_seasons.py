@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.models import Season, TypingAttempt
+from game.compaction import compact_season, archive_path
+
+
+class Command(BaseCommand):
+    help = 'Roll up attempts of completed seasons into summaries and archive the raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, help='Only compact this season ID')
+        parser.add_argument('--keep-raw', action='store_true', help='Write summaries but keep raw attempts')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be compacted')
+
+    def handle(self, *args, **options):
+        seasons = Season.objects.filter(is_completed=True, compacted_at__isnull=True)
+        if options['season']:
+            seasons = seasons.filter(id=options['season'])
+            if not seasons.exists():
+                raise CommandError(f'Season {options["season"]} is not completed or already compacted')
+
+        if not seasons.exists():
+            self.stdout.write(self.style.SUCCESS('No seasons to compact.'))
+            return
+
+        for season in seasons:
+            if options['dry_run']:
+                count = TypingAttempt.objects.filter(season=season).count()
+                self.stdout.write(f'Would compact "{season.title}": {count} attempts')
+                continue
+
+            summaries, archived = compact_season(season, keep_raw=options['keep_raw'])
+            message = f'Compacted "{season.title}": {summaries} summaries'
+            if archived:
+                message += f', {archived} attempts archived to {archive_path(season)}'
+            self.stdout.write(self.style.SUCCESS(message))
@@ -1,8 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from game.models import Season, TypingAttempt, Wallet
-from users.models import User
-from django.db.models import Sum
+from game.models import Season
+from game.settlement import settle_season
 from datetime import timedelta
 
 class Command(BaseCommand):
@@ -29,35 +28,16 @@ class Command(BaseCommand):
         for season in expired_seasons:
             self.stdout.write(f'Processing season: {season.title}')
             
-            # 1. Distribute rewards to top 3 players
-            top_players = (
-                TypingAttempt.objects
-                .filter(season=season)
-                .values('student')
-                .annotate(total_score=Sum('score'))
-                .order_by('-total_score')[:3]
-            )
+            # 1. Rank, pay every reward tier and mark as completed
+            results, settled = settle_season(season, default_rewards={"1": 300, "2": 200, "3": 100})
+            if not settled:
+                self.stdout.write(f'  Season "{season.title}" was already settled, skipping.')
+                continue
 
-            rewards = season.rewards_json or {"1": 300, "2": 200, "3": 100}
-            
-            for idx, player_data in enumerate(top_players, 1):
-                try:
-                    student = User.objects.get(id=player_data['student'])
-                    points_reward = int(rewards.get(str(idx), 0))
-                    
-                    # Add points/coins
-                    student.coins += points_reward
-                    student.points += points_reward # Add to lifetime points too
-                    student.save()
-                    
-                    self.stdout.write(f'  Awarded {points_reward} coins to {student.username} (Rank {idx})')
-                except User.DoesNotExist:
-                    continue
+            for result in results:
+                if result.reward > 0:
+                    self.stdout.write(f'  Awarded {result.reward} coins to {result.student.username} (Rank {result.rank})')
 
-            # 2. Mark as completed
-            season.is_active = False
-            season.is_completed = True
-            season.save()
             self.stdout.write(self.style.SUCCESS(f'Season "{season.title}" completed.'))
 
         # 3. Create new season
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from game.ingest import flush_pending
+
+
+class Command(BaseCommand):
+    help = 'Move typing attempts staged by buffered ingestion into the attempts table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Attempts per transaction')
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help='Keep flushing at this interval')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            moved = flush_pending(options['batch_size'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f'Flushed {moved} attempts in {elapsed:.2f}s'))
+
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.models import Season
+from game.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild season standings from raw typing attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, help='Only rebuild this season ID')
+        parser.add_argument('--all', action='store_true', help='Rebuild every season, not only active ones')
+
+    def handle(self, *args, **options):
+        if options['season']:
+            seasons = Season.objects.filter(id=options['season'])
+            if not seasons.exists():
+                raise CommandError(f'Season {options["season"]} does not exist')
+        elif options['all']:
+            seasons = Season.objects.all()
+        else:
+            seasons = Season.objects.filter(is_active=True)
+
+        for season in seasons:
+            count = rebuild_standings(season)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} standings for "{season.title}"'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from game.models import Season, SeasonStanding
+from game.percentiles import rebuild_histogram, season_scope, GLOBAL_SCOPE
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild WPM percentile histograms from user and season bests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every season, not only active ones')
+
+    def handle(self, *args, **options):
+        bests = User.objects.filter(max_wpm__gt=0).values_list('max_wpm', flat=True).iterator(chunk_size=2000)
+        count = rebuild_histogram(GLOBAL_SCOPE, bests)
+        self.stdout.write(self.style.SUCCESS(f'Global histogram: {count} students'))
+
+        seasons = Season.objects.all() if options['all'] else Season.objects.filter(is_active=True)
+        for season in seasons:
+            bests = (
+                SeasonStanding.objects
+                .filter(season=season, best_wpm__gt=0)
+                .values_list('best_wpm', flat=True)
+                .iterator(chunk_size=2000)
+            )
+            count = rebuild_histogram(season_scope(season.id), bests)
+            self.stdout.write(self.style.SUCCESS(f'"{season.title}" histogram: {count} students'))
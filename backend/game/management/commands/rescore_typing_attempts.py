@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.models import Season, TypingAttempt
+
+
+class Command(BaseCommand):
+    help = 'Recompute score and coins_reward of stored typing attempts with the current formulas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, action='append', help='Only rescore this season ID (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Rescore every stored attempt')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Attempts per read/write chunk')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+        parser.add_argument('--samples', type=int, default=10, help='Changed attempts to list in the report')
+
+    def handle(self, *args, **options):
+        try:
+            from game.rescoring import rescore_attempts
+            import numpy  # noqa: F401
+        except ImportError:
+            raise CommandError('numpy is required for rescoring: pip install numpy')
+
+        if options['season']:
+            missing = set(options['season']) - set(Season.objects.filter(id__in=options['season']).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f'Season(s) {", ".join(map(str, sorted(missing)))} do not exist')
+            attempts = TypingAttempt.objects.filter(season_id__in=options['season'])
+        elif options['all']:
+            attempts = TypingAttempt.objects.all()
+        else:
+            raise CommandError('Pass --season ID or --all')
+
+        stats = rescore_attempts(
+            attempts,
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            samples=options['samples']
+        )
+
+        verb = 'Would change' if options['dry_run'] else 'Changed'
+        self.stdout.write(
+            f'{verb} {stats["changed"]} of {stats["rows"]} attempts '
+            f'in {stats["elapsed"]:.2f}s ({stats["rows_per_second"]:.0f} rows/s)'
+        )
+        self.stdout.write(f'Score delta: {stats["score_delta"]:+.2f}, coins_reward delta: {stats["coins_delta"]:+d}')
+        for season_id, count in sorted(stats['changed_by_season'].items()):
+            self.stdout.write(f'  season {season_id}: {count} scores changed')
+        for sample in stats['samples']:
+            self.stdout.write(
+                f'  #{sample["id"]} wpm={sample["wpm"]:g} accuracy={sample["accuracy"]:g} '
+                f'score {sample["score"][0]:g} -> {sample["score"][1]:g}, '
+                f'coins {sample["coins_reward"][0]} -> {sample["coins_reward"][1]}'
+            )
+
+        if options['dry_run']:
+            return
+        for season in stats['rebuilt_seasons']:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt standings for "{season.title}"'))
+        if stats['coins_delta']:
+            self.stdout.write(self.style.WARNING('Coins already paid to students were not adjusted'))
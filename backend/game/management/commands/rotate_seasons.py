@@ -2,8 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from game.models import Season
-from users.models import User
-from django.db.models import Sum
+from game.settlement import settle_season
 
 
 class Command(BaseCommand):
@@ -21,42 +20,18 @@ class Command(BaseCommand):
             if today > active_season.end_date:
                 self.stdout.write(f'Season "{active_season.title}" has ended. Distributing rewards...')
                 
-                # Import here to avoid circular imports
-                from game.models import TypingAttempt
+                results, settled = settle_season(active_season, default_rewards={"1": 50, "2": 30, "3": 20})
                 
-                # Get top 3 players
-                top_players = (
-                    TypingAttempt.objects
-                    .filter(season=active_season)
-                    .values('student')
-                    .annotate(total_score=Sum('score'))
-                    .order_by('-total_score')[:3]
-                )
-                
-                rewards = active_season.rewards_json or {"1": 50, "2": 30, "3": 20}
-                
-                for idx, player_data in enumerate(top_players, 1):
-                    try:
-                        student = User.objects.get(id=player_data['student'])
-                        coins_reward = int(rewards.get(str(idx), 0))
-                        
-                        student.coins += coins_reward
-                        student.save()
-                        
+                for result in results:
+                    if result.reward > 0:
                         self.stdout.write(
                             self.style.SUCCESS(
-                                f'  Rank {idx}: {student.username} - {player_data["total_score"]:.2f} points - Awarded {coins_reward} coins'
+                                f'  Rank {result.rank}: {result.student.username} - {result.total_score:.2f} points - Awarded {result.reward} coins'
                             )
                         )
-                    except User.DoesNotExist:
-                        continue
-                
-                # Mark season as completed
-                active_season.is_active = False
-                active_season.is_completed = True
-                active_season.save()
                 
-                self.stdout.write(self.style.SUCCESS(f'Season "{active_season.title}" completed!'))
+                if settled:
+                    self.stdout.write(self.style.SUCCESS(f'Season "{active_season.title}" completed!'))
                 
                 # Create new season
                 self.create_new_season(today)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_standings(apps, schema_editor):
+    TypingAttempt = apps.get_model('game', 'TypingAttempt')
+    SeasonStanding = apps.get_model('game', 'SeasonStanding')
+    totals = (
+        TypingAttempt.objects
+        .filter(season__isnull=False)
+        .values('season', 'student')
+        .annotate(total_score=Sum('score'), attempts_count=Count('id'), best_wpm=Max('wpm'))
+    )
+    SeasonStanding.objects.bulk_create([
+        SeasonStanding(
+            season_id=row['season'],
+            student_id=row['student'],
+            total_score=row['total_score'] or 0,
+            attempts_count=row['attempts_count'],
+            best_wpm=row['best_wpm'] or 0
+        )
+        for row in totals
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_season_is_completed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeasonStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_score', models.FloatField(default=0)),
+                ('attempts_count', models.PositiveIntegerField(default=0)),
+                ('best_wpm', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='game.season')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='season_standings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['season', '-total_score'], name='standing_season_score_idx')],
+                'unique_together': {('season', 'student')},
+            },
+        ),
+        migrations.RunPython(backfill_standings, migrations.RunPython.noop),
+    ]
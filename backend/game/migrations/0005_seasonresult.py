@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_seasonstanding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeasonResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('total_score', models.FloatField()),
+                ('attempts_count', models.PositiveIntegerField()),
+                ('best_wpm', models.FloatField()),
+                ('reward', models.PositiveIntegerField(default=0, help_text='Coins and points paid for this rank')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='game.season')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='season_results', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['rank', 'student_id'],
+                'unique_together': {('season', 'student')},
+            },
+        ),
+    ]
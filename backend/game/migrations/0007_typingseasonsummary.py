@@ -0,0 +1,41 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_pendingtypingattempt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='season',
+            name='compacted_at',
+            field=models.DateTimeField(blank=True, help_text='When raw attempts were rolled up and archived', null=True),
+        ),
+        migrations.CreateModel(
+            name='TypingSeasonSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts_count', models.PositiveIntegerField()),
+                ('total_score', models.FloatField()),
+                ('best_score', models.FloatField()),
+                ('best_wpm', models.FloatField()),
+                ('avg_wpm', models.FloatField()),
+                ('avg_accuracy', models.FloatField()),
+                ('wpm_histogram', models.JSONField(default=dict, help_text='Attempts per 10 WPM bucket, e.g. {"40": 3, "50": 7}')),
+                ('first_attempt_at', models.DateTimeField()),
+                ('last_attempt_at', models.DateTimeField()),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='typing_summaries', to='game.season')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='typing_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('season', 'student')},
+            },
+        ),
+    ]
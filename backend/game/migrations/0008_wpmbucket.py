@@ -0,0 +1,47 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:40
+
+from collections import Counter
+from django.db import migrations, models
+
+
+def backfill_histograms(apps, schema_editor):
+    # Same bucketing as game.percentiles.bucket_for
+    User = apps.get_model('users', 'User')
+    SeasonStanding = apps.get_model('game', 'SeasonStanding')
+    WpmBucket = apps.get_model('game', 'WpmBucket')
+
+    def buckets(scope, bests):
+        counts = Counter(min(int(wpm // 5), 40) for wpm in bests)
+        return [WpmBucket(scope=scope, bucket=bucket, count=count) for bucket, count in counts.items()]
+
+    rows = buckets('global', User.objects.filter(max_wpm__gt=0).values_list('max_wpm', flat=True))
+    season_bests = {}
+    for season_id, best_wpm in SeasonStanding.objects.filter(best_wpm__gt=0).values_list('season_id', 'best_wpm'):
+        season_bests.setdefault(season_id, []).append(best_wpm)
+    for season_id, bests in season_bests.items():
+        rows += buckets(f'season:{season_id}', bests)
+    WpmBucket.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_typingseasonsummary'),
+        ('users', '0008_add_max_wpm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WpmBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'bucket')},
+            },
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
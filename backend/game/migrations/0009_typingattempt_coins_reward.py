@@ -0,0 +1,46 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+def coins_reward(wpm, accuracy):
+    # game.scoring.calculate_coins_reward as of this migration; kept here so
+    # replaying it writes the rewards that were actually paid
+    reward = 0
+    if accuracy >= 50:
+        reward = max(1, int((wpm / 10) * (accuracy / 100)))
+    if wpm >= 60 and accuracy >= 90:
+        reward += 5
+    elif wpm >= 40 and accuracy >= 80:
+        reward += 2
+    return reward
+
+
+def backfill_coins_reward(apps, schema_editor):
+    TypingAttempt = apps.get_model('game', 'TypingAttempt')
+
+    batch = []
+    for attempt in TypingAttempt.objects.only('id', 'wpm', 'accuracy').iterator(chunk_size=2000):
+        attempt.coins_reward = coins_reward(attempt.wpm, attempt.accuracy)
+        batch.append(attempt)
+        if len(batch) >= 2000:
+            TypingAttempt.objects.bulk_update(batch, ['coins_reward'])
+            batch = []
+    if batch:
+        TypingAttempt.objects.bulk_update(batch, ['coins_reward'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_wpmbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='typingattempt',
+            name='coins_reward',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_coins_reward, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_typingattempt_coins_reward'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seasonstanding',
+            index=models.Index(fields=['season', 'updated_at'], name='standing_season_updated_idx'),
+        ),
+    ]
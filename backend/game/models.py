@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 import datetime
+from .scoring import calculate_score
 
 class Season(models.Model):
     title = models.CharField(max_length=100)
@@ -10,6 +11,7 @@ class Season(models.Model):
     rewards_json = models.JSONField(default=dict) # { "1": 300, "2": 200 ... }
     is_active = models.BooleanField(default=True)
     is_completed = models.BooleanField(default=False)
+    compacted_at = models.DateTimeField(null=True, blank=True, help_text="When raw attempts were rolled up and archived")
 
     def time_remaining(self):
         """Returns seconds until season ends"""
@@ -32,18 +34,106 @@ class TypingAttempt(models.Model):
     accuracy = models.FloatField()
     score = models.FloatField(default=0)
     energy_gain = models.IntegerField(default=0)
-    created_at = models.DateTimeField(auto_now_add=True)
+    coins_reward = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
 
     def save(self, *args, **kwargs):
         # basic score calc if not set
         if not self.score:
-            self.score = round(self.wpm * (self.accuracy / 100), 2)
+            self.score = calculate_score(self.wpm, self.accuracy)
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.student.username} - {self.score}"
 
+class PendingTypingAttempt(models.Model):
+    """Staging row for a typing attempt accepted in buffered ingest mode (see game/ingest.py)"""
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='pending_typing_attempts', on_delete=models.CASCADE)
+    season = models.ForeignKey(Season, blank=True, null=True, on_delete=models.SET_NULL)
+    wpm = models.FloatField()
+    accuracy = models.FloatField()
+    score = models.FloatField()
+    coins_reward = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.student_id} - {self.score} (pending)"
+
+class SeasonStanding(models.Model):
+    """Running per-season totals for a student, kept in sync with TypingAttempt"""
+    season = models.ForeignKey(Season, related_name='standings', on_delete=models.CASCADE)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='season_standings', on_delete=models.CASCADE)
+    total_score = models.FloatField(default=0)
+    attempts_count = models.PositiveIntegerField(default=0)
+    best_wpm = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['season', 'student']
+        indexes = [
+            models.Index(fields=['season', '-total_score'], name='standing_season_score_idx'),
+            # Incremental rank index sync (see game/ranking.py)
+            models.Index(fields=['season', 'updated_at'], name='standing_season_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.season.title}: {self.total_score}"
+
+class SeasonResult(models.Model):
+    """Frozen final standing of a student, written once when a season is settled"""
+    season = models.ForeignKey(Season, related_name='results', on_delete=models.CASCADE)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='season_results', on_delete=models.CASCADE)
+    rank = models.PositiveIntegerField()
+    total_score = models.FloatField()
+    attempts_count = models.PositiveIntegerField()
+    best_wpm = models.FloatField()
+    reward = models.PositiveIntegerField(default=0, help_text="Coins and points paid for this rank")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['rank', 'student_id']
+        unique_together = ['season', 'student']
+
+    def __str__(self):
+        return f"{self.season.title} #{self.rank}: {self.student.username}"
+
+class TypingSeasonSummary(models.Model):
+    """Roll-up of a student's attempts in a compacted season (see game/compaction.py)"""
+    season = models.ForeignKey(Season, related_name='typing_summaries', on_delete=models.CASCADE)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='typing_summaries', on_delete=models.CASCADE)
+    attempts_count = models.PositiveIntegerField()
+    total_score = models.FloatField()
+    best_score = models.FloatField()
+    best_wpm = models.FloatField()
+    avg_wpm = models.FloatField()
+    avg_accuracy = models.FloatField()
+    wpm_histogram = models.JSONField(default=dict, help_text='Attempts per 10 WPM bucket, e.g. {"40": 3, "50": 7}')
+    first_attempt_at = models.DateTimeField()
+    last_attempt_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['season', 'student']
+
+    def __str__(self):
+        return f"{self.student.username} - {self.season.title} ({self.attempts_count} attempts)"
+
+class WpmBucket(models.Model):
+    """
+    Number of students whose best WPM falls into one histogram bucket.
+    scope is "global" for User.max_wpm or "season:<id>" for season bests (see game/percentiles.py).
+    """
+    scope = models.CharField(max_length=32)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['scope', 'bucket']
+
+    def __str__(self):
+        return f"{self.scope} [{self.bucket}]: {self.count}"
+
 class Wallet(models.Model):
+    """Legacy balance table, no longer written. Coins live on User.coins and the ledger in users/ledger.py."""
     student = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='wallet', on_delete=models.CASCADE)
     coins = models.IntegerField(default=0)
     energy = models.IntegerField(default=100)
@@ -0,0 +1,103 @@
+"""
+WPM percentiles from bucketed histograms.
+
+WpmBucket rows count students per BUCKET_WIDTH-WPM bucket, for everyone's
+User.max_wpm ("global") and for every season's best WPM ("season:<id>").
+Writers move a student between buckets when their best improves, so a
+percentile query reads one histogram (MAX_BUCKET + 1 rows) instead of
+sorting the user table. rebuild_wpm_percentiles recomputes the histograms
+from scratch.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import F
+from .models import WpmBucket
+
+BUCKET_WIDTH = 5
+MAX_BUCKET = 40  # everything from 200 WPM up shares the last bucket
+GLOBAL_SCOPE = 'global'
+
+RANK_BANDS = [
+    (99, 'top 1%'),
+    (90, 'top 10%'),
+    (75, 'top 25%'),
+    (50, 'top 50%'),
+    (0, 'bottom 50%'),
+]
+
+
+def season_scope(season_id):
+    return f'season:{season_id}'
+
+
+def bucket_for(wpm):
+    return min(int(wpm // BUCKET_WIDTH), MAX_BUCKET)
+
+
+def record_bests(scope, changes):
+    """
+    Move students between buckets. `changes` holds (old_best, new_best) pairs;
+    an old best of 0 means the student was not counted yet.
+    """
+    deltas = Counter()
+    for old_best, new_best in changes:
+        if new_best <= old_best:
+            continue
+        if old_best > 0:
+            deltas[bucket_for(old_best)] -= 1
+        deltas[bucket_for(new_best)] += 1
+
+    deltas = {bucket: delta for bucket, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        WpmBucket.objects.bulk_create(
+            [WpmBucket(scope=scope, bucket=bucket) for bucket in deltas],
+            ignore_conflicts=True
+        )
+        for bucket, delta in deltas.items():
+            WpmBucket.objects.filter(scope=scope, bucket=bucket).update(count=F('count') + delta)
+
+
+def histogram(scope):
+    counts = [0] * (MAX_BUCKET + 1)
+    for bucket, count in WpmBucket.objects.filter(scope=scope).values_list('bucket', 'count'):
+        counts[bucket] = count
+    return counts
+
+
+def percentile(scope, wpm):
+    """Share of counted students (0-100) typing slower than `wpm`, or None without data"""
+    counts = histogram(scope)
+    total = sum(counts)
+    if not total or wpm <= 0:
+        return None
+
+    bucket = bucket_for(wpm)
+    below = sum(counts[:bucket])
+    # Assume students are spread evenly inside the bucket
+    if bucket < MAX_BUCKET:
+        below += counts[bucket] * (wpm - bucket * BUCKET_WIDTH) / BUCKET_WIDTH
+    return round(min(below / total * 100, 100), 1)
+
+
+def rank_band(value):
+    if value is None:
+        return None
+    for threshold, label in RANK_BANDS:
+        if value >= threshold:
+            return label
+    return RANK_BANDS[-1][1]
+
+
+def rebuild_histogram(scope, bests):
+    """Replace a histogram with one built from an iterable of best WPM values"""
+    counts = Counter(bucket_for(wpm) for wpm in bests if wpm > 0)
+    with transaction.atomic():
+        WpmBucket.objects.filter(scope=scope).delete()
+        WpmBucket.objects.bulk_create([
+            WpmBucket(scope=scope, bucket=bucket, count=count)
+            for bucket, count in counts.items()
+        ])
+    return sum(counts.values())
@@ -0,0 +1,180 @@
+"""
+Rank lookups over season standings.
+
+get_rank_index() returns the backend configured by LEADERBOARD_RANK_INDEX.
+The default InMemoryRankIndex keeps a SortedList per season in the worker
+process, so ranks, windows and score changes cost O(log n). Every
+LEADERBOARD_RANK_INDEX_TTL seconds it applies the standings updated since its
+last sync (by SeasonStanding.updated_at), so other workers' writes show up
+within that bound; the whole season is reloaded only when rows were removed.
+DatabaseRankIndex answers the same questions with indexed COUNT queries and
+is exact across processes.
+
+Ranks use competition ranking: students with equal totals share a rank.
+"""
+import datetime
+import threading
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from sortedcontainers import SortedList
+from .models import SeasonStanding
+
+# Re-read rows stamped this long before the last sync: a transaction that
+# started earlier may have committed after it
+SYNC_OVERLAP = datetime.timedelta(seconds=10)
+
+
+def competition_ranks(entries, first_rank, start):
+    """Attach competition ranks to consecutive (student_id, total_score) pairs"""
+    ranked = []
+    previous_score = None
+    rank = first_rank
+    for offset, (student_id, total_score) in enumerate(entries):
+        if previous_score is not None and total_score != previous_score:
+            rank = start + offset + 1
+        ranked.append((rank, student_id, total_score))
+        previous_score = total_score
+    return ranked
+
+
+class RankIndex:
+    """Interface shared by rank index backends"""
+
+    def rank(self, season_id, student_id):
+        """Return the student's rank in the season or None if they have no standing"""
+        raise NotImplementedError
+
+    def window(self, season_id, student_id, size):
+        """Return [(rank, student_id, total_score)] for `size` neighbours on each side"""
+        raise NotImplementedError
+
+    def set_score(self, season_id, student_id, total):
+        """Record a student's committed season total"""
+
+    def invalidate(self, season_id=None):
+        """Drop cached state for one season, or for all seasons"""
+
+
+class InMemoryRankIndex(RankIndex):
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'LEADERBOARD_RANK_INDEX_TTL', 30)
+        self._lock = threading.Lock()
+        self._seasons = {}
+
+    def _load(self, season_id):
+        synced_at = timezone.now()
+        rows = SeasonStanding.objects.filter(season_id=season_id).values_list('student_id', 'total_score')
+        scores = dict(rows)
+        keys = SortedList((-score, student_id) for student_id, score in scores.items())
+        return {'scores': scores, 'keys': keys, 'checked_at': time.monotonic(), 'synced_at': synced_at}
+
+    def _sync(self, season_id, state):
+        synced_at = timezone.now()
+        standings = SeasonStanding.objects.filter(season_id=season_id)
+        changed = standings.filter(updated_at__gte=state['synced_at'] - SYNC_OVERLAP)
+        for student_id, total in changed.values_list('student_id', 'total_score'):
+            self._set(state, student_id, total)
+        if standings.count() != len(state['scores']):
+            return self._load(season_id)  # rows were removed, e.g. by rebuild_standings()
+        state['checked_at'] = time.monotonic()
+        state['synced_at'] = synced_at
+        return state
+
+    def _season(self, season_id):
+        state = self._seasons.get(season_id)
+        if state is None:
+            state = self._load(season_id)
+        elif time.monotonic() - state['checked_at'] > self.ttl:
+            state = self._sync(season_id, state)
+        self._seasons[season_id] = state
+        return state
+
+    @staticmethod
+    def _set(state, student_id, total):
+        old = state['scores'].get(student_id)
+        if old == total:
+            return
+        if old is not None:
+            state['keys'].remove((-old, student_id))
+        state['scores'][student_id] = total
+        state['keys'].add((-total, student_id))
+
+    def rank(self, season_id, student_id):
+        with self._lock:
+            state = self._season(season_id)
+            score = state['scores'].get(student_id)
+            if score is None:
+                return None
+            return state['keys'].bisect_left((-score,)) + 1
+
+    def window(self, season_id, student_id, size):
+        with self._lock:
+            state = self._season(season_id)
+            score = state['scores'].get(student_id)
+            if score is None:
+                return []
+            keys = state['keys']
+            position = keys.bisect_left((-score, student_id))
+            start = max(0, position - size)
+            entries = [(sid, -neg_score) for neg_score, sid in keys[start:position + size + 1]]
+            first_rank = keys.bisect_left((-entries[0][1],)) + 1
+        return competition_ranks(entries, first_rank, start)
+
+    def set_score(self, season_id, student_id, total):
+        # An absolute total stays right even if the season was synced since the commit
+        with self._lock:
+            state = self._seasons.get(season_id)
+            if state is not None:
+                self._set(state, student_id, total)
+
+    def invalidate(self, season_id=None):
+        with self._lock:
+            if season_id is None:
+                self._seasons.clear()
+            else:
+                self._seasons.pop(season_id, None)
+
+
+class DatabaseRankIndex(RankIndex):
+
+    def _standing(self, season_id, student_id):
+        return (
+            SeasonStanding.objects
+            .filter(season_id=season_id, student_id=student_id)
+            .values_list('total_score', flat=True)
+            .first()
+        )
+
+    def rank(self, season_id, student_id):
+        score = self._standing(season_id, student_id)
+        if score is None:
+            return None
+        return SeasonStanding.objects.filter(season_id=season_id, total_score__gt=score).count() + 1
+
+    def window(self, season_id, student_id, size):
+        score = self._standing(season_id, student_id)
+        if score is None:
+            return []
+        standings = SeasonStanding.objects.filter(season_id=season_id)
+        position = standings.filter(
+            Q(total_score__gt=score) | Q(total_score=score, student_id__lt=student_id)
+        ).count()
+        start = max(0, position - size)
+        entries = list(
+            standings
+            .order_by('-total_score', 'student_id')
+            .values_list('student_id', 'total_score')[start:position + size + 1]
+        )
+        first_rank = standings.filter(total_score__gt=entries[0][1]).count() + 1
+        return competition_ranks(entries, first_rank, start)
+
+
+@lru_cache(maxsize=None)
+def get_rank_index():
+    backend = getattr(settings, 'LEADERBOARD_RANK_INDEX', 'game.ranking.InMemoryRankIndex')
+    return import_string(backend)()
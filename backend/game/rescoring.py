@@ -0,0 +1,102 @@
+"""
+Bulk re-scoring of stored typing attempts after a formula change.
+
+Attempts are read in id order, chunk by chunk, and the formulas from
+game.scoring are applied to whole chunks with NumPy. Only rows whose score or
+coins_reward changed are written back, with one bulk_update per chunk.
+Standings of seasons whose scores moved are rebuilt afterwards.
+
+Coins already paid are not adjusted: the new coins_reward is stored on the
+attempt and the total difference is reported.
+"""
+import time
+from collections import Counter
+from django.db import transaction
+from .models import Season, TypingAttempt
+from .scoring import score_array, coins_reward_array
+from .standings import rebuild_standings
+
+FIELDS = ['id', 'season_id', 'wpm', 'accuracy', 'score', 'coins_reward']
+
+
+def _chunks(attempts, chunk_size):
+    # Keyset pagination keeps every read short, so chunks can be written between reads
+    last_id = 0
+    while True:
+        chunk = list(attempts.filter(id__gt=last_id).order_by('id').values_list(*FIELDS)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def rescore_attempts(attempts=None, chunk_size=5000, dry_run=False, samples=10):
+    """
+    Recompute score and coins_reward of `attempts` (a TypingAttempt queryset).
+    Returns a dict of counts, deltas, sample changes and timing.
+    """
+    import numpy as np
+
+    if attempts is None:
+        attempts = TypingAttempt.objects.all()
+
+    stats = {
+        'rows': 0,
+        'changed': 0,
+        'score_delta': 0.0,
+        'coins_delta': 0,
+        'changed_by_season': Counter(),
+        'samples': [],
+        'rebuilt_seasons': [],
+    }
+    started = time.monotonic()
+
+    for chunk in _chunks(attempts, chunk_size):
+        ids, season_ids, wpm, accuracy, score, coins = (np.array(column) for column in zip(*chunk))
+        wpm = wpm.astype(float)
+        accuracy = accuracy.astype(float)
+        new_score = score_array(wpm, accuracy)
+        new_coins = coins_reward_array(wpm, accuracy)
+
+        changed = (np.abs(new_score - score.astype(float)) > 1e-9) | (new_coins != coins)
+        stats['rows'] += len(chunk)
+        if not changed.any():
+            continue
+
+        index = np.flatnonzero(changed)
+        stats['changed'] += len(index)
+        stats['score_delta'] += float((new_score[index] - score[index]).sum())
+        stats['coins_delta'] += int((new_coins[index] - coins[index]).sum())
+        for i in index:
+            score_moved = abs(new_score[i] - score[i]) > 1e-9
+            if score_moved and season_ids[i] is not None:
+                stats['changed_by_season'][int(season_ids[i])] += 1
+            if len(stats['samples']) < samples:
+                stats['samples'].append({
+                    'id': int(ids[i]),
+                    'wpm': float(wpm[i]),
+                    'accuracy': float(accuracy[i]),
+                    'score': (float(score[i]), float(new_score[i])),
+                    'coins_reward': (int(coins[i]), int(new_coins[i])),
+                })
+
+        if not dry_run:
+            with transaction.atomic():
+                TypingAttempt.objects.bulk_update(
+                    [
+                        TypingAttempt(id=int(ids[i]), score=float(new_score[i]), coins_reward=int(new_coins[i]))
+                        for i in index
+                    ],
+                    ['score', 'coins_reward']
+                )
+
+    stats['elapsed'] = time.monotonic() - started
+    stats['rows_per_second'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+
+    if not dry_run:
+        # Compacted seasons have no raw attempts left, so they never show up here
+        for season in Season.objects.filter(id__in=stats['changed_by_season'], compacted_at__isnull=True):
+            rebuild_standings(season)
+            stats['rebuilt_seasons'].append(season)
+
+    return stats
@@ -0,0 +1,42 @@
+"""
+Score and coin reward formulas for typing attempts.
+
+calculate_score / calculate_coins_reward score one attempt when it is saved.
+score_array / coins_reward_array are the same formulas over NumPy arrays,
+used by the rescore_typing_attempts command; keep both versions in step.
+"""
+
+
+def calculate_score(wpm, accuracy):
+    return round(wpm * (accuracy / 100), 2)
+
+
+def calculate_coins_reward(wpm, accuracy):
+    # Base coins: 1 coin per 10 WPM, multiplied by accuracy percentage
+    coins_reward = 0
+    if accuracy >= 50:
+        coins_reward = max(1, int((wpm / 10) * (accuracy / 100)))
+    
+    # Bonus for high performance
+    if wpm >= 60 and accuracy >= 90:
+        coins_reward += 5  # Excellent performance
+    elif wpm >= 40 and accuracy >= 80:
+        coins_reward += 2  # Good performance
+    
+    return coins_reward
+
+
+def score_array(wpm, accuracy):
+    import numpy as np
+    return np.round(wpm * (accuracy / 100), 2)
+
+
+def coins_reward_array(wpm, accuracy):
+    import numpy as np
+    base = np.where(accuracy >= 50, np.maximum(1, np.trunc((wpm / 10) * (accuracy / 100))), 0)
+    bonus = np.select(
+        [(wpm >= 60) & (accuracy >= 90), (wpm >= 40) & (accuracy >= 80)],
+        [5, 2],
+        default=0
+    )
+    return (base + bonus).astype(np.int64)
@@ -0,0 +1,44 @@
+"""
+Cached lookup of the active season.
+
+The cached entry never outlives the season's end_date boundary, and it is
+dropped whenever a Season row is saved or deleted (see game/signals.py), so
+end_season, complete_seasons and rotate_seasons are picked up without extra
+calls. Invalidation from a management command only reaches web workers when
+CACHE_URL points at a shared cache; with the default per-process cache the
+boundary timeout and SEASON_CACHE_TIMEOUT bound the staleness.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from .models import Season
+
+CACHE_KEY = 'game:active-season'
+
+# Re-check often once the season is past its end date and waiting to be rotated
+EXPIRED_SEASON_TIMEOUT = 10
+
+
+def _timeout(season):
+    timeout = getattr(settings, 'SEASON_CACHE_TIMEOUT', 300)
+    if season is None:
+        return timeout
+    remaining = season.time_remaining()
+    if remaining <= 0:
+        return EXPIRED_SEASON_TIMEOUT
+    return min(timeout, remaining)
+
+
+def get_active_season():
+    """Return the active season (or None) without a query while the cache is warm"""
+    cached = cache.get(CACHE_KEY)
+    if cached is not None:
+        # Stored as a 1-tuple so that "no active season" is cached too
+        return cached[0]
+
+    season = Season.objects.filter(is_active=True).first()
+    cache.set(CACHE_KEY, (season,), _timeout(season))
+    return season
+
+
+def invalidate_active_season():
+    cache.delete(CACHE_KEY)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Season, TypingAttempt, Wallet
+from .models import Season, TypingAttempt, Wallet, SeasonResult, SeasonStanding, TypingSeasonSummary
 
 class SeasonSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,13 +7,36 @@ class SeasonSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class TypingAttemptSerializer(serializers.ModelSerializer):
-    coins_reward = serializers.IntegerField(read_only=True, default=0)
-    
     class Meta:
         model = TypingAttempt
         fields = ['id', 'wpm', 'accuracy', 'score', 'energy_gain', 'coins_reward', 'created_at']
         read_only_fields = ['score', 'energy_gain', 'coins_reward', 'created_at']
 
+class SeasonResultSerializer(serializers.ModelSerializer):
+    username = serializers.ReadOnlyField(source='student.username')
+    avatar_url = serializers.ReadOnlyField(source='student.avatar_url')
+
+    class Meta:
+        model = SeasonResult
+        fields = ['rank', 'student', 'username', 'avatar_url', 'total_score', 'attempts_count', 'best_wpm', 'reward']
+
+class TypingSeasonSummarySerializer(serializers.ModelSerializer):
+    season_title = serializers.ReadOnlyField(source='season.title')
+
+    class Meta:
+        model = TypingSeasonSummary
+        fields = [
+            'season', 'season_title', 'attempts_count', 'total_score', 'best_score', 'best_wpm',
+            'avg_wpm', 'avg_accuracy', 'wpm_histogram', 'first_attempt_at', 'last_attempt_at'
+        ]
+
+class SeasonStandingSerializer(serializers.ModelSerializer):
+    season_title = serializers.ReadOnlyField(source='season.title')
+
+    class Meta:
+        model = SeasonStanding
+        fields = ['season', 'season_title', 'attempts_count', 'total_score', 'best_wpm']
+
 class LeaderboardEntrySerializer(serializers.Serializer):
     username = serializers.CharField()
     total_score = serializers.FloatField()
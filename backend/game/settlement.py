@@ -0,0 +1,95 @@
+"""
+Season settlement: rank the final standings, pay every reward tier and freeze
+the result. Used by SeasonViewSet.end_season and the complete_seasons /
+rotate_seasons commands.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from users.models import User, CoinLedgerEntry
+from users.ledger import post_entries
+from .models import Season, SeasonStanding, SeasonResult
+from .ranking import competition_ranks
+from .standings import rebuild_standings
+from .ingest import flush_pending
+
+DEFAULT_SEASON_REWARDS = {"1": 300, "2": 150, "3": 75}
+
+
+def reward_for_rank(rewards, rank):
+    """
+    Look up the reward of a rank in rewards_json.
+    Keys are single ranks ("1") or inclusive ranges ("4-10").
+    """
+    for tier, amount in rewards.items():
+        low, _, high = str(tier).partition('-')
+        try:
+            low = int(low)
+            high = int(high) if high else low
+        except ValueError:
+            continue
+        if low <= rank <= high:
+            return int(amount)
+    return 0
+
+
+def settle_season(season, default_rewards=None):
+    """
+    Close a season and pay its rewards in one transaction.
+
+    Safe to call more than once: the season row is locked and a season that is
+    already completed only returns its stored results.
+    Returns (results, newly_settled).
+    """
+    with transaction.atomic():
+        season = Season.objects.select_for_update().get(pk=season.pk)
+        if season.is_completed:
+            if season.is_active:
+                season.is_active = False
+                season.save(update_fields=['is_active'])
+            return list(season.results.select_related('student')), False
+
+        rewards = season.rewards_json or default_rewards or DEFAULT_SEASON_REWARDS
+
+        # Attempts still staged by buffered ingestion count towards the final standings,
+        # including those a concurrent flush is moving right now
+        flush_pending(wait=True)
+        rebuild_standings(season)
+        standings = list(
+            SeasonStanding.objects
+            .filter(season=season)
+            .order_by('-total_score', 'student_id')
+        )
+        ranks = competition_ranks([(s.student_id, s.total_score) for s in standings], 1, 0)
+
+        results = []
+        payouts = {}
+        for (rank, _, _), standing in zip(ranks, standings):
+            reward = reward_for_rank(rewards, rank)
+            results.append(SeasonResult(
+                season=season,
+                student_id=standing.student_id,
+                rank=rank,
+                total_score=standing.total_score,
+                attempts_count=standing.attempts_count,
+                best_wpm=standing.best_wpm,
+                reward=reward
+            ))
+            if reward > 0:
+                payouts[standing.student_id] = reward
+
+        SeasonResult.objects.bulk_create(results, batch_size=500)
+
+        # Coins go through the ledger; points get one UPDATE per distinct reward amount
+        post_entries(payouts, CoinLedgerEntry.Reason.SEASON_REWARD, reference=f'season:{season.id}')
+        by_amount = defaultdict(list)
+        for student_id, amount in payouts.items():
+            by_amount[amount].append(student_id)
+        for amount, student_ids in by_amount.items():
+            User.objects.filter(id__in=student_ids).update(points=F('points') + amount)
+
+        season.is_active = False
+        season.is_completed = True
+        season.save(update_fields=['is_active', 'is_completed'])
+
+    return list(season.results.select_related('student')), True
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Season
+from .seasons import invalidate_active_season
+
+
+@receiver([post_save, post_delete], sender=Season)
+def season_changed(sender, **kwargs):
+    invalidate_active_season()
+    # A concurrent request may re-cache the old state before the change commits
+    transaction.on_commit(invalidate_active_season)
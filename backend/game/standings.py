@@ -0,0 +1,136 @@
+"""
+Per-season standings maintained alongside TypingAttempt rows.
+
+The leaderboard reads SeasonStanding instead of aggregating every attempt of
+the season, so every write path that creates attempts must go through
+record_attempt() inside its own transaction.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Sum, Max, Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import SeasonStanding, TypingAttempt, TypingSeasonSummary
+from .ranking import get_rank_index
+from .percentiles import record_bests, season_scope
+
+
+def record_attempt(attempt):
+    """Add a saved attempt to its season standing (no-op without a season)"""
+    record_attempts([attempt])
+
+
+def record_attempts(attempts):
+    """Add saved attempts to their season standings with one UPDATE per student and season"""
+    totals = {}
+    for attempt in attempts:
+        if not attempt.season_id:
+            continue
+        key = (attempt.season_id, attempt.student_id)
+        score, count, best = totals.get(key, (0, 0, 0))
+        totals[key] = (score + attempt.score, count + 1, max(best, attempt.wpm))
+
+    if not totals:
+        return
+
+    with transaction.atomic():
+        # Insert missing rows first, so the lock below covers a concurrent first
+        # attempt too and only one of them sees best_wpm 0
+        SeasonStanding.objects.bulk_create([
+            SeasonStanding(season_id=season_id, student_id=student_id)
+            for season_id, student_id in totals
+        ], ignore_conflicts=True)
+        # Previous bests feed the season WPM histograms
+        previous = {
+            (season_id, student_id): best_wpm
+            for season_id, student_id, best_wpm in (
+                SeasonStanding.objects
+                .select_for_update()
+                .filter(
+                    season_id__in={season_id for season_id, _ in totals},
+                    student_id__in={student_id for _, student_id in totals}
+                )
+                .values_list('season_id', 'student_id', 'best_wpm')
+            )
+        }
+
+        best_changes = defaultdict(list)
+        # update() skips auto_now; the rank index syncs by updated_at
+        now = timezone.now()
+        for (season_id, student_id), (score, count, best) in totals.items():
+            SeasonStanding.objects.filter(season_id=season_id, student_id=student_id).update(
+                total_score=F('total_score') + score,
+                attempts_count=F('attempts_count') + count,
+                best_wpm=Greatest(F('best_wpm'), best),
+                updated_at=now
+            )
+            best_changes[season_id].append((previous.get((season_id, student_id), 0), best))
+
+        for season_id, changes in best_changes.items():
+            record_bests(season_scope(season_id), changes)
+
+        def publish():
+            from .live import broker  # live imports this module
+
+            rank_index = get_rank_index()
+            committed = (
+                SeasonStanding.objects
+                .filter(
+                    season_id__in={season_id for season_id, _ in totals},
+                    student_id__in={student_id for _, student_id in totals}
+                )
+                .values_list('season_id', 'student_id', 'total_score')
+            )
+            for season_id, student_id, total in committed:
+                if (season_id, student_id) in totals:
+                    rank_index.set_score(season_id, student_id, total)
+            for season_id in {season_id for season_id, _ in totals}:
+                broker.publish(season_id)
+
+        transaction.on_commit(publish)
+
+
+def top_standings(season, limit=10):
+    """Highest total scores of a season, best first"""
+    return (
+        SeasonStanding.objects
+        .filter(season=season)
+        .select_related('student')
+        .order_by('-total_score', 'student_id')[:limit]
+    )
+
+
+def rebuild_standings(season):
+    """Recompute all standings of a season from its raw attempts (or summaries once compacted)"""
+    if season.compacted_at:
+        totals = (
+            TypingSeasonSummary.objects
+            .filter(season=season)
+            .values('student', 'total_score', 'attempts_count', 'best_wpm')
+        )
+    else:
+        totals = (
+            TypingAttempt.objects
+            .filter(season=season)
+            .values('student')
+            .annotate(
+                total_score=Sum('score'),
+                attempts_count=Count('id'),
+                best_wpm=Max('wpm')
+            )
+        )
+
+    with transaction.atomic():
+        SeasonStanding.objects.filter(season=season).delete()
+        standings = SeasonStanding.objects.bulk_create([
+            SeasonStanding(
+                season=season,
+                student_id=row['student'],
+                total_score=row['total_score'] or 0,
+                attempts_count=row['attempts_count'],
+                best_wpm=row['best_wpm'] or 0
+            )
+            for row in totals
+        ], batch_size=500)
+        transaction.on_commit(lambda: get_rank_index().invalidate(season.id))
+    return len(standings)
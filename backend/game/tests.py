@@ -1,8 +1,30 @@
-from django.test import TestCase
-from users.models import User
-from game.models import TypingAttempt, Season, Wallet
+import gzip
+import importlib.util
+import tempfile
+import unittest
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import User
+from users.throttling import reset_buckets
+from game.models import (
+    TypingAttempt, Season, Wallet, SeasonStanding, SeasonResult,
+    PendingTypingAttempt, TypingSeasonSummary, WpmBucket
+)
+from game.ranking import get_rank_index, InMemoryRankIndex, DatabaseRankIndex
+from game.settlement import settle_season, reward_for_rank
+from game.ingest import flush_pending
+from game.seasons import get_active_season
+from game.live import issue_stream_ticket, leaderboard_diff
+from game.compaction import compact_season, archive_path
+from game.percentiles import percentile, record_bests, rank_band, season_scope, GLOBAL_SCOPE
+from game.scoring import calculate_score, calculate_coins_reward
 
 class TypingAttemptModelTest(TestCase):
     def test_score_calculation(self):
@@ -72,3 +94,385 @@ class WalletModelTest(TestCase):
     def test_wallet_str_representation(self):
         wallet = Wallet.objects.create(student=self.user, coins=250)
         self.assertEqual(str(wallet), f"{self.user.username}: 250 coins")
+
+
+class SeasonStandingTest(APITestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=7))
+        self.student = User.objects.create_user(username='typist', password='password')
+        self.other = User.objects.create_user(username='rival', password='password')
+        get_rank_index().invalidate()
+
+    def test_attempt_updates_standing(self):
+        self.client.force_authenticate(user=self.student)
+        self.client.post(reverse('typing-list'), {'wpm': 50, 'accuracy': 100}, format='json')
+        self.client.post(reverse('typing-list'), {'wpm': 70, 'accuracy': 50}, format='json')
+
+        standing = SeasonStanding.objects.get(season=self.season, student=self.student)
+        self.assertEqual(standing.total_score, 85.0)
+        self.assertEqual(standing.attempts_count, 2)
+        self.assertEqual(standing.best_wpm, 70)
+
+    @override_settings(TOKEN_BUCKET_RATES={'typing_attempt': {'user': '1/min'}})
+    def test_attempts_are_throttled(self):
+        reset_buckets()
+        self.client.force_authenticate(user=self.student)
+        self.client.post(reverse('typing-list'), {'wpm': 50, 'accuracy': 100}, format='json')
+        response = self.client.post(reverse('typing-list'), {'wpm': 50, 'accuracy': 100}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(TypingAttempt.objects.filter(student=self.student).count(), 1)
+
+    def test_leaderboard_reads_standings(self):
+        SeasonStanding.objects.create(season=self.season, student=self.student, total_score=10, attempts_count=1, best_wpm=10)
+        SeasonStanding.objects.create(season=self.season, student=self.other, total_score=90, attempts_count=3, best_wpm=45)
+
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(reverse('leaderboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([e['username'] for e in response.data['leaderboard']], ['rival', 'typist'])
+        self.assertEqual(response.data['leaderboard'][0]['attempts_count'], 3)
+        self.assertEqual(response.data['current_user_rank'], 2)
+
+    def test_rebuild_standings_command(self):
+        TypingAttempt.objects.create(student=self.student, season=self.season, wpm=40, accuracy=100)
+        TypingAttempt.objects.create(student=self.student, season=self.season, wpm=60, accuracy=100)
+        SeasonStanding.objects.create(season=self.season, student=self.other, total_score=999)
+
+        call_command('rebuild_standings', stdout=StringIO())
+
+        standings = SeasonStanding.objects.filter(season=self.season)
+        self.assertEqual(standings.count(), 1)
+        self.assertEqual(standings[0].total_score, 100.0)
+        self.assertEqual(standings[0].best_wpm, 60)
+
+
+class RankIndexTest(APITestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=7))
+        self.students = []
+        for idx, score in enumerate([100, 90, 90, 70, 60, 50, 40, 30, 20, 10, 5, 1]):
+            student = User.objects.create(username=f'student{idx}')
+            SeasonStanding.objects.create(season=self.season, student=student, total_score=score)
+            self.students.append(student)
+        get_rank_index().invalidate()
+
+    def test_backends_agree_on_rank_and_window(self):
+        for index in (InMemoryRankIndex(), DatabaseRankIndex()):
+            self.assertEqual(index.rank(self.season.id, self.students[0].id), 1)
+            self.assertEqual(index.rank(self.season.id, self.students[2].id), 2)
+            self.assertEqual(index.rank(self.season.id, self.students[3].id), 4)
+            window = index.window(self.season.id, self.students[3].id, 2)
+            self.assertEqual([rank for rank, _, _ in window], [2, 2, 4, 5, 6])
+            self.assertEqual(window[2][1], self.students[3].id)
+
+    def test_in_memory_index_applies_score_changes(self):
+        index = InMemoryRankIndex()
+        self.assertEqual(index.rank(self.season.id, self.students[11].id), 12)
+        index.set_score(self.season.id, self.students[11].id, 201)
+        self.assertEqual(index.rank(self.season.id, self.students[11].id), 1)
+        self.assertEqual(index.rank(self.season.id, self.students[0].id), 2)
+
+        # Applying the same committed total twice does not inflate it
+        index.set_score(self.season.id, self.students[11].id, 201)
+        window = index.window(self.season.id, self.students[11].id, 1)
+        self.assertEqual(window[0], (1, self.students[11].id, 201))
+
+    def test_in_memory_index_syncs_changed_standings(self):
+        index = InMemoryRankIndex(ttl=0)
+        self.assertEqual(index.rank(self.season.id, self.students[11].id), 12)
+
+        # Written by another worker
+        SeasonStanding.objects.filter(student=self.students[11]).update(total_score=500, updated_at=timezone.now())
+        with self.assertNumQueries(2):
+            self.assertEqual(index.rank(self.season.id, self.students[11].id), 1)
+
+        SeasonStanding.objects.filter(student=self.students[0]).delete()
+        self.assertIsNone(index.rank(self.season.id, self.students[0].id))
+        self.assertEqual(index.rank(self.season.id, self.students[1].id), 2)
+
+    def test_leaderboard_around_me(self):
+        self.client.force_authenticate(user=self.students[11])
+        response = self.client.get(reverse('leaderboard'), {'around': 'me', 'window': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current_user_rank'], 12)
+        self.assertEqual([e['rank'] for e in response.data['leaderboard']], [10, 11, 12])
+        self.assertEqual(response.data['leaderboard'][-1]['username'], 'student11')
+
+
+class SeasonSettlementTest(APITestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(
+            title='Season 1', start_date=today - timedelta(days=7), end_date=today - timedelta(days=1),
+            rewards_json={'1': 100, '2': 50, '3-4': 10}
+        )
+        self.students = [User.objects.create(username=f'student{idx}') for idx in range(5)]
+        for student, wpm in zip(self.students, [90, 80, 70, 60, 50]):
+            TypingAttempt.objects.create(student=student, season=self.season, wpm=wpm, accuracy=100)
+
+    def test_reward_for_rank_supports_ranges(self):
+        rewards = {'1': 100, '2': 50, '3-4': 10}
+        self.assertEqual(reward_for_rank(rewards, 1), 100)
+        self.assertEqual(reward_for_rank(rewards, 4), 10)
+        self.assertEqual(reward_for_rank(rewards, 5), 0)
+
+    def test_settlement_pays_all_tiers_once(self):
+        results, settled = settle_season(self.season)
+        self.assertTrue(settled)
+        self.assertEqual([r.reward for r in results], [100, 50, 10, 10, 0])
+
+        coins = dict(User.objects.filter(id__in=[s.id for s in self.students]).values_list('username', 'coins'))
+        self.assertEqual(coins, {'student0': 100, 'student1': 50, 'student2': 10, 'student3': 10, 'student4': 0})
+
+        results, settled = settle_season(self.season)
+        self.assertFalse(settled)
+        self.assertEqual(User.objects.get(username='student0').coins, 100)
+        self.assertEqual(SeasonResult.objects.filter(season=self.season).count(), 5)
+
+        self.season.refresh_from_db()
+        self.assertFalse(self.season.is_active)
+        self.assertTrue(self.season.is_completed)
+
+    def test_end_season_endpoint_and_results(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.post(reverse('season-end-season', args=[self.season.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['rewards_distributed']), 4)
+
+        response = self.client.get(reverse('season-results', args=[self.season.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['username'], 'student0')
+        self.assertEqual(response.data[0]['reward'], 100)
+
+
+@override_settings(TYPING_INGEST_MODE='buffered')
+class BufferedIngestTest(APITestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=1))
+        self.student = User.objects.create(username='typist', max_wpm=55)
+        get_rank_index().invalidate()
+
+    def test_attempts_are_staged_then_flushed(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post(reverse('typing-list'), {'wpm': 60, 'accuracy': 90}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['score'], 54.0)
+        self.assertEqual(response.data['coins_reward'], 10)
+        self.client.post(reverse('typing-list'), {'wpm': 40, 'accuracy': 80}, format='json')
+
+        self.assertEqual(PendingTypingAttempt.objects.count(), 2)
+        self.assertFalse(TypingAttempt.objects.exists())
+
+        self.assertEqual(flush_pending(batch_size=1), 2)
+
+        self.assertEqual(PendingTypingAttempt.objects.count(), 0)
+        self.assertEqual(TypingAttempt.objects.filter(student=self.student).count(), 2)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.coins, 15)
+        self.assertEqual(self.student.max_wpm, 60)
+        self.assertEqual(self.student.last_wpm, 40)
+        standing = SeasonStanding.objects.get(season=self.season, student=self.student)
+        self.assertEqual(standing.attempts_count, 2)
+        self.assertEqual(standing.total_score, 86.0)
+
+    @override_settings(TYPING_INGEST_BATCH_SIZE=1)
+    def test_request_flushes_one_batch(self):
+        for wpm in [30, 35]:
+            PendingTypingAttempt.objects.create(student=self.student, wpm=wpm, accuracy=90, score=1)
+        self.client.force_authenticate(user=self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('typing-list'), {'wpm': 60, 'accuracy': 90}, format='json')
+
+        self.assertEqual(TypingAttempt.objects.count(), 1)
+        self.assertEqual(PendingTypingAttempt.objects.count(), 2)
+
+
+class ActiveSeasonCacheTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=1))
+
+    def test_active_season_is_cached(self):
+        self.assertEqual(get_active_season(), self.season)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_season(), self.season)
+
+    def test_cache_is_invalidated_when_season_changes(self):
+        get_active_season()
+        self.season.is_active = False
+        self.season.save()
+        self.assertIsNone(get_active_season())
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_active_season())
+
+        today = timezone.now().date()
+        new_season = Season.objects.create(title='Season 2', start_date=today, end_date=today + timedelta(days=1))
+        self.assertEqual(get_active_season(), new_season)
+
+
+class LiveLeaderboardTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=1))
+        self.student = User.objects.create(username='typist')
+        SeasonStanding.objects.create(season=self.season, student=self.student, total_score=10, attempts_count=1)
+
+    def test_leaderboard_diff(self):
+        old = [{'user_id': 1, 'rank': 1, 'total_score': 10}, {'user_id': 2, 'rank': 2, 'total_score': 5}]
+        new = [{'user_id': 2, 'rank': 1, 'total_score': 15}, {'user_id': 3, 'rank': 2, 'total_score': 12}]
+        diff = leaderboard_diff(old, new)
+        self.assertEqual([e['user_id'] for e in diff['changed']], [2, 3])
+        self.assertEqual(diff['removed'], [1])
+
+    def test_stream_requires_token(self):
+        response = self.client.get(reverse('leaderboard-stream'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_refuses_tokens_in_the_url_and_bad_tickets(self):
+        token = str(AccessToken.for_user(self.student))
+        self.assertEqual(self.client.get(reverse('leaderboard-stream'), {'token': token}).status_code, 401)
+
+        other = Season.objects.create(title='Old', start_date=self.season.start_date, end_date=self.season.end_date, is_active=False)
+        stale = issue_stream_ticket(self.student, other)
+        self.assertEqual(self.client.get(reverse('leaderboard-stream'), {'ticket': stale}).status_code, 401)
+        self.assertEqual(self.client.get(reverse('leaderboard-stream'), {'ticket': 'forged'}).status_code, 401)
+
+    @override_settings(LEADERBOARD_STREAM_INTERVAL=0, LEADERBOARD_STREAM_MAX_SECONDS=0)
+    async def test_stream_sends_snapshot(self):
+        token = str(AccessToken.for_user(self.student))
+        ticket = await self.async_client.post(
+            reverse('leaderboard-stream-ticket'), headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(ticket.status_code, 200)
+        response = await self.async_client.get(reverse('leaderboard-stream'), {'ticket': ticket.json()['ticket']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('event: snapshot', body)
+        self.assertIn('"username": "typist"', body)
+
+
+class SeasonCompactionTest(APITestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(
+            title='Season 1', start_date=today - timedelta(days=2), end_date=today - timedelta(days=1),
+            is_active=False, is_completed=True
+        )
+        self.student = User.objects.create(username='typist')
+        for wpm in [42, 48, 55]:
+            TypingAttempt.objects.create(student=self.student, season=self.season, wpm=wpm, accuracy=100)
+        self.archive_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.archive_dir.cleanup()
+
+    def test_compaction_summarizes_and_archives(self):
+        with self.settings(TYPING_ARCHIVE_DIR=self.archive_dir.name):
+            summaries, archived = compact_season(self.season)
+            path = archive_path(self.season)
+
+        self.assertEqual((summaries, archived), (1, 3))
+        self.assertFalse(TypingAttempt.objects.filter(season=self.season).exists())
+        with gzip.open(path, 'rt') as archive:
+            lines = archive.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            lines[0], 'id,student_id,season_id,wpm,accuracy,score,energy_gain,coins_reward,created_at'
+        )
+
+        summary = TypingSeasonSummary.objects.get(season=self.season, student=self.student)
+        self.assertEqual(summary.attempts_count, 3)
+        self.assertEqual(summary.total_score, 145)
+        self.assertEqual(summary.best_wpm, 55)
+        self.assertEqual(summary.wpm_histogram, {'40': 2, '50': 1})
+
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(reverse('typing-history'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summaries'][0]['attempts_count'], 3)
+
+    def test_active_season_cannot_be_compacted(self):
+        self.season.is_completed = False
+        with self.assertRaises(ValueError):
+            compact_season(self.season, keep_raw=True)
+
+
+class WpmPercentileTest(APITestCase):
+    def test_percentile_from_histogram(self):
+        record_bests(GLOBAL_SCOPE, [(0, 12), (0, 22), (0, 27), (0, 41)])
+        self.assertEqual(percentile(GLOBAL_SCOPE, 45), 100.0)
+        self.assertEqual(percentile(GLOBAL_SCOPE, 25), 50.0)
+        self.assertEqual(percentile(GLOBAL_SCOPE, 10), 0.0)
+        self.assertEqual(rank_band(percentile(GLOBAL_SCOPE, 25)), 'top 50%')
+
+        # Improving from 12 to 41 moves the student between buckets
+        record_bests(GLOBAL_SCOPE, [(12, 41)])
+        self.assertEqual(sum(WpmBucket.objects.filter(scope=GLOBAL_SCOPE).values_list('count', flat=True)), 4)
+        self.assertEqual(percentile(GLOBAL_SCOPE, 25), 25.0)
+
+    def test_attempts_update_histograms(self):
+        today = timezone.now().date()
+        season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=1))
+        slow = User.objects.create(username='slow', max_wpm=20)
+        record_bests(GLOBAL_SCOPE, [(0, 20)])
+        fast = User.objects.create(username='fast')
+
+        self.client.force_authenticate(user=fast)
+        self.client.post(reverse('typing-list'), {'wpm': 30, 'accuracy': 100}, format='json')
+        self.client.post(reverse('typing-list'), {'wpm': 60, 'accuracy': 100}, format='json')
+
+        self.client.force_authenticate(user=slow)
+        response = self.client.get(reverse('typing-percentile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['percentile'], 0.0)
+        self.assertEqual(sum(WpmBucket.objects.filter(scope=season_scope(season.id)).values_list('count', flat=True)), 1)
+
+        self.client.force_authenticate(user=User.objects.get(pk=fast.pk))
+        response = self.client.get(reverse('typing-percentile'))
+        self.assertEqual(response.data['max_wpm'], 60)
+        self.assertEqual(response.data['percentile'], 50.0)
+        self.assertEqual(response.data['season']['best_wpm'], 60)
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+class RescoreAttemptsTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.season = Season.objects.create(title='Season 1', start_date=today, end_date=today + timedelta(days=1))
+        self.user = User.objects.create(username='typist')
+
+    def test_vectorized_formulas_match_scalar_ones(self):
+        import numpy as np
+        from game.scoring import score_array, coins_reward_array
+
+        wpm = np.array([0, 9.5, 10, 39, 40, 45.5, 59.9, 60, 75, 120] * 6, dtype=float)
+        accuracy = np.repeat([0, 49.9, 50, 80, 90, 100], 10).astype(float)
+        self.assertEqual(list(score_array(wpm, accuracy)), [calculate_score(w, a) for w, a in zip(wpm, accuracy)])
+        self.assertEqual(list(coins_reward_array(wpm, accuracy)), [calculate_coins_reward(w, a) for w, a in zip(wpm, accuracy)])
+
+    def test_command_rescores_and_rebuilds_standings(self):
+        for wpm in (40, 60, 80):
+            TypingAttempt.objects.create(
+                student=self.user, season=self.season, wpm=wpm, accuracy=90,
+                coins_reward=calculate_coins_reward(wpm, 90)
+            )
+        call_command('rebuild_standings', season=self.season.id, stdout=StringIO())
+        # Simulate attempts scored with an older formula
+        TypingAttempt.objects.filter(wpm__gte=60).update(score=1, coins_reward=0)
+
+        out = StringIO()
+        call_command('rescore_typing_attempts', season=[self.season.id], dry_run=True, chunk_size=2, stdout=out)
+        self.assertIn('Would change 2 of 3 attempts', out.getvalue())
+        self.assertEqual(TypingAttempt.objects.filter(score=1).count(), 2)
+
+        call_command('rescore_typing_attempts', season=[self.season.id], chunk_size=2, stdout=StringIO())
+        self.assertFalse(TypingAttempt.objects.filter(score=1).exists())
+        self.assertEqual(TypingAttempt.objects.get(wpm=80).coins_reward, calculate_coins_reward(80, 90))
+        standing = SeasonStanding.objects.get(season=self.season, student=self.user)
+        self.assertAlmostEqual(standing.total_score, 36 + 54 + 72)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SeasonViewSet, TypingAttemptViewSet, LeaderboardView
+from .views import SeasonViewSet, TypingAttemptViewSet, LeaderboardView, LeaderboardStreamTicketView
+from .live import leaderboard_stream
 
 router = DefaultRouter()
 router.register(r'seasons', SeasonViewSet)
@@ -9,4 +10,6 @@ router.register(r'typing', TypingAttemptViewSet, basename='typing')
 urlpatterns = [
     path('', include(router.urls)),
     path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/stream/', leaderboard_stream, name='leaderboard-stream'),
+    path('leaderboard/stream/ticket/', LeaderboardStreamTicketView.as_view(), name='leaderboard-stream-ticket'),
 ]
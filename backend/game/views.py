@@ -1,20 +1,54 @@
 from rest_framework import viewsets, permissions, views, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum, Max, Count
+from django.db.models.functions import Greatest
 from django.utils import timezone
-from .models import Season, TypingAttempt
-from .serializers import SeasonSerializer, TypingAttemptSerializer
-from users.models import User
+from users.models import User, CoinLedgerEntry
+from users.ledger import post_entry
+from users.throttling import TypingAttemptThrottle
+from .models import Season, TypingAttempt, SeasonStanding, TypingSeasonSummary
+from .serializers import (
+    SeasonSerializer, TypingAttemptSerializer, SeasonResultSerializer,
+    TypingSeasonSummarySerializer, SeasonStandingSerializer
+)
+from .standings import record_attempt, top_standings
+from .ranking import get_rank_index, competition_ranks
+from .scoring import calculate_coins_reward
+from .ingest import is_buffered, enqueue_attempt
+from .seasons import get_active_season
+from .live import issue_stream_ticket
+from .percentiles import record_bests, percentile, rank_band, season_scope, GLOBAL_SCOPE
+from .settlement import settle_season, reward_for_rank, DEFAULT_SEASON_REWARDS
 
 class SeasonViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Season.objects.filter(is_active=True)
     serializer_class = SeasonSerializer
     
+    def get_queryset(self):
+        if self.action == 'results':
+            return Season.objects.filter(is_completed=True)
+        return super().get_queryset()
+    
+    @action(detail=False, methods=['get'])
+    def current(self, request):
+        """The active season, served from the season cache"""
+        season = get_active_season()
+        if not season:
+            return Response({'detail': 'No active season'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(season).data)
+    
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        """Frozen final standings of a completed season"""
+        season = self.get_object()
+        results = season.results.select_related('student')
+        return Response(SeasonResultSerializer(results, many=True).data)
+    
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def end_season(self, request, pk=None):
-        """End season and distribute rewards to top 3 players"""
+        """End season and distribute rewards for every tier in rewards_json"""
         season = self.get_object()
         
         if not season.is_active:
@@ -23,35 +57,23 @@ class SeasonViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get top 3 players by total score
-        top_players = (
-            TypingAttempt.objects
-            .filter(season=season)
-            .values('student')
-            .annotate(total_score=Sum('score'))
-            .order_by('-total_score')[:3]
-        )
-        
-        rewards = season.rewards_json or {"1": 300, "2": 150, "3": 75}
-        awarded = []
-        
-        for idx, player_data in enumerate(top_players, 1):
-            student = User.objects.get(id=player_data['student'])
-            points_reward = int(rewards.get(str(idx), 0))
-            
-            student.points += points_reward
-            student.save()
-            
-            awarded.append({
-                'rank': idx,
-                'username': student.username,
-                'total_score': player_data['total_score'],
-                'points_awarded': points_reward
-            })
+        results, settled = settle_season(season)
+        if not settled:
+            return Response(
+                {'error': 'Season is already ended'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Mark season as inactive
-        season.is_active = False
-        season.save()
+        awarded = [
+            {
+                'rank': result.rank,
+                'username': result.student.username,
+                'total_score': result.total_score,
+                'points_awarded': result.reward,
+                'coins_awarded': result.reward
+            }
+            for result in results if result.reward > 0
+        ]
         
         return Response({
             'message': f'Season "{season.title}" ended successfully',
@@ -65,50 +87,102 @@ class TypingAttemptViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return TypingAttempt.objects.filter(student=self.request.user)
 
+    def get_throttles(self):
+        if self.action == 'create':
+            return [TypingAttemptThrottle()]
+        return super().get_throttles()
+
+    @action(detail=False, methods=['get'], url_path='percentile', url_name='percentile')
+    def wpm_percentile(self, request):
+        """How the user's best WPM compares to other students, overall and in the active season"""
+        user = request.user
+        overall = percentile(GLOBAL_SCOPE, user.max_wpm)
+        data = {
+            'max_wpm': user.max_wpm,
+            'percentile': overall,
+            'band': rank_band(overall),
+            'season': None
+        }
+        
+        season = get_active_season()
+        if season:
+            best_wpm = (
+                SeasonStanding.objects
+                .filter(season=season, student=user)
+                .values_list('best_wpm', flat=True)
+                .first()
+            ) or 0
+            season_percentile = percentile(season_scope(season.id), best_wpm)
+            data['season'] = {
+                'season_id': season.id,
+                'best_wpm': best_wpm,
+                'percentile': season_percentile,
+                'band': rank_band(season_percentile)
+            }
+        
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Per-season typing history: summaries of compacted seasons plus standings of the others"""
+        summaries = (
+            TypingSeasonSummary.objects
+            .filter(student=request.user)
+            .select_related('season')
+            .order_by('-season__end_date')
+        )
+        standings = (
+            SeasonStanding.objects
+            .filter(student=request.user, season__compacted_at__isnull=True)
+            .select_related('season')
+            .order_by('-season__end_date')
+        )
+        return Response({
+            'summaries': TypingSeasonSummarySerializer(summaries, many=True).data,
+            'standings': SeasonStandingSerializer(standings, many=True).data
+        })
+
     def perform_create(self, serializer):
         student = self.request.user
-        season = Season.objects.filter(is_active=True).first()
+        season = get_active_season()
         
-        # Calculate coins reward based on WPM and accuracy
         wpm = serializer.validated_data.get('wpm', 0)
         accuracy = serializer.validated_data.get('accuracy', 0)
         
-        # Base coins: 1 coin per 10 WPM, multiplied by accuracy percentage
-        coins_reward = 0
-        if accuracy >= 50:
-            coins_reward = max(1, int((wpm / 10) * (accuracy / 100)))
+        if is_buffered():
+            # Stage the attempt; it reaches TypingAttempt, standings and coins on the next flush
+            serializer.instance = enqueue_attempt(student, season, wpm, accuracy)
+            return
         
-        # Bonus for high performance
-        if wpm >= 60 and accuracy >= 90:
-            coins_reward += 5  # Excellent performance
-        elif wpm >= 40 and accuracy >= 80:
-            coins_reward += 2  # Good performance
+        # Calculate coins reward based on WPM and accuracy
+        coins_reward = calculate_coins_reward(wpm, accuracy)
         
         with transaction.atomic():
-            serializer.save(
+            attempt = serializer.save(
                 student=student, 
-                season=season
+                season=season,
+                coins_reward=coins_reward
             )
+            record_attempt(attempt)
+            post_entry(student, coins_reward, CoinLedgerEntry.Reason.TYPING, reference=f'typing:{attempt.id}')
             
-            # Update user coins, last_wpm, and max_wpm
-            student.coins += coins_reward
+            # Update last_wpm, and max_wpm if this is a new record
+            previous_best = User.objects.select_for_update().values_list('max_wpm', flat=True).get(pk=student.pk)
+            record_bests(GLOBAL_SCOPE, [(previous_best, wpm)])
+            User.objects.filter(pk=student.pk).update(last_wpm=wpm, max_wpm=Greatest('max_wpm', wpm))
             student.last_wpm = wpm
-            
-            # Update max_wpm if this is a new record
-            if wpm > student.max_wpm:
-                student.max_wpm = wpm
-            
-            student.save()
-            
-            # Store for response
-            serializer.instance.coins_reward = coins_reward
+            student.max_wpm = max(previous_best, wpm)
 
 class LeaderboardView(views.APIView):
-    """Get current season leaderboard with top players"""
+    """
+    Get current season leaderboard with top players.
+    Pass ?around=me&window=N to get the N players above and below the current user instead.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    max_window = 25
     
     def get(self, request):
-        season = Season.objects.filter(is_active=True).first()
+        season = get_active_season()
         if not season:
             return Response({
                 'season': None,
@@ -116,48 +190,49 @@ class LeaderboardView(views.APIView):
                 'message': 'No active season'
             })
         
-        # Get top 10 players by total score in current season
-        top_players = (
-            TypingAttempt.objects
-            .filter(season=season)
-            .values('student__id', 'student__username', 'student__avatar_url')
-            .annotate(
-                total_score=Sum('score'),
-                attempts_count=Count('id'),
-                best_wpm=Max('wpm')
+        rank_index = get_rank_index()
+        
+        if request.query_params.get('around') == 'me':
+            try:
+                window = int(request.query_params.get('window', 5))
+            except (TypeError, ValueError):
+                return Response({'error': 'window must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            window = min(max(window, 0), self.max_window)
+            
+            ranked = rank_index.window(season.id, request.user.id, window)
+            standings = (
+                SeasonStanding.objects
+                .filter(season=season, student_id__in=[student_id for _, student_id, _ in ranked])
+                .select_related('student')
             )
-            .order_by('-total_score')[:10]
-        )
+            standings_by_student = {standing.student_id: standing for standing in standings}
+            entries = [
+                (rank, standings_by_student[student_id])
+                for rank, student_id, _ in ranked
+                if student_id in standings_by_student
+            ]
+        else:
+            # Get top 10 players by total score in current season
+            top_players = list(top_standings(season, limit=10))
+            ranks = competition_ranks([(s.student_id, s.total_score) for s in top_players], 1, 0)
+            entries = [(rank, standing) for (rank, _, _), standing in zip(ranks, top_players)]
         
+        rewards = season.rewards_json or DEFAULT_SEASON_REWARDS
         leaderboard = []
-        for idx, player in enumerate(top_players, 1):
-            # Calculate potential reward
-            reward = 0
-            if idx == 1:
-                reward = int(season.rewards_json.get("1", 300))
-            elif idx == 2:
-                reward = int(season.rewards_json.get("2", 150))
-            elif idx == 3:
-                reward = int(season.rewards_json.get("3", 75))
+        for rank, standing in entries:
+            reward = reward_for_rank(rewards, rank)
             
             leaderboard.append({
-                'rank': idx,
-                'user_id': player['student__id'],
-                'username': player['student__username'],
-                'avatar_url': player['student__avatar_url'],
-                'total_score': round(player['total_score'], 2),
-                'attempts_count': player['attempts_count'],
-                'best_wpm': round(player['best_wpm'], 2),
+                'rank': rank,
+                'user_id': standing.student_id,
+                'username': standing.student.username,
+                'avatar_url': standing.student.avatar_url,
+                'total_score': round(standing.total_score, 2),
+                'attempts_count': standing.attempts_count,
+                'best_wpm': round(standing.best_wpm, 2),
                 'potential_reward': reward
             })
         
-        # Check if current user is in top 10
-        current_user_rank = None
-        for entry in leaderboard:
-            if entry['user_id'] == request.user.id:
-                current_user_rank = entry['rank']
-                break
-        
         return Response({
             'season': {
                 'id': season.id,
@@ -168,6 +243,19 @@ class LeaderboardView(views.APIView):
                 'time_remaining': season.time_remaining()
             },
             'leaderboard': leaderboard,
-            'current_user_rank': current_user_rank
+            'current_user_rank': rank_index.rank(season.id, request.user.id)
         })
 
+
+class LeaderboardStreamTicketView(views.APIView):
+    """POST returns a short-lived ticket for opening leaderboard/stream/?ticket= (see game/live.py)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        season = get_active_season()
+        if not season:
+            return Response({'error': 'No active season'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'ticket': issue_stream_ticket(request.user, season),
+            'expires_in': getattr(settings, 'LEADERBOARD_STREAM_TICKET_TTL', 30)
+        })
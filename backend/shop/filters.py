@@ -0,0 +1,11 @@
+import django_filters
+from .models import Order
+
+
+class OrderFilter(django_filters.FilterSet):
+    created_after = django_filters.DateFilter(field_name='created_at', lookup_expr='date__gte')
+    created_before = django_filters.DateFilter(field_name='created_at', lookup_expr='date__lte')
+
+    class Meta:
+        model = Order
+        fields = ['student']
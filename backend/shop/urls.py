@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ShopItemViewSet, OrderViewSet, BuyItemView, AdminShopItemViewSet
+from .views import ShopItemViewSet, OrderViewSet, BuyItemView, AdminShopItemViewSet, AdminOrderViewSet
 
 router = DefaultRouter()
 router.register(r'shop/items', ShopItemViewSet)
 router.register(r'shop/history', OrderViewSet, basename='history')
 router.register(r'admin/shop/items', AdminShopItemViewSet, basename='admin-shop-items')
+router.register(r'admin/shop/orders', AdminOrderViewSet, basename='admin-shop-orders')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,8 +1,13 @@
 from rest_framework import viewsets, permissions, views, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import ShopItem, Order, OrderItem
 from .serializers import ShopItemSerializer, OrderSerializer
 from django.db import transaction
+from users.models import CoinLedgerEntry
+from users.ledger import post_entry, InsufficientFunds
+from users.exports import export_response, rows, batches
+from .filters import OrderFilter
 
 class ShopItemViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ShopItem.objects.filter(is_active=True)
@@ -28,16 +33,14 @@ class BuyItemView(views.APIView):
 
         student = request.user
         
-        if student.coins < item.price_coins:
+        try:
+            with transaction.atomic():
+                # Simple single item order for MVP
+                order = Order.objects.create(student=student, total_coins=item.price_coins)
+                OrderItem.objects.create(order=order, shop_item=item, qty=1, price_coins=item.price_coins)
+                post_entry(student, -item.price_coins, CoinLedgerEntry.Reason.PURCHASE, reference=f'order:{order.id}')
+        except InsufficientFunds:
             return Response({'error': 'Not enough coins'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            student.coins -= item.price_coins
-            student.save()
-            
-            # Simple single item order for MVP
-            order = Order.objects.create(student=student, total_coins=item.price_coins)
-            OrderItem.objects.create(order=order, shop_item=item, qty=1, price_coins=item.price_coins)
             
         return Response({'success': True, 'new_balance': student.coins})
 
@@ -47,3 +50,34 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         return Order.objects.filter(student=self.request.user)
+
+
+def _order_rows(orders):
+    """Order rows with their items as "title x qty" joined by "; ", one item query per chunk of orders"""
+    for batch in batches(rows(orders, 'id', 'student_id', 'student__username', 'total_coins', 'created_at')):
+        items = {}
+        lines = (
+            OrderItem.objects
+            .filter(order_id__in=[row[0] for row in batch])
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'shop_item__title', 'qty')
+        )
+        for order_id, title, qty in lines:
+            items.setdefault(order_id, []).append(f'{title} x{qty}')
+        for row in batch:
+            yield row + ('; '.join(items.get(row[0], [])),)
+
+
+class AdminOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """All orders for admins; ?student= and ?created_after= / ?created_before= filter the list and export"""
+    queryset = Order.objects.all().order_by('-created_at')
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filterset_class = OrderFilter
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream orders as CSV/XLSX (?filetype=)"""
+        orders = self.filter_queryset(self.get_queryset()).order_by('id')
+        header = ['id', 'student_id', 'student', 'total_coins', 'created_at', 'items']
+        return export_response(request, 'orders', header, _order_rows(orders))
@@ -0,0 +1,162 @@
+"""
+Daily activity tracking.
+
+touch() marks a user active today in a per-process buffer; nothing is
+written on the request path. The buffer is flushed into ActivityMonth
+bitmaps (one row per user and month, bit d - 1 for day d) after a response
+has been sent, once ACTIVITY_FLUSH_INTERVAL seconds passed or
+ACTIVITY_FLUSH_SIZE touches are pending, and when the process exits.
+Touches buffered by a process that dies are lost, which only costs a day of
+streak at worst.
+
+Streaks and heatmaps are computed on read from the bitmaps plus this
+process's pending touches.
+"""
+import atexit
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import User, ActivityMonth
+
+HEATMAP_DAYS = 365
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = {}  # (user_id, month) -> bitmap of days not written yet
+_state = {'last_flush': time.monotonic()}
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _bit(day):
+    return 1 << (day.day - 1)
+
+
+def touch(user, day=None):
+    """Record that `user` was active on `day` (today by default) without writing to the database"""
+    day = day or timezone.localdate()
+    key = (user.pk, _month(day))
+    with _lock:
+        _pending[key] = _pending.get(key, 0) | _bit(day)
+
+
+def flush_activity():
+    """Write pending touches: one UPDATE per distinct (month, bitmap). Returns the number of rows touched."""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _state['last_flush'] = time.monotonic()
+    if not pending:
+        return 0
+
+    try:
+        with transaction.atomic():
+            # Users deleted since they were touched are dropped
+            existing = set(User.objects.filter(pk__in={user_id for user_id, _ in pending}).values_list('pk', flat=True))
+            groups = defaultdict(list)
+            for (user_id, month), bits in pending.items():
+                if user_id in existing:
+                    groups[(month, bits)].append(user_id)
+
+            ActivityMonth.objects.bulk_create(
+                [ActivityMonth(user_id=user_id, month=month) for user_id, month in pending if user_id in existing],
+                ignore_conflicts=True
+            )
+            for (month, bits), user_ids in groups.items():
+                ActivityMonth.objects.filter(user_id__in=user_ids, month=month).update(days=F('days').bitor(bits))
+    except Exception:
+        # Keep the touches for the next flush
+        with _lock:
+            for key, bits in pending.items():
+                _pending[key] = _pending.get(key, 0) | bits
+        raise
+    return len(pending)
+
+
+def _flush_quietly():
+    try:
+        flush_activity()
+    except Exception:
+        # Runs after the response or at exit; the touches stay buffered for the next attempt
+        logger.exception('Could not flush activity')
+
+
+def _flush_if_due(**kwargs):
+    with _lock:
+        due = _pending and (
+            len(_pending) >= getattr(settings, 'ACTIVITY_FLUSH_SIZE', 500)
+            or time.monotonic() - _state['last_flush'] >= getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 30)
+        )
+    if due:
+        _flush_quietly()
+
+
+request_finished.connect(_flush_if_due, dispatch_uid='users.activity.flush')
+atexit.register(_flush_quietly)
+
+
+def active_days(user_id, start, end):
+    """Set of dates between start and end (inclusive) the user was active on"""
+    bitmaps = dict(
+        ActivityMonth.objects
+        .filter(user_id=user_id, month__gte=_month(start), month__lte=end)
+        .values_list('month', 'days')
+    )
+    with _lock:
+        for (pending_user, month), bits in _pending.items():
+            if pending_user == user_id and _month(start) <= month <= end:
+                bitmaps[month] = bitmaps.get(month, 0) | bits
+
+    days = set()
+    for month, bits in bitmaps.items():
+        while bits:
+            low = bits & -bits
+            day = month.replace(day=low.bit_length())
+            if start <= day <= end:
+                days.add(day)
+            bits ^= low
+    return days
+
+
+def streak(user_id, today=None):
+    """
+    Consecutive active days ending today, or yesterday when today has no
+    activity yet. Returns (length, last active day or None).
+    """
+    today = today or timezone.localdate()
+    length = 0
+    end = today
+    last_active = None
+    while True:
+        # Read a year at a time; almost every streak ends inside the first one
+        start = end - datetime.timedelta(days=HEATMAP_DAYS - 1)
+        days = active_days(user_id, start, end)
+        day = end
+        if last_active is None:
+            if today not in days:
+                day = today - datetime.timedelta(days=1)
+            last_active = day if day in days else None
+        while day >= start and day in days:
+            length += 1
+            day -= datetime.timedelta(days=1)
+        if day >= start or not length:
+            return length, last_active
+        end = start - datetime.timedelta(days=1)
+
+
+def heatmap(user_id, today=None, days=HEATMAP_DAYS):
+    """One 0/1 flag per day for the last `days` days, oldest first"""
+    today = today or timezone.localdate()
+    start = today - datetime.timedelta(days=days - 1)
+    active = active_days(user_id, start, today)
+    return start, [int(start + datetime.timedelta(days=offset) in active) for offset in range(days)]
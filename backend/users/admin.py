@@ -1,6 +1,80 @@
-from django.contrib import admin
-from .models import User, StudyGroup, Attendance
+from django import forms
+from django.contrib import admin, messages
+from .authentication import REVOKING_FIELDS, revoke_tokens
+from .ledger import post_entry, InsufficientFunds
+from .models import User, StudyGroup, Attendance, CoinLedgerEntry, CoinBalanceSnapshot, MetricsSnapshot
+
+
+class UserAdminForm(forms.ModelForm):
+    coins_adjustment = forms.IntegerField(
+        required=False, label='Adjust coins by',
+        help_text='Credited (or debited, if negative) through the coin ledger'
+    )
+
+    class Meta:
+        model = User
+        exclude = ['coins']
+
+    def clean_coins_adjustment(self):
+        adjustment = self.cleaned_data.get('coins_adjustment') or 0
+        if adjustment < 0 and self.instance.coins + adjustment < 0:
+            raise forms.ValidationError(f'The balance is only {self.instance.coins} coins')
+        return adjustment
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    form = UserAdminForm
+    # coins is moved only by the ledger; use "Adjust coins by"
+    readonly_fields = ['coins']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.save()
+        else:
+            # Only what the form changed, so a balance moved meanwhile is not written back
+            concrete = {field.name for field in obj._meta.concrete_fields}
+            update_fields = [name for name in form.changed_data if name in concrete]
+            if update_fields:
+                obj.save(update_fields=update_fields)
+        if change and set(form.changed_data).intersection(REVOKING_FIELDS + ['password']):
+            revoke_tokens(obj)
+        adjustment = form.cleaned_data.get('coins_adjustment')
+        if adjustment:
+            try:
+                post_entry(obj, adjustment, CoinLedgerEntry.Reason.ADJUSTMENT, reference=f'admin:{request.user.pk}')
+            except InsufficientFunds as error:
+                self.message_user(request, str(error), messages.ERROR)
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """Append-only records: they can be browsed but not added, edited or deleted"""
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CoinLedgerEntry)
+class CoinLedgerEntryAdmin(ReadOnlyAdmin):
+    list_display = ['id', 'user', 'amount', 'reason', 'reference', 'created_at']
+    list_filter = ['reason']
+    search_fields = ['reference', 'user__username']
+
+
+@admin.register(CoinBalanceSnapshot)
+class CoinBalanceSnapshotAdmin(ReadOnlyAdmin):
+    list_display = ['id', 'user', 'balance', 'last_entry_id', 'created_at']
+
 
-admin.site.register(User)
 admin.site.register(StudyGroup)
 admin.site.register(Attendance)
+admin.site.register(MetricsSnapshot)
@@ -0,0 +1,226 @@
+"""
+AI tutor chat.
+
+A provider turns a prompt into an async stream of text chunks. AI_PROVIDER
+names the provider class; it is built once per process, so the Gemini client
+is configured once and reused. EchoProvider answers locally for development
+and tests.
+
+Provider calls go through a per-process limiter: at most AI_MAX_CONCURRENCY
+run at once and up to AI_MAX_QUEUE more wait AI_QUEUE_TIMEOUT seconds for a
+slot before the request is turned away with Busy. Waiting happens on the
+event loop, so queued chats do not hold a worker; serve AIChatView through
+config.asgi.
+"""
+import asyncio
+import json
+import threading
+import weakref
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = """You are a helpful programming tutor for MarsSpace educational platform.
+You help students learn programming concepts in a clear and friendly way.
+Answer in {language}.
+Student question: {message}"""
+
+LANGUAGE_NAMES = {'ru': 'Russian', 'uz': 'Uzbek'}
+
+
+class ProviderUnavailable(Exception):
+    """The provider can not be used: missing package, key or a failed call"""
+
+
+class Busy(Exception):
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__('The AI tutor is busy, try again shortly')
+
+
+class ChatProvider:
+    """Interface of AI providers: stream() is an async iterator of text chunks"""
+
+    def stream(self, prompt):
+        raise NotImplementedError
+
+
+class EchoProvider(ChatProvider):
+    """Local stand-in that repeats the question back word by word"""
+
+    async def stream(self, prompt):
+        question = prompt.rsplit('Student question:', 1)[-1].strip()
+        for index, word in enumerate(f'You asked: {question}'.split()):
+            yield word if index == 0 else ' ' + word
+
+
+class GeminiProvider(ChatProvider):
+
+    def __init__(self):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise ProviderUnavailable('AI service configuration error (missing package)')
+
+        api_key = getattr(settings, 'GEMINI_API_KEY', '')
+        if not api_key:
+            raise ProviderUnavailable('AI service is not configured (missing key)')
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(getattr(settings, 'GEMINI_MODEL', 'gemini-pro'))
+
+    async def stream(self, prompt):
+        try:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as error:
+            raise ProviderUnavailable(f'AI Error: {error}') from error
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider():
+    """The configured provider, built on first use. Raises ProviderUnavailable."""
+    path = getattr(settings, 'AI_PROVIDER', 'users.ai.GeminiProvider')
+    with _providers_lock:
+        if path not in _providers:
+            _providers[path] = import_string(path)()
+        return _providers[path]
+
+
+def build_prompt(message, language):
+    return SYSTEM_PROMPT.format(language=LANGUAGE_NAMES.get(language, 'Russian'), message=message)
+
+
+class ConcurrencyLimiter:
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._waiting = 0
+        # asyncio semaphores belong to one event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return self._semaphores[loop]
+
+    async def acquire(self):
+        """Wait for a slot and return its release callable (safe to call twice). Raises Busy."""
+        semaphore = self._semaphore()
+        if semaphore.locked():
+            if self._waiting >= self.queue:
+                raise Busy(self.timeout)
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise Busy(self.timeout)
+            finally:
+                self._waiting -= 1
+        else:
+            await semaphore.acquire()
+
+        loop = asyncio.get_running_loop()
+        released = []
+
+        def release():
+            if released:
+                return
+            released.append(True)
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                semaphore.release()
+                return
+            # response.close() runs in a worker thread
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                pass  # the loop is gone and its semaphore with it
+        return release
+
+
+_limiters = {}
+
+
+def get_limiter():
+    config = (
+        getattr(settings, 'AI_MAX_CONCURRENCY', 4),
+        getattr(settings, 'AI_MAX_QUEUE', 16),
+        getattr(settings, 'AI_QUEUE_TIMEOUT', 10),
+    )
+    if config not in _limiters:
+        _limiters[config] = ConcurrencyLimiter(*config)
+    return _limiters[config]
+
+
+async def next_chunk(chunks):
+    """The provider's next chunk, or None at the end. Raises ProviderUnavailable when it stalls."""
+    try:
+        return await asyncio.wait_for(chunks.__anext__(), getattr(settings, 'AI_RESPONSE_TIMEOUT', 30))
+    except StopAsyncIteration:
+        return None
+    except asyncio.TimeoutError:
+        raise ProviderUnavailable('AI Error: the model took too long to answer')
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def reply_events(first, chunks, on_done=None):
+    """
+    Server-sent `delta` events for the reply, then `done`, or `error` when the
+    provider fails midway. on_done(reply) is awaited with the whole reply text.
+    """
+    parts = []
+    chunk = first
+    try:
+        while chunk is not None:
+            parts.append(chunk)
+            yield _event('delta', {'text': chunk})
+            chunk = await next_chunk(chunks)
+    except ProviderUnavailable as error:
+        yield _event('error', {'error': str(error)})
+        return
+    if on_done is not None:
+        await on_done(''.join(parts))
+    yield _event('done', {'timestamp': timezone.now()})
+
+
+async def cached_events(reply):
+    yield _event('delta', {'text': reply})
+    yield _event('done', {'timestamp': timezone.now(), 'cached': True})
+
+
+class ReleasingStream:
+    """
+    Async content for a StreamingHttpResponse that releases the limiter slot
+    when the stream ends or fails, or when the response is closed unread.
+    """
+
+    def __init__(self, events, release):
+        self.events = events
+        self.release = release
+
+    async def __aiter__(self):
+        try:
+            async for event in self.events:
+                yield event
+        finally:
+            self.release()
+
+    def close(self):
+        self.release()
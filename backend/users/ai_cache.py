@@ -0,0 +1,161 @@
+"""
+In-process cache of AI tutor replies.
+
+Replies are keyed on the normalized question (case, punctuation and spacing
+ignored), the student's language and ai.PROMPT_VERSION, so changing the
+system prompt retires old answers. Entries expire after AI_CACHE_TTL seconds
+and the least recently used are evicted beyond AI_CACHE_SIZE entries.
+
+With AI_CACHE_SIMILARITY above 0 a miss also looks for a cached question
+whose word shingles (single words and pairs) overlap at least that much
+(Jaccard), found through an inverted index rather than a scan.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from .ai import PROMPT_VERSION
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+
+def normalize_prompt(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def shingles(normalized):
+    words = normalized.split()
+    return frozenset(words) | frozenset(zip(words, words[1:]))
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries, ttl, similarity):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, reply, scope, shingles)
+        self._index = {}  # (scope, shingle) -> set of keys
+        self.hits = self.near_hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _scope(language):
+        return f'{PROMPT_VERSION}:{language}'
+
+    @staticmethod
+    def _key(scope, normalized):
+        return hashlib.sha1(f'{scope}:{normalized}'.encode()).hexdigest()
+
+    def _drop(self, key):
+        _, _, scope, words = self._entries.pop(key)
+        for shingle in words:
+            keys = self._index.get((scope, shingle))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[(scope, shingle)]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, scope, words, now):
+        candidates = set()
+        for shingle in words:
+            candidates |= self._index.get((scope, shingle), set())
+        scored = []
+        for key in candidates:
+            other = self._entries[key][3]
+            score = len(words & other) / len(words | other)
+            if score >= self.similarity:
+                scored.append((score, key))
+        # Most similar first; expired entries are dropped on the way
+        for _, key in sorted(scored, reverse=True):
+            entry = self._live(key, now)
+            if entry is not None:
+                return entry
+        return None
+
+    def get(self, message, language):
+        """The cached reply for the question, or None"""
+        normalized = normalize_prompt(message)
+        scope = self._scope(language)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(self._key(scope, normalized), now)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            if self.similarity > 0 and normalized:
+                entry = self._nearest(scope, shingles(normalized), now)
+                if entry:
+                    self.near_hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, message, language, reply):
+        normalized = normalize_prompt(message)
+        if not normalized:
+            return
+        scope = self._scope(language)
+        key = self._key(scope, normalized)
+        words = shingles(normalized) if self.similarity > 0 else frozenset()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, reply, scope, words)
+            for shingle in words:
+                self._index.setdefault((scope, shingle), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self.hits = self.near_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.near_hits) / lookups, 3) if lookups else None,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The process's reply cache, or None when AI_CACHE_SIZE is 0"""
+    config = (
+        getattr(settings, 'AI_CACHE_SIZE', 1000),
+        getattr(settings, 'AI_CACHE_TTL', 3600),
+        getattr(settings, 'AI_CACHE_SIMILARITY', 0),
+    )
+    if not config[0]:
+        return None
+    with _caches_lock:
+        if config not in _caches:
+            _caches[config] = ResponseCache(*config)
+        return _caches[config]
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import activity  # noqa: F401  connects the activity flush
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
@@ -0,0 +1,149 @@
+"""
+JWT authentication.
+
+Tokens carry the user's token_version; revoke_tokens() bumps it, so every
+token issued before a role change, deactivation or new password is refused.
+
+CachedJWTAuthentication resolves the user of a token from a short-lived
+cache entry, keyed by user id and token version, instead of loading the user
+row on every request. The entry holds what permission checks read (role,
+staff flags, premium state and group memberships); the instance it returns
+is an AuthenticatedUser whose other fields are loaded together, in one query,
+on first access. Entries are dropped whenever a user is saved or deleted and
+whenever their groups change (see users/signals.py); PRINCIPAL_CACHE_TIMEOUT
+bounds staleness for changes made with queryset.update().
+
+Invalidation only reaches other workers through a shared cache, so the
+principal cache is off (PRINCIPAL_CACHE_TIMEOUT = 0) unless CACHE_URL is set,
+and enabling it over a per-process cache fails the users.E001 system check.
+
+authenticate_jwt() is for plain Django views that run outside DRF.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .models import User, AuthenticatedUser
+
+# Bump when the cached fields change so old entries are ignored
+PRINCIPAL_VERSION = 1
+
+PRINCIPAL_FIELDS = [
+    'id', 'username', 'role', 'language', 'is_active', 'is_staff', 'is_superuser',
+    'has_premium', 'premium_expires_at', 'token_version'
+]
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+# Changing any of these (or the password) revokes the user's tokens
+REVOKING_FIELDS = ['role', 'is_active', 'is_staff', 'is_superuser']
+
+
+def principal_cache_timeout():
+    return getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', 0)
+
+
+def principal_key(user_id, token_version):
+    return f'auth:principal:v{PRINCIPAL_VERSION}:{user_id}:{token_version}'
+
+
+def principal_keys(user_ids):
+    """Cache keys of the users' principals at their current token versions"""
+    return [
+        principal_key(user_id, token_version)
+        for user_id, token_version in User.objects.filter(pk__in=user_ids).values_list('id', 'token_version')
+    ]
+
+
+def revoke_tokens(user):
+    """Refuse every token issued to user so far; they have to log in again"""
+    keys = principal_keys([user.pk])
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    user.refresh_from_db(fields=['token_version'])
+    cache.delete_many(keys)
+
+
+def _principal_fields():
+    if api_settings.CHECK_REVOKE_TOKEN:
+        return PRINCIPAL_FIELDS + ['password']
+    return PRINCIPAL_FIELDS
+
+
+def load_principal(user_id, token_version=0):
+    """
+    The AuthenticatedUser for user_id, from the cache when it is enabled, or
+    None if there is no such user. token_version is the token's claim; the
+    caller compares it with the principal's.
+    """
+    timeout = principal_cache_timeout()
+    key = principal_key(user_id, token_version)
+    data = cache.get(key) if timeout else None
+    if data is None:
+        fields = _principal_fields()
+        values = User.objects.filter(pk=user_id).values(*fields).first()
+        if values is None:
+            return None
+        user = User(pk=user_id)
+        data = {
+            'fields': values,
+            'teaching_group_ids': list(user.teaching_groups.values_list('id', flat=True)),
+            'learning_group_ids': list(user.learning_groups.values_list('id', flat=True)),
+        }
+        if timeout:
+            cache.set(key, data, timeout)
+
+    # from_db expects the values in model field order
+    fields = data['fields']
+    names = [field.attname for field in AuthenticatedUser._meta.concrete_fields if field.attname in fields]
+    principal = AuthenticatedUser.from_db('default', names, [fields[name] for name in names])
+    principal.teaching_group_ids = data['teaching_group_ids']
+    principal.learning_group_ids = data['learning_group_ids']
+    return principal
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that checks the token version and reads the user from the principal cache"""
+
+    def get_user(self, validated_token):
+        token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        if not principal_cache_timeout():
+            user = super().get_user(validated_token)
+        else:
+            try:
+                user_id = validated_token[api_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken('Token contained no recognizable user identification')
+
+            user = load_principal(user_id, token_version)
+            if user is None:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            if api_settings.CHECK_REVOKE_TOKEN:
+                if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                    raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+
+        if user.token_version != token_version:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return user
+
+
+def authenticate_jwt(request):
+    """
+    Return the user of a plain Django request with a JWT in its Authorization
+    header, or None. Tokens are never read from the URL, where they would be
+    logged (see game/live.py for stream tickets).
+    """
+    authentication = CachedJWTAuthentication()
+    try:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if not raw_token:
+            return None
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries live in one process only
+PROCESS_LOCAL_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+@register(Tags.caches, Tags.security)
+def check_principal_cache(app_configs, **kwargs):
+    """The principal cache is only safe when invalidations reach every worker"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', 0) and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            'PRINCIPAL_CACHE_TIMEOUT is set but the default cache is not shared between workers; '
+            'a role change or deactivation would not reach the other workers until the entry expires.',
+            hint='Set CACHE_URL (e.g. redis://...) or PRINCIPAL_CACHE_TIMEOUT=0.',
+            id='users.E001',
+        )]
+    return []
@@ -0,0 +1,51 @@
+"""
+Premium entitlements.
+
+A subscription is active while has_premium is set and premium_expires_at is
+in the future; no expiry date means it never expires. Admins and teachers
+are entitled without one. is_entitled() is the single check behind every
+premium gate; it reads only fields of the cached JWT principal (see
+users/authentication.py), so it costs no query.
+
+has_premium is cleared by expire_subscriptions(), run from cron through the
+expire_subscriptions command; until then is_entitled() already treats an
+expired subscription as inactive.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from .authentication import principal_keys
+from .models import User
+
+ENTITLED_ROLES = (User.Role.ADMIN, User.Role.TEACHER)
+
+
+def active_premium_q(now=None):
+    """Filter for users with an active subscription"""
+    now = now or timezone.now()
+    return Q(has_premium=True) & (Q(premium_expires_at__isnull=True) | Q(premium_expires_at__gt=now))
+
+
+def premium_active(user, now=None):
+    if not user.has_premium:
+        return False
+    return user.premium_expires_at is None or user.premium_expires_at > (now or timezone.now())
+
+
+def is_entitled(user, now=None):
+    """Whether user may use premium content"""
+    if not user or not user.is_authenticated:
+        return False
+    return user.role in ENTITLED_ROLES or premium_active(user, now)
+
+
+def expire_subscriptions(now=None):
+    """Clear has_premium of every lapsed subscription with one UPDATE. Returns the user ids expired."""
+    now = now or timezone.now()
+    lapsed = User.objects.filter(has_premium=True, premium_expires_at__lte=now)
+    user_ids = list(lapsed.values_list('id', flat=True))
+    if user_ids:
+        keys = principal_keys(user_ids)
+        lapsed.filter(id__in=user_ids).update(has_premium=False)
+        cache.delete_many(keys)
+    return user_ids
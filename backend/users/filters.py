@@ -0,0 +1,52 @@
+import django_filters
+from django.db.models import Q
+from .models import User, StudyGroup, Attendance
+from .search import search_users
+from .entitlements import active_premium_q
+
+
+class StudyGroupFilter(django_filters.FilterSet):
+    """Filters for the group list; the count filters need a with_member_counts() queryset"""
+    min_students = django_filters.NumberFilter(field_name='students_count', lookup_expr='gte')
+    max_students = django_filters.NumberFilter(field_name='students_count', lookup_expr='lte')
+    min_teachers = django_filters.NumberFilter(field_name='teachers_count', lookup_expr='gte')
+    max_teachers = django_filters.NumberFilter(field_name='teachers_count', lookup_expr='lte')
+
+    class Meta:
+        model = StudyGroup
+        fields = ['is_active', 'teacher']
+
+
+class UserFilter(django_filters.FilterSet):
+    """?search= matches the start of every word against username, names and email (see users/search.py)"""
+    search = django_filters.CharFilter(method='filter_search')
+    group = django_filters.NumberFilter(method='filter_group')
+    premium = django_filters.BooleanFilter(method='filter_premium')
+    joined_after = django_filters.DateFilter(field_name='date_joined', lookup_expr='date__gte')
+    joined_before = django_filters.DateFilter(field_name='date_joined', lookup_expr='date__lte')
+
+    class Meta:
+        model = User
+        fields = ['role', 'is_active', 'has_premium']
+
+    def filter_search(self, queryset, name, value):
+        return search_users(queryset, value)
+
+    def filter_group(self, queryset, name, value):
+        # Teachers and students of the group; a subquery rather than a join so nobody is listed twice
+        members = User.objects.filter(Q(learning_groups=value) | Q(teaching_groups=value)).values('id')
+        return queryset.filter(id__in=members)
+
+    def filter_premium(self, queryset, name, value):
+        active = active_premium_q()
+        return queryset.filter(active) if value else queryset.exclude(active)
+
+
+class AttendanceFilter(django_filters.FilterSet):
+    """group_id and date are read by AttendanceViewSet.get_queryset"""
+    date_after = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_before = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = Attendance
+        fields = ['student', 'is_present']
@@ -0,0 +1,163 @@
+"""
+Coin ledger.
+
+Every change to a user's coins is an append-only CoinLedgerEntry. User.coins
+is a cached balance moved with F() updates in the same transaction, so two
+concurrent requests never overwrite each other and a debit can not take a
+balance below zero. Nothing else writes coins: user saves name their
+update_fields, so a stale instance never writes an old balance back.
+
+CoinBalanceSnapshot rows checkpoint each user's balance at an entry id, so a
+balance is rebuilt from the latest snapshot plus the entries after it rather
+than from the whole history. snapshot_coin_balances writes new checkpoints
+and reconcile_coins compares User.coins with the ledger.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import User, CoinLedgerEntry, CoinBalanceSnapshot
+
+# Entries younger than this are left out of snapshots: ids are assigned before
+# commit, so a recent entry with a lower id may still become visible later
+SNAPSHOT_LAG = timedelta(minutes=1)
+
+
+class InsufficientFunds(Exception):
+
+    def __init__(self, balance, amount):
+        self.balance = balance
+        self.amount = amount
+        super().__init__(f'Insufficient coins. You have {balance} coins, need {amount}')
+
+
+def post_entry(user, amount, reason, reference=''):
+    """
+    Credit (amount > 0) or debit (amount < 0) one user and record the entry.
+    Raises InsufficientFunds when a debit exceeds the balance. Updates
+    user.coins in place and returns the entry, or None for a zero amount.
+    """
+    if not amount:
+        return None
+
+    with transaction.atomic():
+        users = User.objects.filter(pk=user.pk)
+        if amount < 0:
+            users = users.filter(coins__gte=-amount)
+        if not users.update(coins=F('coins') + amount):
+            balance = User.objects.values_list('coins', flat=True).get(pk=user.pk)
+            raise InsufficientFunds(balance, -amount)
+
+        entry = CoinLedgerEntry.objects.create(user_id=user.pk, amount=amount, reason=reason, reference=reference)
+        user.coins = User.objects.values_list('coins', flat=True).get(pk=user.pk)
+    return entry
+
+
+def post_entries(amounts, reason, reference=''):
+    """
+    Credit many users at once. `amounts` maps user id to a positive amount.
+    Runs one UPDATE per distinct amount and one bulk INSERT.
+    """
+    by_amount = defaultdict(list)
+    for user_id, amount in amounts.items():
+        if amount < 0:
+            raise ValueError('post_entries only credits; use post_entry for debits')
+        if amount:
+            by_amount[amount].append(user_id)
+    if not by_amount:
+        return []
+
+    with transaction.atomic():
+        for amount, user_ids in by_amount.items():
+            User.objects.filter(id__in=user_ids).update(coins=F('coins') + amount)
+        return CoinLedgerEntry.objects.bulk_create([
+            CoinLedgerEntry(user_id=user_id, amount=amount, reason=reason, reference=reference)
+            for amount, user_ids in by_amount.items()
+            for user_id in user_ids
+        ], batch_size=1000)
+
+
+def _latest_snapshot(field):
+    return Subquery(
+        CoinBalanceSnapshot.objects
+        .filter(user=OuterRef('user_id'))
+        .order_by('-last_entry_id')
+        .values(field)[:1]
+    )
+
+
+def _entries_since_snapshot(user_ids=None, upto=None):
+    """Per-user sum and last id of the entries after each user's latest snapshot"""
+    entries = CoinLedgerEntry.objects.annotate(snapshot_entry=_latest_snapshot('last_entry_id'))
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    if upto is not None:
+        entries = entries.filter(id__lte=upto)
+    return (
+        entries
+        .filter(Q(snapshot_entry__isnull=True) | Q(id__gt=F('snapshot_entry')))
+        .order_by()
+        .values('user_id')
+        .annotate(delta=Sum('amount'), last_entry_id=Max('id'))
+    )
+
+
+def _snapshot_balances(user_ids=None):
+    snapshots = CoinBalanceSnapshot.objects.filter(
+        id=Subquery(
+            CoinBalanceSnapshot.objects
+            .filter(user=OuterRef('user'))
+            .order_by('-last_entry_id')
+            .values('id')[:1]
+        )
+    )
+    if user_ids is not None:
+        snapshots = snapshots.filter(user_id__in=user_ids)
+    return dict(snapshots.values_list('user_id', 'balance'))
+
+
+def ledger_balances(user_ids=None):
+    """Balances rebuilt from snapshots and later entries, by user id (users without entries are left out)"""
+    balances = _snapshot_balances(user_ids)
+    for row in _entries_since_snapshot(user_ids):
+        balances[row['user_id']] = balances.get(row['user_id'], 0) + row['delta']
+    return balances
+
+
+def ledger_balance(user):
+    return ledger_balances([user.pk]).get(user.pk, 0)
+
+
+def take_snapshots():
+    """Checkpoint every user with entries since their last snapshot. Returns the number written."""
+    upto = (
+        CoinLedgerEntry.objects
+        .filter(created_at__lte=timezone.now() - SNAPSHOT_LAG)
+        .aggregate(last=Max('id'))['last']
+    )
+    if upto is None:
+        return 0
+
+    rows = list(_entries_since_snapshot(upto=upto))
+    previous = _snapshot_balances([row['user_id'] for row in rows])
+    CoinBalanceSnapshot.objects.bulk_create([
+        CoinBalanceSnapshot(
+            user_id=row['user_id'],
+            balance=previous.get(row['user_id'], 0) + row['delta'],
+            last_entry_id=row['last_entry_id']
+        )
+        for row in rows
+    ], batch_size=1000)
+    return len(rows)
+
+
+def find_mismatches():
+    """(user_id, cached coins, ledger balance) for every user whose User.coins disagrees with the ledger"""
+    balances = ledger_balances()
+    mismatches = []
+    for user_id, coins in User.objects.values_list('id', 'coins').iterator():
+        balance = balances.get(user_id, 0)
+        if coins != balance:
+            mismatches.append((user_id, coins, balance))
+    return mismatches
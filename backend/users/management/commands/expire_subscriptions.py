@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.entitlements import expire_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Clear has_premium on lapsed subscriptions (run from cron)'
+
+    def handle(self, *args, **options):
+        expired = expire_subscriptions()
+        self.stdout.write(self.style.SUCCESS(f'Expired {len(expired)} subscriptions'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from users.models import StudyGroup
+from users.schedule import rebuild_lesson_slots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the lesson slot index from every study group schedule'
+
+    def handle(self, *args, **options):
+        count = 0
+        for group in StudyGroup.objects.iterator():
+            count += len(rebuild_lesson_slots(group))
+        self.stdout.write(self.style.SUCCESS(f'Built {count} lesson slots'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create or repair the user search index (needed on SQLite after a migration rebuilds users_user)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            installed = install_search_index()
+        if installed:
+            self.stdout.write(self.style.SUCCESS('User search index rebuilt'))
+        else:
+            self.stdout.write(self.style.WARNING('No search index for this database; search falls back to prefix lookups'))
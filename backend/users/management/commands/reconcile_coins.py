@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from users.models import User, CoinLedgerEntry
+from users.ledger import find_mismatches, ledger_balance
+
+
+class Command(BaseCommand):
+    help = 'Compare cached User.coins balances with the coin ledger'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--fix', action='store_true', help='Reset User.coins to the ledger balance')
+        group.add_argument(
+            '--adjust', action='store_true',
+            help='Post adjustment entries so the ledger matches User.coins (after edits outside the ledger)'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = find_mismatches()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All balances match the ledger'))
+            return
+
+        for user_id, coins, balance in mismatches:
+            self.stdout.write(f'  user {user_id}: coins={coins} ledger={balance} ({coins - balance:+d})')
+
+        if not (options['fix'] or options['adjust']):
+            raise CommandError(f'{len(mismatches)} balances do not match the ledger')
+
+        fixed = 0
+        for user_id, _, _ in mismatches:
+            with transaction.atomic():
+                # Re-check under the row lock that every posting takes
+                coins = User.objects.select_for_update().values_list('coins', flat=True).get(pk=user_id)
+                balance = ledger_balance(User(pk=user_id))
+                if coins == balance:
+                    continue
+                if options['fix']:
+                    User.objects.filter(pk=user_id).update(coins=balance)
+                else:
+                    CoinLedgerEntry.objects.create(
+                        user_id=user_id,
+                        amount=coins - balance,
+                        reason=CoinLedgerEntry.Reason.ADJUSTMENT,
+                        reference='reconcile'
+                    )
+                fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} balances'))
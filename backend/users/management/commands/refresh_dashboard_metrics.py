@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.metrics import refresh_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin dashboard metrics snapshot (run from cron)'
+
+    def handle(self, *args, **options):
+        snapshot = refresh_metrics()
+        self.stdout.write(self.style.SUCCESS(f'Dashboard metrics refreshed at {snapshot.created_at:%Y-%m-%d %H:%M:%S}'))
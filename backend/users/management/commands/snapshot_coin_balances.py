@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint coin balances so ledger balances are rebuilt from recent entries only'
+
+    def handle(self, *args, **options):
+        count = take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} balance snapshots'))
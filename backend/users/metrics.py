@@ -0,0 +1,130 @@
+"""
+Admin dashboard metrics.
+
+refresh_metrics() computes every aggregate at once, stores it as a
+MetricsSnapshot row and caches it. The dashboard reads get_metrics(), which
+serves the cached snapshot (or the latest row when the cache is cold) with
+its age, so a page load costs at most one indexed query whatever the table
+sizes. A snapshot older than DASHBOARD_METRICS_MAX_AGE is still served, and a
+refresh is run once the response has been sent; run refresh_dashboard_metrics
+from cron to keep it warm, or pass force=True to recompute on the spot.
+"""
+import datetime
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from courses.models import Course, HomeworkSubmission
+from eduverse.models import HomeworkSubmission as EduverseSubmission
+from game.models import TypingAttempt
+from .models import User, StudyGroup, ActivityMonth, MetricsSnapshot
+
+CACHE_KEY = 'dashboard-metrics'
+LOCK_KEY = 'dashboard-metrics:refreshing'
+ATTEMPT_DAYS = 14
+HISTORY = datetime.timedelta(days=7)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {'refresh_due': False}
+
+
+def _active_students(day):
+    return (
+        ActivityMonth.objects
+        .filter(month=day.replace(day=1), user__role=User.Role.STUDENT)
+        .annotate(today=F('days').bitand(1 << (day.day - 1)))
+        .exclude(today=0)
+        .count()
+    )
+
+
+def _attempts_per_day(today):
+    start = today - datetime.timedelta(days=ATTEMPT_DAYS - 1)
+    counts = dict(
+        TypingAttempt.objects
+        .filter(created_at__date__gte=start)
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('day')
+        .annotate(count=Count('id'))
+        .values_list('day', 'count')
+    )
+    days = [start + datetime.timedelta(days=offset) for offset in range(ATTEMPT_DAYS)]
+    return [{'date': day.isoformat(), 'count': counts.get(day, 0)} for day in days]
+
+
+def compute_metrics():
+    today = timezone.localdate()
+    roles = dict(User.objects.order_by().values('role').annotate(count=Count('id')).values_list('role', 'count'))
+    return {
+        'users_count': sum(roles.values()),
+        'students_count': roles.get(User.Role.STUDENT, 0),
+        'teachers_count': roles.get(User.Role.TEACHER, 0),
+        'courses_count': Course.objects.count(),
+        'groups_count': StudyGroup.objects.count(),
+        'active_students_today': _active_students(today),
+        'attempts_per_day': _attempts_per_day(today),
+        'pending_homework': (
+            HomeworkSubmission.objects.filter(status=HomeworkSubmission.Status.SUBMITTED).count()
+            + EduverseSubmission.objects.filter(graded_at__isnull=True).count()
+        ),
+        'coins_in_circulation': User.objects.aggregate(total=Sum('coins'))['total'] or 0,
+    }
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_METRICS_CACHE_TIMEOUT', 3600)
+
+
+def refresh_metrics():
+    """Compute, store and cache a new snapshot; older rows past HISTORY are dropped. Returns the snapshot."""
+    snapshot = MetricsSnapshot.objects.create(data=compute_metrics())
+    MetricsSnapshot.objects.filter(created_at__lt=snapshot.created_at - HISTORY).delete()
+    cache.set(CACHE_KEY, snapshot, _timeout())
+    return snapshot
+
+
+def _refresh_if_due(**kwargs):
+    with _lock:
+        due = _state['refresh_due']
+        _state['refresh_due'] = False
+    # One refresh at a time across processes; the lock expires if a refresh dies
+    if due and cache.add(LOCK_KEY, True, 300):
+        try:
+            refresh_metrics()
+        except Exception:
+            logger.exception('Could not refresh dashboard metrics')
+        finally:
+            cache.delete(LOCK_KEY)
+
+
+request_finished.connect(_refresh_if_due, dispatch_uid='users.metrics.refresh')
+
+
+def get_metrics(force=False):
+    """The latest snapshot's data plus computed_at, age_seconds and stale"""
+    snapshot = None if force else cache.get(CACHE_KEY)
+    if snapshot is None and not force:
+        snapshot = MetricsSnapshot.objects.order_by('-created_at').first()
+        if snapshot is not None:
+            cache.set(CACHE_KEY, snapshot, _timeout())
+    if snapshot is None:
+        snapshot = refresh_metrics()
+
+    age = (timezone.now() - snapshot.created_at).total_seconds()
+    stale = age > getattr(settings, 'DASHBOARD_METRICS_MAX_AGE', 300)
+    if stale:
+        with _lock:
+            _state['refresh_due'] = True
+    return {
+        **snapshot.data,
+        'computed_at': snapshot.created_at,
+        'age_seconds': int(age),
+        'stale': stale,
+    }
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    # Every existing balance becomes an opening entry plus a snapshot at that entry
+    User = apps.get_model('users', 'User')
+    CoinLedgerEntry = apps.get_model('users', 'CoinLedgerEntry')
+    CoinBalanceSnapshot = apps.get_model('users', 'CoinBalanceSnapshot')
+
+    CoinLedgerEntry.objects.bulk_create(
+        [
+            CoinLedgerEntry(user_id=user_id, amount=coins, reason='OPENING', reference='migration')
+            for user_id, coins in User.objects.exclude(coins=0).values_list('id', 'coins').iterator()
+        ],
+        batch_size=1000
+    )
+    CoinBalanceSnapshot.objects.bulk_create(
+        [
+            CoinBalanceSnapshot(user_id=user_id, balance=amount, last_entry_id=entry_id)
+            for entry_id, user_id, amount in CoinLedgerEntry.objects.values_list('id', 'user_id', 'amount').iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_add_max_wpm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField()),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_entry_id'], name='coin_snapshot_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoinLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(help_text='Positive for credits, negative for debits')),
+                ('reason', models.CharField(choices=[('OPENING', 'Opening balance'), ('TYPING', 'Typing reward'), ('SEASON_REWARD', 'Season reward'), ('HOMEWORK', 'Homework reward'), ('TEACHER_AWARD', 'Teacher award'), ('PURCHASE', 'Shop purchase'), ('SUBSCRIPTION', 'Premium subscription'), ('ADJUSTMENT', 'Manual adjustment')], max_length=20)),
+                ('reference', models.CharField(blank=True, help_text='What caused the entry, e.g. order:12', max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='coin_entry_user_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:49
+
+import django.db.models.deletion
+from django.conf import settings
+import datetime
+from django.db import migrations, models
+
+
+def backfill_streaks(apps, schema_editor):
+    # Turn each stored streak into active days ending at last_activity_date
+    User = apps.get_model('users', 'User')
+    ActivityMonth = apps.get_model('users', 'ActivityMonth')
+
+    bitmaps = {}
+    users = User.objects.filter(activity_days__gt=0, last_activity_date__isnull=False)
+    for user_id, streak, last_day in users.values_list('id', 'activity_days', 'last_activity_date').iterator():
+        for offset in range(streak):
+            day = last_day - datetime.timedelta(days=offset)
+            key = (user_id, day.replace(day=1))
+            bitmaps[key] = bitmaps.get(key, 0) | (1 << (day.day - 1))
+
+    ActivityMonth.objects.bulk_create(
+        [ActivityMonth(user_id=user_id, month=month, days=days) for (user_id, month), days in bitmaps.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_coin_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('days', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_months', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:54
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_activitymonth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthenticatedUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('users.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.10 on 2026-10-17 22:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_slots(apps, schema_editor):
+    # Same rules as users.schedule.rebuild_lesson_slots
+    from users.schedule import normalize_weekdays, week_minute
+    StudyGroup = apps.get_model('users', 'StudyGroup')
+    LessonSlot = apps.get_model('users', 'LessonSlot')
+
+    zone = getattr(settings, 'SCHEDULE_TIME_ZONE', settings.TIME_ZONE)
+    LessonSlot.objects.bulk_create(
+        [
+            LessonSlot(
+                group_id=group.id,
+                weekday=day,
+                start_time=group.start_time,
+                end_time=group.end_time,
+                timezone=zone,
+                week_minute=week_minute(day, group.start_time)
+            )
+            for group in StudyGroup.objects.filter(is_active=True, start_time__isnull=False)
+            for day in normalize_weekdays(group.days_of_week)
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_authenticateduser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(help_text='0 = Monday ... 6 = Sunday')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('timezone', models.CharField(max_length=64)),
+                ('week_minute', models.PositiveIntegerField(help_text='Minutes from Monday 00:00 to the start, in timezone')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_slots', to='users.studygroup')),
+            ],
+            options={
+                'ordering': ['week_minute'],
+                'indexes': [models.Index(fields=['timezone', 'week_minute'], name='lesson_slot_week_minute_idx')],
+            },
+        ),
+        migrations.RunPython(build_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 23:14
+
+from django.db import migrations, models
+
+
+def install_search(apps, schema_editor):
+    from users.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from users.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0012_lessonslot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', '-id'], name='user_role_idx'),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0014_metrics_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('has_premium', True)), fields=['premium_expires_at'], name='user_premium_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.10 on 2026-10-18 00:11
+
+from django.db import migrations, models
+
+
+def reinstall_search(apps, schema_editor):
+    # SQLite rebuilt users_user above, dropping the search triggers
+    from users.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_premium_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped to revoke every token issued so far (see users/authentication.py)'),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+    ]
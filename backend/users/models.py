@@ -28,6 +28,9 @@ class User(AbstractUser):
     last_activity_date = models.DateField(auto_now=True, help_text="Last activity date for streak tracking")
     last_wpm = models.FloatField(default=0, help_text="Last typing speed (words per minute)")
     max_wpm = models.FloatField(default=0, help_text="Maximum typing speed achieved (words per minute)")
+    token_version = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Bumped to revoke every token issued so far (see users/authentication.py)"
+    )
     
     # created_at is date_joined in AbstractUser
     # is_active is already in AbstractUser
@@ -37,13 +40,73 @@ class User(AbstractUser):
     teaching_groups = models.ManyToManyField('StudyGroup', related_name='teachers', blank=True)
     learning_groups = models.ManyToManyField('StudyGroup', related_name='students', blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user list: newest first, often narrowed to one role
+            models.Index(fields=['role', '-id'], name='user_role_idx'),
+            # Subscription sweep (see users/entitlements.py)
+            models.Index(
+                fields=['premium_expires_at'], name='user_premium_expiry_idx', condition=models.Q(has_premium=True)
+            ),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
 
+class AuthenticatedUser(User):
+    """
+    User built from the principal cache (see users/authentication.py).
+    Only the cached fields are loaded; touching any other field loads all of
+    them with one query instead of one query per field.
+    """
+    teaching_group_ids = ()
+    learning_group_ids = ()
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.intersection(fields):
+            fields = list(deferred.union(fields))
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 import datetime
 
+class StudyGroupQuerySet(models.QuerySet):
+
+    def with_member_counts(self):
+        """Annotate students_count and teachers_count with correlated subqueries (no joins, no duplicates)"""
+        def member_count(through):
+            counts = (
+                through.objects
+                .filter(studygroup=models.OuterRef('pk'))
+                .order_by()
+                .values('studygroup')
+                .annotate(total=models.Count('*'))
+                .values('total')
+            )
+            return Coalesce(models.Subquery(counts), 0)
+
+        return self.annotate(
+            students_count=member_count(User.learning_groups.through),
+            teachers_count=member_count(User.teaching_groups.through)
+        )
+
+    def taught_by(self, user):
+        """Groups where user is the primary teacher or one of the teachers"""
+        return self.filter(
+            models.Q(teacher=user)
+            | models.Q(id__in=User.teaching_groups.through.objects.filter(user=user).values('studygroup_id'))
+        )
+
+    def attended_by(self, user):
+        return self.filter(id__in=User.learning_groups.through.objects.filter(user=user).values('studygroup_id'))
+
 class StudyGroup(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -65,15 +128,17 @@ class StudyGroup(models.Model):
     
     is_active = models.BooleanField(default=True)
 
+    objects = StudyGroupQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     def can_mark_attendance_now(self):
         """Check if attendance can be marked right now"""
+        from .schedule import normalize_weekdays
         now = timezone.now()
-        today_name = now.strftime('%A')
         
-        if today_name not in self.days_of_week:
+        if now.weekday() not in normalize_weekdays(self.days_of_week):
             return False
             
         if not self.start_time or not self.end_time:
@@ -85,6 +150,27 @@ class StudyGroup(models.Model):
         
         return start_monitor <= current_time <= self.end_time
 
+class LessonSlot(models.Model):
+    """
+    One weekly lesson of an active group, rebuilt from days_of_week and the
+    start/end times whenever the group is saved (see users/schedule.py)
+    """
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, related_name='lesson_slots')
+    weekday = models.PositiveSmallIntegerField(help_text="0 = Monday ... 6 = Sunday")
+    start_time = models.TimeField()
+    end_time = models.TimeField(null=True, blank=True)
+    timezone = models.CharField(max_length=64)
+    week_minute = models.PositiveIntegerField(help_text="Minutes from Monday 00:00 to the start, in timezone")
+
+    class Meta:
+        ordering = ['week_minute']
+        indexes = [
+            models.Index(fields=['timezone', 'week_minute'], name='lesson_slot_week_minute_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.group.name}: {self.weekday} {self.start_time:%H:%M}"
+
 class Attendance(models.Model):
     """Track student attendance in study groups"""
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_records')
@@ -102,3 +188,70 @@ class Attendance(models.Model):
     def __str__(self):
         status = "Present" if self.is_present else "Absent"
         return f"{self.student.username} - {self.group.name} - {self.date} ({status})"
+
+class CoinLedgerEntry(models.Model):
+    """Append-only record of one change to a user's coins (see users/ledger.py)"""
+    class Reason(models.TextChoices):
+        OPENING = 'OPENING', 'Opening balance'
+        TYPING = 'TYPING', 'Typing reward'
+        SEASON_REWARD = 'SEASON_REWARD', 'Season reward'
+        HOMEWORK = 'HOMEWORK', 'Homework reward'
+        TEACHER_AWARD = 'TEACHER_AWARD', 'Teacher award'
+        PURCHASE = 'PURCHASE', 'Shop purchase'
+        SUBSCRIPTION = 'SUBSCRIPTION', 'Premium subscription'
+        ADJUSTMENT = 'ADJUSTMENT', 'Manual adjustment'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coin_entries')
+    amount = models.IntegerField(help_text="Positive for credits, negative for debits")
+    reason = models.CharField(max_length=20, choices=Reason.choices)
+    reference = models.CharField(max_length=64, blank=True, help_text="What caused the entry, e.g. order:12")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='coin_entry_user_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Coin ledger entries cannot be changed')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount:+d} ({self.reason})"
+
+class CoinBalanceSnapshot(models.Model):
+    """A user's balance as the sum of their ledger entries up to last_entry_id"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coin_snapshots')
+    balance = models.IntegerField()
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-last_entry_id'], name='coin_snapshot_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} @ {self.last_entry_id}"
+
+class ActivityMonth(models.Model):
+    """Days of a month a user was active, as a bitmap: bit d - 1 is day d (see users/activity.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_months')
+    month = models.DateField(help_text="First day of the month")
+    days = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'month']
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m}: {self.days:031b}"
+
+class MetricsSnapshot(models.Model):
+    """Admin dashboard aggregates computed by users.metrics.refresh_metrics()"""
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Metrics @ {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from django.utils import timezone
+from .entitlements import is_entitled
 
 class IsTeacher(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -15,18 +15,7 @@ class IsAdmin(permissions.BasePermission):
 
 class IsPremiumUser(permissions.BasePermission):
     """
-    Allows access only to users with an active premium subscription.
+    Allows access only to users entitled to premium content (see users/entitlements.py).
     """
     def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-            
-        # Admins and Teachers always get access
-        if request.user.role in ['ADMIN', 'TEACHER']:
-            return True
-            
-        # Check if premium is active
-        if request.user.has_premium and request.user.premium_expires_at:
-            return request.user.premium_expires_at > timezone.now()
-            
-        return False
+        return is_entitled(request.user)
@@ -0,0 +1,149 @@
+"""
+Attendance reports: a students x dates matrix for a group with attendance
+rates and absence streaks.
+
+Each (group, month) is aggregated in the database once and cached; a report
+over several months merges the cached months. Saving or deleting an
+Attendance row drops its month (see users/signals.py) and mark_bulk, which
+writes with bulk_create, drops the month it marked.
+"""
+import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+from .models import User, Attendance
+
+MAX_MONTHS = 12
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _cache_key(group_id, month):
+    return f'attendance-report:{group_id}:{month:%Y-%m}'
+
+
+def invalidate_attendance_report(group_id, days):
+    days = [parse_date(day) if isinstance(day, str) else day for day in days]
+    keys = {_cache_key(group_id, month_start(day)) for day in days}
+
+    def invalidate():
+        cache.delete_many(list(keys))
+
+    invalidate()
+    # A concurrent report may re-cache the old marks before the change commits
+    transaction.on_commit(invalidate)
+
+
+def _month_data(group_id, month):
+    marks = Attendance.objects.filter(group_id=group_id, date__gte=month, date__lt=next_month(month))
+    present = Count('id', filter=Q(is_present=True))
+    return {
+        'marks': list(marks.order_by('date', 'student_id').values_list('student_id', 'date', 'is_present')),
+        'students': {
+            row['student_id']: (row['present'], row['total'])
+            for row in marks.order_by().values('student_id').annotate(present=present, total=Count('id'))
+        },
+        'daily': [
+            (row['date'], row['present'], row['total'])
+            for row in marks.order_by('date').values('date').annotate(present=present, total=Count('id'))
+        ],
+    }
+
+
+def _months(group_id, months):
+    keys = {month: _cache_key(group_id, month) for month in months}
+    cached = cache.get_many(list(keys.values()))
+    timeout = getattr(settings, 'ATTENDANCE_REPORT_CACHE_TIMEOUT', 3600)
+    for month in months:
+        if keys[month] not in cached:
+            cached[keys[month]] = _month_data(group_id, month)
+            cache.set(keys[month], cached[keys[month]], timeout)
+    return [cached[keys[month]] for month in months]
+
+
+def _rate(present, total):
+    return round(present / total * 100, 1) if total else None
+
+
+def _absence_streaks(marks):
+    """(current, longest) runs of absences in a list of True/False/None marks; unmarked days are skipped"""
+    current = longest = 0
+    for mark in marks:
+        if mark is None:
+            continue
+        current = 0 if mark else current + 1
+        longest = max(longest, current)
+    return current, longest
+
+
+def attendance_report(group, first_month, last_month):
+    """Report for the months first_month..last_month (first days of months), inclusive"""
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = next_month(month)
+
+    dates = []
+    matrix = {}
+    counts = {}
+    daily = []
+    for data in _months(group.id, months):
+        month_dates = sorted({day for _, day, _ in data['marks']})
+        offset = len(dates)
+        dates += month_dates
+        column = {day: offset + index for index, day in enumerate(month_dates)}
+        for student_id, day, is_present in data['marks']:
+            matrix.setdefault(student_id, {})[column[day]] = is_present
+        for student_id, (present, total) in data['students'].items():
+            previous = counts.get(student_id, (0, 0))
+            counts[student_id] = (previous[0] + present, previous[1] + total)
+        daily += data['daily']
+
+    member_ids = set(User.learning_groups.through.objects.filter(studygroup_id=group.id).values_list('user_id', flat=True))
+    students = (
+        User.objects
+        .filter(id__in=member_ids | set(matrix))
+        .order_by('last_name', 'first_name', 'username')
+        .values('id', 'username', 'first_name', 'last_name')
+    )
+
+    rows = []
+    for student in students:
+        marks = [matrix.get(student['id'], {}).get(index) for index in range(len(dates))]
+        present, total = counts.get(student['id'], (0, 0))
+        current, longest = _absence_streaks(marks)
+        rows.append({
+            'id': student['id'],
+            'username': student['username'],
+            'name': f"{student['first_name']} {student['last_name']}".strip(),
+            'marks': marks,
+            'present': present,
+            'total': total,
+            'rate': _rate(present, total),
+            'current_absence_streak': current,
+            'longest_absence_streak': longest,
+        })
+
+    present_total = sum(present for present, _ in counts.values())
+    marks_total = sum(total for _, total in counts.values())
+    return {
+        'group_id': group.id,
+        'start': first_month,
+        'end': next_month(last_month) - datetime.timedelta(days=1),
+        'dates': dates,
+        'students': rows,
+        'daily': [
+            {'date': day, 'present': present, 'total': total, 'rate': _rate(present, total)}
+            for day, present, total in daily
+        ],
+        'rate': _rate(present_total, marks_total),
+    }
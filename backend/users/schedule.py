@@ -0,0 +1,109 @@
+"""
+Group schedules as LessonSlot rows.
+
+StudyGroup.days_of_week has been stored as day names, numbers and
+comma-separated strings. normalize_weekdays() reads all of them, and
+rebuild_lesson_slots() turns an active group's schedule into one LessonSlot
+per weekday when the group is saved (see users/signals.py). next_lessons()
+then finds upcoming lessons with an indexed range query on week_minute
+instead of walking every group.
+
+Times are wall-clock times in SCHEDULE_TIME_ZONE, stored on each slot.
+"""
+import datetime
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import LessonSlot
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MINUTES_PER_DAY = 24 * 60
+
+_DAY_LOOKUP = {name.lower(): day for day, name in enumerate(DAY_NAMES)}
+_DAY_LOOKUP.update({name[:3].lower(): day for day, name in enumerate(DAY_NAMES)})
+
+
+def normalize_weekdays(raw):
+    """
+    Sorted weekday numbers (0 = Monday) from a days_of_week value: a list of
+    names, numbers or digit strings, or a comma-separated string.
+    Entries that are not a day are skipped.
+    """
+    if isinstance(raw, str):
+        items = raw.split(',')
+    elif isinstance(raw, (list, tuple)):
+        items = raw
+    else:
+        return []
+
+    days = set()
+    for item in items:
+        if isinstance(item, int) and not isinstance(item, bool):
+            day = item
+        else:
+            text = str(item).strip()
+            day = int(text) if text.isdigit() else _DAY_LOOKUP.get(text.lower())
+        if day is not None and 0 <= day <= 6:
+            days.add(day)
+    return sorted(days)
+
+
+def week_minute(weekday, time):
+    return weekday * MINUTES_PER_DAY + time.hour * 60 + time.minute
+
+
+def rebuild_lesson_slots(group):
+    """Replace the group's slots; inactive groups and groups without a start time get none"""
+    with transaction.atomic():
+        group.lesson_slots.all().delete()
+        if not group.is_active or not group.start_time:
+            return []
+        zone = getattr(settings, 'SCHEDULE_TIME_ZONE', settings.TIME_ZONE)
+        return LessonSlot.objects.bulk_create([
+            LessonSlot(
+                group=group,
+                weekday=day,
+                start_time=group.start_time,
+                end_time=group.end_time,
+                timezone=zone,
+                week_minute=week_minute(day, group.start_time)
+            )
+            for day in normalize_weekdays(group.days_of_week)
+        ])
+
+
+def next_lessons(group_ids=None, limit=5, now=None):
+    """
+    The next `limit` lessons as (slot, starts_at) pairs, soonest first.
+    `group_ids` (ids or a values() queryset) limits the groups; None means all.
+    A lesson that already started this minute counts as next week's.
+    """
+    now = now or timezone.now()
+    slots = LessonSlot.objects.select_related('group')
+    if group_ids is not None:
+        slots = slots.filter(group_id__in=group_ids)
+
+    upcoming = []
+    for zone_name in slots.order_by().values_list('timezone', flat=True).distinct():
+        zone = ZoneInfo(zone_name)
+        local = now.astimezone(zone)
+        current = week_minute(local.weekday(), local.time())
+        in_zone = slots.filter(timezone=zone_name).order_by('week_minute')
+
+        # Rest of this week, then wrap around to the start of the next one
+        found = list(in_zone.filter(week_minute__gt=current)[:limit])
+        if len(found) < limit:
+            found += list(in_zone.filter(week_minute__lte=current)[:limit - len(found)])
+
+        for slot in found:
+            days_ahead = (slot.weekday - local.weekday()) % 7
+            if days_ahead == 0 and slot.week_minute <= current:
+                days_ahead = 7
+            starts_at = datetime.datetime.combine(
+                local.date() + datetime.timedelta(days=days_ahead), slot.start_time, tzinfo=zone
+            )
+            upcoming.append((slot, starts_at))
+
+    upcoming.sort(key=lambda pair: pair[1])
+    return upcoming[:limit]
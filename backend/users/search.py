@@ -0,0 +1,117 @@
+"""
+Indexed user search over username, first/last name and email.
+
+Every word of the query has to match one of the fields:
+- SQLite: prefix match on the users_user_fts FTS5 table, kept in step with
+  users_user by triggers.
+- PostgreSQL: substring match served by pg_trgm GIN indexes on
+  UPPER(field), the expression Django's icontains compares.
+- Anything else, or SQLite without FTS5: istartswith on each field.
+
+install_search_index() is run by migration 0013. SQLite drops a table's
+triggers when a later migration rebuilds users_user, so run the
+rebuild_user_search command after such a migration.
+"""
+from django.db import connection, connections, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ['username', 'first_name', 'last_name', 'email']
+FTS_TABLE = 'users_user_fts'
+
+_columns = ', '.join(SEARCH_FIELDS)
+_new = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+_old = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({_columns}, content='users_user', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON users_user BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON users_user BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {_columns} ON users_user BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_INSTALL = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS users_user_{field}_trgm ON users_user USING gin (UPPER({field}) gin_trgm_ops)'
+    for field in SEARCH_FIELDS
+]
+POSTGRES_UNINSTALL = [f'DROP INDEX IF EXISTS users_user_{field}_trgm' for field in SEARCH_FIELDS]
+
+
+def _run(conn, statements):
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_search_index(conn=connection):
+    """Create (or repair) the search index. Returns False where only the fallback is available."""
+    if conn.vendor == 'postgresql':
+        _run(conn, POSTGRES_INSTALL)
+        return True
+    if conn.vendor == 'sqlite' and _has_fts5(conn):
+        _run(conn, SQLITE_UNINSTALL[:3] + SQLITE_INSTALL)
+        return True
+    return False
+
+
+def uninstall_search_index(conn=connection):
+    if conn.vendor == 'postgresql':
+        _run(conn, POSTGRES_UNINSTALL)
+    elif conn.vendor == 'sqlite':
+        _run(conn, SQLITE_UNINSTALL)
+
+
+def _has_fts5(conn):
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(probe)')
+        except OperationalError:
+            return False
+        cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def _has_fts_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _fts_query(words):
+    # Each word quoted as an FTS5 string so its punctuation is not read as syntax, then prefix-matched
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search_users(queryset, text):
+    """Narrow a User queryset to users matching every word of `text`"""
+    words = text.split()
+    if not words:
+        return queryset
+
+    conn = connections[queryset.db]
+    if conn.vendor == 'sqlite' and _has_fts_table(conn):
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_query(words)]
+        ))
+
+    lookup = 'icontains' if conn.vendor == 'postgresql' else 'istartswith'
+    for word in words:
+        matches = Q()
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f'{field}__{lookup}': word})
+        queryset = queryset.filter(matches)
+    return queryset
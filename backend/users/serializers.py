@@ -1,5 +1,19 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import User, StudyGroup, Attendance
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from .models import User, StudyGroup, Attendance, CoinLedgerEntry
+from .ledger import post_entry, InsufficientFunds
+from .authentication import TOKEN_VERSION_CLAIM, REVOKING_FIELDS, revoke_tokens
+
+def member_count(group, annotation, relation):
+    """A with_member_counts() annotation, or a COUNT query for groups that were just created or updated"""
+    count = getattr(group, annotation, None)
+    if count is None:
+        count = getattr(group, relation).count()
+    return count
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,6 +26,40 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['coins', 'points', 'activity_days', 'has_premium', 'premium_expires_at', 'last_wpm', 'max_wpm']
 
+    def update(self, instance, validated_data):
+        # Only the submitted fields are written; coins belongs to users.ledger
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Login that stamps tokens with the user's token_version"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Refresh that refuses tokens revoked since they were issued"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        token_version = (
+            User.objects
+            .filter(pk=refresh.get(api_settings.USER_ID_CLAIM), is_active=True)
+            .values_list('token_version', flat=True)
+            .first()
+        )
+        if token_version is None or token_version != refresh.get(TOKEN_VERSION_CLAIM, 0):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return super().validate(attrs)
+
 
 class SimpleUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,35 +70,60 @@ class SimpleUserSerializer(serializers.ModelSerializer):
 class AdminUserSerializer(serializers.ModelSerializer):
     """Serializer for admin user management with password handling"""
     password = serializers.CharField(write_only=True, required=False)
+    coins_adjustment = serializers.IntegerField(
+        write_only=True, required=False,
+        help_text="Coins to credit (or debit, if negative) through the ledger"
+    )
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'role', 'language', 'coins', 'points', 'activity_days',
+            'role', 'language', 'coins', 'coins_adjustment', 'points', 'activity_days',
             'has_premium', 'premium_expires_at', 'avatar_url',
             'last_activity_date', 'date_joined', 'is_active', 'password', 'last_wpm', 'max_wpm'
         ]
-        read_only_fields = ['date_joined', 'last_wpm', 'max_wpm']
+        read_only_fields = ['coins', 'date_joined', 'last_wpm', 'max_wpm']
+
+    def _adjust_coins(self, user, amount):
+        try:
+            post_entry(user, amount, CoinLedgerEntry.Reason.ADJUSTMENT, reference='admin')
+        except InsufficientFunds as error:
+            raise serializers.ValidationError({'coins_adjustment': str(error)})
     
     def create(self, validated_data):
         password = validated_data.pop('password', None)
+        adjustment = validated_data.pop('coins_adjustment', 0)
         
         if not password:
             raise serializers.ValidationError({'password': 'Password is required when creating a user'})
         
-        user = User(**validated_data)
-        user.set_password(password)
-        user.save()
+        with transaction.atomic():
+            user = User(**validated_data)
+            user.set_password(password)
+            user.save()
+            self._adjust_coins(user, adjustment)
         return user
     
     def update(self, instance, validated_data):
         password = validated_data.pop('password', None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        if password:
-            instance.set_password(password)
-        instance.save()
+        adjustment = validated_data.pop('coins_adjustment', 0)
+        with transaction.atomic():
+            revoke = bool(password) or any(
+                field in validated_data and validated_data[field] != getattr(instance, field)
+                for field in REVOKING_FIELDS
+            )
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            update_fields = list(validated_data)
+            if password:
+                instance.set_password(password)
+                update_fields.append('password')
+            if update_fields:
+                instance.save(update_fields=update_fields)
+            if revoke:
+                revoke_tokens(instance)
+            self._adjust_coins(instance, adjustment)
         return instance
 
 class StudyGroupSerializer(serializers.ModelSerializer):
@@ -75,10 +148,10 @@ class StudyGroupSerializer(serializers.ModelSerializer):
         ]
     
     def get_students_count(self, obj):
-        return obj.students.count()
+        return member_count(obj, 'students_count', 'students')
     
     def get_teachers_count(self, obj):
-        return obj.teachers.count()
+        return member_count(obj, 'teachers_count', 'teachers')
     
     def create(self, validated_data):
         student_ids = validated_data.pop('student_ids', [])
@@ -100,6 +173,7 @@ class StudyGroupSerializer(serializers.ModelSerializer):
         if student_ids is not None:
             students = User.objects.filter(id__in=student_ids, role='STUDENT')
             instance.students.set(students)
+            instance.students_count = None  # the annotation no longer holds
         
         return instance
 
@@ -132,8 +206,8 @@ class StudyGroupListSerializer(serializers.ModelSerializer):
         ]
     
     def get_students_count(self, obj):
-        return obj.students.count()
+        return member_count(obj, 'students_count', 'students')
     
     def get_teachers_count(self, obj):
-        return obj.teachers.count()
+        return member_count(obj, 'teachers_count', 'teachers')
 
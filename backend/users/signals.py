@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import User, AuthenticatedUser, StudyGroup, Attendance
+from .authentication import principal_key, principal_keys
+from .schedule import rebuild_lesson_slots
+from .reports import invalidate_attendance_report
+
+
+def _invalidate(keys):
+    keys = list(keys)
+
+    def invalidate():
+        cache.delete_many(keys)
+
+    invalidate()
+    # A concurrent request may re-cache the old state before the change commits
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=AuthenticatedUser)
+def user_changed(sender, instance, **kwargs):
+    _invalidate([principal_key(instance.pk, instance.token_version)])
+
+
+@receiver(m2m_changed, sender=User.teaching_groups.through)
+@receiver(m2m_changed, sender=User.learning_groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        _invalidate(principal_keys([instance.pk]))
+    elif action == 'pre_clear':
+        _invalidate(principal_keys(sender.objects.filter(studygroup_id=instance.pk).values('user_id')))
+    else:
+        _invalidate(principal_keys(pk_set))
+
+
+@receiver(post_save, sender=StudyGroup)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_lesson_slots(instance)
+
+
+@receiver(pre_delete, sender=StudyGroup)
+def group_deleted(sender, instance, **kwargs):
+    members = set(instance.students.values_list('id', flat=True))
+    members.update(instance.teachers.values_list('id', flat=True))
+    _invalidate(principal_keys(members))
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    invalidate_attendance_report(instance.group_id, [instance.date])
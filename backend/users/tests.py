@@ -1,6 +1,26 @@
-from django.test import TestCase
-from users.models import User, StudyGroup
-from rest_framework.test import APITestCase
+import csv
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from users.models import User, StudyGroup, Attendance, CoinLedgerEntry, ActivityMonth
+from users.ledger import post_entry, take_snapshots, ledger_balance, InsufficientFunds
+from users.activity import touch, flush_activity, streak
+from users.schedule import normalize_weekdays, next_lessons
+from users.views import MeView
+from users.authentication import load_principal
+from users.ai import get_limiter
+from users.ai_cache import ResponseCache, get_response_cache
+from users.throttling import consume, reset_buckets
+from users.entitlements import is_entitled
+from eduverse.models import EduverseCategory, EduverseVideo
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 from django.urls import reverse
 from rest_framework import status
 
@@ -53,6 +73,7 @@ class MeViewTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpassword')
         self.me_url = reverse('me') # Assuming 'me' is the name for the MeView URL
+        self.addCleanup(flush_activity)
 
     def test_authenticated_user_can_access_me_view(self):
         self.client.force_authenticate(user=self.user)
@@ -173,4 +194,727 @@ class StudyGroupViewSetTest(APITestCase):
 
     def test_unauthenticated_user_cannot_list_study_groups(self):
         response = self.client.get(self.group_list_url)
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class CoinLedgerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='saver', password='testpassword')
+
+    def test_post_entry_moves_balance_and_records_entry(self):
+        post_entry(self.user, 120, CoinLedgerEntry.Reason.TEACHER_AWARD, reference='teacher:1')
+        post_entry(self.user, -20, CoinLedgerEntry.Reason.PURCHASE, reference='order:1')
+        self.assertEqual(self.user.coins, 100)
+        self.assertEqual(User.objects.get(pk=self.user.pk).coins, 100)
+        self.assertEqual(list(self.user.coin_entries.order_by('id').values_list('amount', flat=True)), [120, -20])
+
+        with self.assertRaises(InsufficientFunds):
+            post_entry(self.user, -101, CoinLedgerEntry.Reason.PURCHASE)
+        self.assertEqual(User.objects.get(pk=self.user.pk).coins, 100)
+        self.assertEqual(self.user.coin_entries.count(), 2)
+
+    def test_snapshots_and_reconciliation(self):
+        post_entry(self.user, 50, CoinLedgerEntry.Reason.TEACHER_AWARD)
+        CoinLedgerEntry.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(take_snapshots(), 1)
+        post_entry(self.user, 25, CoinLedgerEntry.Reason.HOMEWORK)
+        self.assertEqual(ledger_balance(self.user), 75)
+
+        # An edit that bypassed the ledger is reported, then reset with --fix
+        User.objects.filter(pk=self.user.pk).update(coins=500)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_coins', stdout=StringIO())
+        call_command('reconcile_coins', fix=True, stdout=StringIO())
+        self.assertEqual(User.objects.get(pk=self.user.pk).coins, 75)
+
+    def test_subscription_purchase_debits_through_ledger(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('subscription-purchase'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        post_entry(self.user, 130, CoinLedgerEntry.Reason.TEACHER_AWARD)
+        response = self.client.post(reverse('subscription-purchase'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['coins_remaining'], 30)
+        self.assertTrue(
+            self.user.coin_entries.filter(reason=CoinLedgerEntry.Reason.SUBSCRIPTION, amount=-100).exists()
+        )
+
+    def test_admin_serializer_adjusts_coins_through_ledger(self):
+        admin_user = User.objects.create_superuser(username='root', password='testpassword')
+        self.client.force_authenticate(user=admin_user)
+        url = reverse('user-detail', args=[self.user.pk])
+
+        # coins itself is read-only
+        response = self.client.patch(url, {'coins': 999, 'coins_adjustment': 30}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['coins'], 30)
+
+        response = self.client.patch(url, {'coins_adjustment': -31, 'first_name': 'Spender'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('coins_adjustment', response.data)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.coins, self.user.first_name), (30, ''))
+
+        response = self.client.post(reverse('user-list'), {
+            'username': 'newbie', 'password': 'testpassword', 'coins_adjustment': -5
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(username='newbie').exists())
+
+    def test_admin_adjusts_coins_through_ledger(self):
+        admin_user = User.objects.create_superuser(username='root', password='testpassword')
+        self.client.force_login(admin_user)
+        url = reverse('admin:users_user_change', args=[self.user.pk])
+        response = self.client.get(url)
+        self.assertNotContains(response, 'name="coins"')
+
+        joined = timezone.localtime(self.user.date_joined)
+        response = self.client.post(url, {
+            'username': self.user.username, 'password': self.user.password,
+            'date_joined_0': joined.date().isoformat(), 'date_joined_1': joined.strftime('%H:%M:%S'),
+            'role': self.user.role, 'language': self.user.language, 'points': 0, 'activity_days': 0,
+            'last_wpm': 0, 'max_wpm': 0, 'is_active': 'on', 'coins_adjustment': 40,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(User.objects.get(pk=self.user.pk).coins, 40)
+        self.assertTrue(self.user.coin_entries.filter(reason=CoinLedgerEntry.Reason.ADJUSTMENT, amount=40).exists())
+
+        entry = self.user.coin_entries.get()
+        response = self.client.post(reverse('admin:users_coinledgerentry_delete', args=[entry.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(CoinLedgerEntry.objects.filter(pk=entry.pk).exists())
+
+
+class ActivityTrackingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='regular', password='testpassword')
+        flush_activity()
+        self.addCleanup(flush_activity)
+
+    def test_me_view_does_not_write(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.user.refresh_from_db()
+            me_view = MeView.as_view()
+            request = APIRequestFactory().get('/me/')
+            force_authenticate(request, user=self.user)
+            response = me_view(request)
+        self.assertEqual(response.data['activity_days'], 1)
+        writes = [q['sql'] for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+        self.assertEqual(flush_activity(), 1)
+        self.assertEqual(ActivityMonth.objects.get(user=self.user).days, 1 << (timezone.localdate().day - 1))
+
+    def test_streak_spans_months_and_pending_touches(self):
+        today = timezone.localdate()
+        for offset in range(1, 40):
+            touch(self.user, today - timedelta(days=offset))
+        flush_activity()
+        touch(self.user, today - timedelta(days=45))
+        flush_activity()
+
+        # Today is not active yet, so the streak ends yesterday
+        self.assertEqual(streak(self.user.pk, today), (39, today - timedelta(days=1)))
+        touch(self.user, today)
+        self.assertEqual(streak(self.user.pk, today), (40, today))
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('me-activity'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 365)
+        self.assertEqual(response.data['active_days'], 41)
+        self.assertEqual(response.data['days'][-1], 1)
+        self.assertEqual(response.data['streak'], 40)
+
+
+@override_settings(PRINCIPAL_CACHE_TIMEOUT=60)
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='testpassword')
+        self.admin = User.objects.create_superuser(username='boss', password='adminpassword')
+        self.group = StudyGroup.objects.create(name='Group A')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self, queries):
+        return [q['sql'] for q in queries if 'FROM "users_user"' in q['sql']]
+
+    def test_principal_is_served_from_cache(self):
+        principal = load_principal(self.user.pk)
+        self.assertEqual(principal.role, 'STUDENT')
+        with self.assertNumQueries(0):
+            principal = load_principal(self.user.pk)
+            self.assertEqual(principal.teaching_group_ids, [])
+
+        # Fields outside the principal are loaded together on first access
+        with self.assertNumQueries(1):
+            self.assertEqual(principal.email, '')
+            self.assertEqual(principal.coins, 0)
+            self.assertEqual(principal.max_wpm, 0)
+
+    def test_repeat_requests_skip_the_user_query(self):
+        self.client.get(reverse('subscription-status'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('studygroup-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def test_role_and_group_changes_invalidate(self):
+        load_principal(self.user.pk)
+        self.client.force_authenticate(user=self.admin)
+        self.client.post(reverse('user-change-role', args=[self.user.pk]), {'role': 'TEACHER'}, format='json')
+        # The role change revoked the old tokens
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(load_principal(self.user.pk, 1).role, 'TEACHER')
+
+        self.group.students.add(self.user)
+        self.assertEqual(load_principal(self.user.pk, 1).learning_group_ids, [self.group.id])
+        self.group.students.clear()
+        self.assertEqual(load_principal(self.user.pk, 1).learning_group_ids, [])
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('me'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_revokes_tokens(self):
+        self.client.credentials()
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'cached', 'password': 'testpassword'})
+        access, refresh = response.data['access'], response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('me')).status_code, status.HTTP_200_OK)
+
+        admin_client = self.client_class()
+        admin_client.force_authenticate(user=self.admin)
+        admin_client.post(reverse('user-change-role', args=[self.user.pk]), {'role': 'TEACHER'}, format='json')
+
+        self.assertEqual(self.client.get(reverse('me')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(PRINCIPAL_CACHE_TIMEOUT=0)
+    def test_without_shared_cache_principal_is_not_cached(self):
+        from users.checks import check_principal_cache
+        self.assertEqual(check_principal_cache(None), [])
+        load_principal(self.user.pk)
+        with self.assertNumQueries(3):
+            load_principal(self.user.pk)
+        with self.settings(PRINCIPAL_CACHE_TIMEOUT=60):
+            self.assertEqual([error.id for error in check_principal_cache(None)], ['users.E001'])
+
+
+class LessonScheduleTest(APITestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='testpassword', role='TEACHER')
+        self.monday = StudyGroup.objects.create(
+            name='Monday', teacher=self.teacher, days_of_week=['Monday'], start_time=time(9, 0), end_time=time(10, 0)
+        )
+        self.midweek = StudyGroup.objects.create(
+            name='Midweek', days_of_week='2, Fri', start_time=time(15, 30)
+        )
+        self.midweek.teachers.add(self.teacher)
+        StudyGroup.objects.create(name='Other', days_of_week=[0, 1, 2, 3, 4], start_time=time(8, 0))
+        StudyGroup.objects.create(name='Closed', days_of_week=['Monday'], start_time=time(7, 0), is_active=False)
+
+    def test_normalize_weekdays(self):
+        self.assertEqual(normalize_weekdays(['Monday', 'wed', 4, '6', 'Funday', 9]), [0, 2, 4, 6])
+        self.assertEqual(normalize_weekdays('Tuesday, 3'), [1, 3])
+        self.assertEqual(normalize_weekdays(None), [])
+
+    def test_slots_follow_group_saves(self):
+        self.assertEqual(list(self.midweek.lesson_slots.values_list('weekday', flat=True)), [2, 4])
+        self.midweek.is_active = False
+        self.midweek.save()
+        self.assertFalse(self.midweek.lesson_slots.exists())
+
+    def test_next_lessons_wrap_around_the_week(self):
+        # Friday 2024-01-05 16:00 UTC: Friday's 15:30 lesson has passed
+        now = datetime(2024, 1, 5, 16, 0, tzinfo=dt_timezone.utc)
+        lessons = next_lessons(StudyGroup.objects.filter(name__in=['Monday', 'Midweek']).values('id'), limit=3, now=now)
+        self.assertEqual(
+            [(slot.group.name, starts_at.date().isoformat()) for slot, starts_at in lessons],
+            [('Monday', '2024-01-08'), ('Midweek', '2024-01-10'), ('Midweek', '2024-01-12')]
+        )
+
+    def test_teacher_dashboard_uses_slots(self):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(reverse('teacher_stats-list'), {'upcoming': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = {lesson['group_name'] for lesson in response.data['upcoming_lessons']}
+        self.assertEqual(names, {'Monday', 'Midweek'})
+        self.assertEqual(len(response.data['upcoming_lessons']), 3)
+        self.assertEqual(response.data['next_lesson'], response.data['upcoming_lessons'][0])
+
+
+class StudyGroupListTest(APITestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='lead', password='testpassword', role='TEACHER')
+        self.students = [User.objects.create_user(username=f'pupil{i}', password='testpassword') for i in range(4)]
+        for size in (3, 1, 4):
+            group = StudyGroup.objects.create(name=f'Group of {size}', teacher=self.teacher)
+            # Primary teacher and co-teacher at once used to duplicate the row
+            group.teachers.add(self.teacher)
+            group.students.set(self.students[:size])
+
+    def test_list_has_fixed_query_count_and_no_duplicates(self):
+        self.client.force_authenticate(user=self.teacher)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('studygroup-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([group['students_count'] for group in response.data], [3, 1, 4])
+        self.assertEqual({group['teachers_count'] for group in response.data}, {1})
+
+    def test_counts_are_sortable_and_filterable(self):
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.get(reverse('studygroup-list'), {'ordering': '-students_count'})
+        self.assertEqual([group['students_count'] for group in response.data], [4, 3, 1])
+        response = self.client.get(reverse('studygroup-list'), {'min_students': 3})
+        self.assertEqual(sorted(group['students_count'] for group in response.data), [3, 4])
+
+
+class BulkAttendanceTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='head', password='adminpassword', role='ADMIN')
+        self.group = StudyGroup.objects.create(name='Class')
+        self.students = [User.objects.create_user(username=f'kid{i}', password='testpassword') for i in range(5)]
+        self.group.students.set(self.students)
+        self.outsider = User.objects.create_user(username='outsider', password='testpassword')
+        self.url = reverse('attendance-mark-bulk')
+        self.client.force_authenticate(user=self.admin)
+
+    def test_bulk_upsert_reports_inserted_and_updated(self):
+        ids = [s.id for s in self.students]
+        response = self.client.post(self.url, {'group_id': self.group.id, 'date': '2024-03-01', 'student_ids': ids[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['inserted'], response.data['updated']), (3, 0))
+
+        records = [{'student_id': ids[0], 'is_present': False, 'notes': 'sick'}] + [
+            {'student_id': student_id, 'is_present': True} for student_id in ids[1:]
+        ]
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, {'group_id': self.group.id, 'date': '2024-03-01', 'records': records}, format='json')
+        self.assertEqual((response.data['inserted'], response.data['updated']), (2, 3))
+        self.assertEqual(Attendance.objects.filter(group=self.group, date='2024-03-01').count(), 5)
+        absent = Attendance.objects.get(student=self.students[0], date='2024-03-01')
+        self.assertEqual((absent.is_present, absent.notes), (False, 'sick'))
+
+    def test_students_outside_the_group_are_rejected(self):
+        response = self.client.post(
+            self.url,
+            {'group_id': self.group.id, 'date': '2024-03-01', 'student_ids': [self.students[0].id, self.outsider.id]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['student_ids'], [self.outsider.id])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class AttendanceReportTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='mentor', password='testpassword', role='TEACHER')
+        self.group = StudyGroup.objects.create(name='Reported', teacher=self.teacher)
+        self.ann = User.objects.create_user(username='ann', password='testpassword')
+        self.bob = User.objects.create_user(username='bob', password='testpassword')
+        self.group.students.set([self.ann, self.bob])
+        marks = {
+            '2024-02-26': (True, True), '2024-03-01': (True, False),
+            '2024-03-04': (False, False), '2024-03-06': (True, False),
+        }
+        for day, (ann, bob) in marks.items():
+            Attendance.objects.create(student=self.ann, group=self.group, date=day, is_present=ann, marked_by=self.teacher)
+            Attendance.objects.create(student=self.bob, group=self.group, date=day, is_present=bob, marked_by=self.teacher)
+        self.url = reverse('attendance-report')
+        self.client.force_authenticate(user=self.teacher)
+
+    def test_report_matrix_rates_and_streaks(self):
+        response = self.client.get(self.url, {'group_id': self.group.id, 'start': '2024-02', 'end': '2024-03'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['dates']), 4)
+        ann, bob = response.data['students']
+        self.assertEqual(ann['marks'], [True, True, False, True])
+        self.assertEqual((ann['rate'], ann['current_absence_streak'], ann['longest_absence_streak']), (75.0, 0, 1))
+        self.assertEqual((bob['rate'], bob['current_absence_streak'], bob['longest_absence_streak']), (25.0, 3, 3))
+        self.assertEqual([day['rate'] for day in response.data['daily']], [100.0, 50.0, 0.0, 50.0])
+        self.assertEqual(response.data['rate'], 50.0)
+
+    def test_months_are_cached_until_marked(self):
+        params = {'group_id': self.group.id, 'start': '2024-03'}
+        self.client.get(self.url, params)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, params)
+        self.assertFalse([q for q in queries if 'users_attendance' in q['sql']])
+
+        admin = User.objects.create_superuser(username='root', password='adminpassword', role='ADMIN')
+        self.client.force_authenticate(user=admin)
+        self.client.post(
+            reverse('attendance-mark-bulk'),
+            {'group_id': self.group.id, 'date': '2024-03-06', 'student_ids': [self.bob.id], 'is_present': True},
+            format='json'
+        )
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.data['students'][1]['current_absence_streak'], 0)
+
+    def test_students_and_other_teachers_cannot_read_reports(self):
+        self.client.force_authenticate(user=self.ann)
+        self.assertEqual(self.client.get(self.url, {'group_id': self.group.id}).status_code, status.HTTP_403_FORBIDDEN)
+        stranger = User.objects.create_user(username='stranger', password='testpassword', role='TEACHER')
+        self.client.force_authenticate(user=stranger)
+        self.assertEqual(self.client.get(self.url, {'group_id': self.group.id}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExportTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpassword', role='ADMIN', is_staff=True)
+        self.teacher = User.objects.create_user(username='mentor', password='testpassword', role='TEACHER')
+        self.student = User.objects.create_user(username='=cmd', password='testpassword', first_name='Ann')
+        self.group = StudyGroup.objects.create(name='Exported', teacher=self.teacher)
+        other = StudyGroup.objects.create(name='Other', teacher=self.admin)
+        Attendance.objects.create(student=self.student, group=self.group, date='2024-03-01', is_present=True, marked_by=self.teacher)
+        Attendance.objects.create(student=self.student, group=self.group, date='2024-03-08', is_present=False, marked_by=self.teacher)
+        Attendance.objects.create(student=self.student, group=other, date='2024-03-01', is_present=True, marked_by=self.admin)
+
+    def read_csv(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename=', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(StringIO(content)))
+
+    def test_users_export_is_filtered_and_escaped(self):
+        self.client.force_authenticate(user=self.admin)
+        table = self.read_csv(self.client.get(reverse('user-export'), {'role': 'STUDENT'}))
+        self.assertEqual(table[0][:3], ['id', 'username', 'first_name'])
+        self.assertEqual([row[1:3] for row in table[1:]], [["'=cmd", 'Ann']])
+
+    def test_users_export_is_read_in_chunks(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.settings(EXPORT_CHUNK_SIZE=1):
+            table = self.read_csv(self.client.get(reverse('user-export')))
+        self.assertEqual(len(table), 4)
+
+    def test_attendance_export_is_scoped_to_teacher(self):
+        self.client.force_authenticate(user=self.teacher)
+        table = self.read_csv(self.client.get(reverse('attendance-export'), {'date_after': '2024-03-02'}))
+        self.assertEqual([(row[0], row[2], row[5]) for row in table[1:]], [('2024-03-08', 'Exported', 'False')])
+
+    def test_export_rejects_students_and_unknown_filetypes(self):
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(self.client.get(reverse('attendance-export')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('user-export'), {'filetype': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserSearchTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpassword', role='ADMIN', is_staff=True)
+        self.aziz = User.objects.create_user(username='aziz01', password='testpassword', first_name='Aziz', last_name='Karimov', email='aziz@school.uz')
+        self.dilya = User.objects.create_user(username='dilya', password='testpassword', first_name='Dilnoza', last_name='Karimova')
+        self.teacher = User.objects.create_user(username='mentor', password='testpassword', role='TEACHER', has_premium=True)
+        self.group = StudyGroup.objects.create(name='Searchable', teacher=self.teacher)
+        self.group.students.add(self.dilya)
+        self.teacher.teaching_groups.add(self.group)
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse('user-list')
+
+    def usernames(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(user['username'] for user in response.data)
+
+    def test_search_matches_word_prefixes(self):
+        self.assertEqual(self.usernames({'search': 'karim'}), ['aziz01', 'dilya'])
+        self.assertEqual(self.usernames({'search': 'karim dil'}), ['dilya'])
+        self.assertEqual(self.usernames({'search': 'aziz@school'}), ['aziz01'])
+        self.assertEqual(self.usernames({'search': '"'}), [])
+
+    def test_search_follows_renames(self):
+        self.aziz.last_name = 'Usmonov'
+        self.aziz.save()
+        self.assertEqual(self.usernames({'search': 'usmon'}), ['aziz01'])
+        self.assertEqual(self.usernames({'search': 'karim'}), ['dilya'])
+
+    def test_group_and_premium_filters(self):
+        self.assertEqual(self.usernames({'group': self.group.id}), ['dilya', 'mentor'])
+        self.assertEqual(self.usernames({'premium': 'true'}), ['mentor'])
+        self.teacher.premium_expires_at = timezone.now() - timedelta(days=1)
+        self.teacher.save()
+        self.assertEqual(self.usernames({'premium': 'true'}), [])
+
+    def test_cursor_pages(self):
+        response = self.client.get(self.url, {'page_size': 3})
+        first = [user['id'] for user in response.data['results']]
+        self.assertEqual(len(first), 3)
+        response = self.client.get(response.data['next'])
+        second = [user['id'] for user in response.data['results']]
+        self.assertEqual(first + second, sorted(User.objects.values_list('id', flat=True), reverse=True))
+        self.assertIsNone(response.data['next'])
+
+
+class DashboardMetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='testpassword', role='ADMIN', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='testpassword')
+        post_entry(self.student, 25, CoinLedgerEntry.Reason.ADJUSTMENT)
+        touch(self.student)
+        flush_activity()
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse('admin_stats-list')
+
+    def test_metrics_are_served_from_the_snapshot(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['users_count'], response.data['students_count']), (2, 1))
+        self.assertEqual(response.data['active_students_today'], 1)
+        self.assertEqual(response.data['coins_in_circulation'], 25)
+        self.assertEqual(len(response.data['attempts_per_day']), 14)
+        self.assertFalse(response.data['stale'])
+
+        User.objects.create_user(username='late', password='testpassword')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['users_count'], 2)
+        self.assertFalse([q for q in queries if 'users_user' in q['sql'] and 'COUNT' in q['sql']])
+
+        response = self.client.get(self.url, {'refresh': 1})
+        self.assertEqual(response.data['users_count'], 3)
+
+    def test_stale_snapshot_is_refreshed_after_the_response(self):
+        self.client.get(self.url)
+        User.objects.create_user(username='late', password='testpassword')
+        with self.settings(DASHBOARD_METRICS_MAX_AGE=-1):
+            response = self.client.get(self.url)
+        self.assertTrue(response.data['stale'])
+        self.assertEqual(response.data['users_count'], 2)
+        self.assertEqual(self.client.get(self.url).data['users_count'], 3)
+
+
+@override_settings(AI_PROVIDER='users.ai.EchoProvider', AI_MAX_CONCURRENCY=1, AI_MAX_QUEUE=0)
+class AIChatTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        reset_buckets()
+        self.student = User.objects.create_user(username='asker', password='testpassword', language='uz')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.student)}'}
+        self.url = reverse('ai-chat')
+
+    def test_reply(self):
+        response = self.client.post(self.url, {'message': 'what is a list'}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reply'], 'You asked: what is a list')
+
+    def test_repeated_question_is_answered_from_cache(self):
+        self.client.post(self.url, {'message': 'What is a list?'}, content_type='application/json', headers=self.headers)
+        response = self.client.post(self.url, {'message': 'what  is a LIST'}, content_type='application/json', headers=self.headers)
+        self.assertTrue(response.json()['cached'])
+        self.assertEqual(response.json()['reply'], 'You asked: What is a list?')
+        self.assertEqual(get_response_cache().stats()['hits'], 1)
+
+    def test_requires_token_and_message(self):
+        response = self.client.post(self.url, {'message': 'hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(self.url, {'message': '  '}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(TOKEN_BUCKET_RATES={'ai_chat': {'user': '1/min'}})
+    def test_questions_are_throttled(self):
+        self.client.post(self.url, {'message': 'one'}, content_type='application/json', headers=self.headers)
+        response = self.client.post(self.url, {'message': 'two'}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    async def test_stream_sends_deltas(self):
+        response = await self.async_client.post(
+            self.url + '?stream=1', {'message': 'what is a list'}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(body.count('event: delta'), 6)
+        self.assertIn('event: done', body)
+        # The slot is free again
+        release = await get_limiter().acquire()
+        release()
+
+    async def test_busy_when_no_slot_is_free(self):
+        release = await get_limiter().acquire()
+        try:
+            response = await self.async_client.post(
+                self.url, {'message': 'hi'}, content_type='application/json', headers=self.headers
+            )
+        finally:
+            release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+
+
+class ResponseCacheTest(TestCase):
+    def test_keys_on_language_and_evicts_least_recently_used(self):
+        replies = ResponseCache(max_entries=2, ttl=60, similarity=0)
+        replies.set('What is a list?', 'ru', 'list')
+        replies.set('What is a dict?', 'ru', 'dict')
+        self.assertEqual(replies.get('what is a list', 'ru'), 'list')
+        self.assertIsNone(replies.get('what is a list', 'uz'))
+        replies.set('What is a set?', 'ru', 'set')
+        self.assertIsNone(replies.get('what is a dict', 'ru'))
+        self.assertEqual(replies.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        replies = ResponseCache(max_entries=10, ttl=0, similarity=0)
+        replies.set('What is a list?', 'ru', 'list')
+        self.assertIsNone(replies.get('What is a list?', 'ru'))
+        self.assertEqual(replies.stats()['size'], 0)
+
+    def test_near_duplicates_share_a_reply(self):
+        replies = ResponseCache(max_entries=10, ttl=60, similarity=0.8)
+        replies.set('what is a list in python', 'ru', 'list')
+        self.assertEqual(replies.get('what is a list in python please', 'ru'), 'list')
+        self.assertIsNone(replies.get('what is a tuple in python', 'ru'))
+        self.assertEqual((replies.stats()['near_hits'], replies.stats()['misses']), (1, 1))
+
+    def test_expired_near_match_falls_back_to_next_best(self):
+        replies = ResponseCache(max_entries=10, ttl=0, similarity=0.6)
+        replies.set('what is a list in python please', 'ru', 'expired')
+        replies.ttl = 60
+        replies.set('what is a list in python', 'ru', 'list')
+        self.assertEqual(replies.get('what is a list in python please now', 'ru'), 'list')
+        self.assertEqual(replies.stats()['size'], 1)
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        reset_buckets()
+
+    @override_settings(TOKEN_BUCKET_RATES={'probe': {'user': '2/min', 'global': '3/min'}})
+    def test_user_and_global_buckets(self):
+        self.assertEqual([consume('probe', 1) for _ in range(3)][:2], [0, 0])
+        self.assertAlmostEqual(consume('probe', 1), 30, delta=1)
+        self.assertEqual(consume('probe', 2), 0)
+        # The global bucket is empty now, even for a fresh user
+        self.assertGreater(consume('probe', 3), 0)
+        self.assertEqual(consume('unconfigured', 1), 0)
+
+    @override_settings(
+        TOKEN_BUCKET_STORE='cache', TOKEN_BUCKET_RATES={'probe': {'user': '1/hour'}},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'buckets'}}
+    )
+    def test_cache_store(self):
+        self.assertEqual(consume('probe', 1), 0)
+        self.assertGreater(consume('probe', 1), 3500)
+
+
+class BulkAwardCoinsTest(APITestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='mentor', password='testpassword', role='TEACHER')
+        self.group = StudyGroup.objects.create(name='Rewarded', teacher=self.teacher)
+        self.ann = User.objects.create_user(username='ann', password='testpassword')
+        self.bob = User.objects.create_user(username='bob', password='testpassword')
+        self.outsider = User.objects.create_user(username='outsider', password='testpassword')
+        self.group.students.set([self.ann, self.bob])
+        post_entry(self.bob, 5, CoinLedgerEntry.Reason.ADJUSTMENT)
+        self.url = reverse('teacher-award-coins-bulk')
+        self.client.force_authenticate(user=self.teacher)
+
+    def test_awards_every_student_in_few_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'group_id': self.group.id, 'amount': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(award['username'], award['student_coins']) for award in response.data['awards']],
+            [('ann', 10), ('bob', 15)]
+        )
+        self.assertEqual(response.data['total'], 20)
+        # Access check, members, one UPDATE per distinct amount, ledger INSERT, balances, savepoints
+        self.assertLessEqual(len(queries), 10)
+        self.assertEqual(CoinLedgerEntry.objects.filter(reason=CoinLedgerEntry.Reason.TEACHER_AWARD).count(), 2)
+
+    def test_awards_per_student_and_rejects_outsiders(self):
+        awards = [{'student_id': self.ann.id, 'amount': 3}, {'student_id': self.outsider.id, 'amount': 3}]
+        response = self.client.post(self.url, {'group_id': self.group.id, 'awards': awards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['student_ids'], [self.outsider.id])
+        self.assertEqual(User.objects.get(pk=self.ann.pk).coins, 0)
+
+        response = self.client.post(self.url, {'group_id': self.group.id, 'awards': awards[:1]}, format='json')
+        self.assertEqual(response.data['awards'], [{'student_id': self.ann.id, 'username': 'ann', 'amount': 3, 'student_coins': 3}])
+
+    def test_other_teachers_are_refused(self):
+        other = User.objects.create_user(username='other', password='testpassword', role='TEACHER')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.url, {'group_id': self.group.id, 'amount': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(self.url, {'group_id': 999, 'amount': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_only_teachers_may_award(self):
+        admin = User.objects.create_user(username='boss', password='testpassword', role='ADMIN')
+        self.client.force_authenticate(user=admin)
+        response = self.client.post(self.url, {'group_id': self.group.id, 'amount': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(User.objects.get(pk=self.ann.pk).coins, 0)
+
+    @override_settings(COIN_AWARD_MAX_AMOUNT=50, COIN_AWARD_MAX_TOTAL=60)
+    def test_amounts_are_capped(self):
+        response = self.client.post(self.url, {'group_id': self.group.id, 'amount': 51}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        awards = [{'student_id': self.ann.id, 'amount': 40}, {'student_id': self.bob.id, 'amount': 40}]
+        response = self.client.post(self.url, {'group_id': self.group.id, 'awards': awards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(CoinLedgerEntry.objects.filter(reason=CoinLedgerEntry.Reason.TEACHER_AWARD).count(), 0)
+
+        response = self.client.post(reverse('teacher-award-coins'), {
+            'group_id': self.group.id, 'student_id': self.ann.id, 'amount': 51
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EntitlementTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.lapsed = User.objects.create_user(username='lapsed', password='testpassword', has_premium=True, premium_expires_at=now - timedelta(hours=1))
+        self.lifetime = User.objects.create_user(username='lifetime', password='testpassword', has_premium=True)
+        self.current = User.objects.create_user(username='current', password='testpassword', has_premium=True, premium_expires_at=now + timedelta(days=3))
+        self.teacher = User.objects.create_user(username='mentor', password='testpassword', role='TEACHER')
+
+    def test_entitlement_rules(self):
+        self.assertEqual(
+            [is_entitled(user) for user in (self.lapsed, self.lifetime, self.current, self.teacher)],
+            [False, True, True, True]
+        )
+
+    def test_sweep_expires_lapsed_subscriptions(self):
+        load_principal(self.lapsed.id)
+        call_command('expire_subscriptions', stdout=StringIO())
+        self.assertEqual(
+            set(User.objects.filter(has_premium=True).values_list('username', flat=True)),
+            {'lifetime', 'current'}
+        )
+        self.assertFalse(load_principal(self.lapsed.id).has_premium)
+
+    def test_status_and_purchase_agree_on_lifetime_premium(self):
+        self.client.force_authenticate(user=self.lifetime)
+        self.assertTrue(self.client.get(reverse('subscription-status')).data['has_premium'])
+        post_entry(self.lifetime, 100, CoinLedgerEntry.Reason.ADJUSTMENT)
+        response = self.client.post(reverse('subscription-purchase'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_premium_videos_are_locked(self):
+        category = EduverseCategory.objects.create(title='Python', slug='python')
+        EduverseVideo.objects.create(category=category, title='Free', video_url='https://v/free', is_premium=False)
+        EduverseVideo.objects.create(category=category, title='Paid', video_url='https://v/paid')
+
+        self.client.force_authenticate(user=self.lapsed)
+        videos = self.client.get(reverse('eduverse-video-list')).data
+        self.assertEqual([(v['title'], v['is_locked'], v['video_url']) for v in videos], [
+            ('Free', False, 'https://v/free'), ('Paid', True, None)
+        ])
+        self.client.force_authenticate(user=self.current)
+        videos = self.client.get(reverse('eduverse-category-detail', args=['python'])).data['videos']
+        self.assertEqual([v['video_url'] for v in videos], ['https://v/free', 'https://v/paid'])
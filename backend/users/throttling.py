@@ -0,0 +1,154 @@
+"""
+Token-bucket throttling of expensive endpoints.
+
+TOKEN_BUCKET_RATES maps a scope to "<n>/<period>" rates for a per-user
+bucket ('user') and one bucket shared by everyone ('global'). A bucket holds
+up to n tokens, refills at n per period and every request takes one token, so
+a client may burst n requests and then continues at the steady rate. A
+request is refused when either bucket is empty and told how long to wait.
+
+Buckets live in process memory (TOKEN_BUCKET_STORE = 'local'); checking one
+is a dict lookup under a lock. With 'cache' they are kept in the Django
+cache so all workers share them, at the cost of a cache round trip and
+without atomicity across workers: a few extra requests may slip through a
+race.
+
+DRF views use TokenBucketThrottle subclasses; async views call consume().
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+MAX_LOCAL_BUCKETS = 10000
+
+
+def parse_rate(rate):
+    """(capacity, tokens per second) of a "<n>/<period>" rate, or None for no limit"""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period]
+
+
+def _refill(bucket, capacity, per_second, now):
+    if bucket is None:
+        return float(capacity)
+    tokens, updated_at = bucket
+    return min(float(capacity), tokens + (now - updated_at) * per_second)
+
+
+class LocalBucketStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._full_at = {}
+
+    def take(self, limits):
+        """
+        Take a token from every bucket in `limits` ((key, capacity, per_second)
+        tuples), or from none of them. Returns 0 or the seconds to wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = [_refill(self._buckets.get(key), capacity, per_second, now) for key, capacity, per_second in limits]
+            wait = max(
+                [(1 - tokens) / per_second for tokens, (_, _, per_second) in zip(levels, limits) if tokens < 1],
+                default=0
+            )
+            if wait:
+                return wait
+            for tokens, (key, capacity, per_second) in zip(levels, limits):
+                self._buckets[key] = (tokens - 1, now)
+                self._full_at[key] = now + (capacity - tokens + 1) / per_second
+            if len(self._buckets) > MAX_LOCAL_BUCKETS:
+                self._prune(now)
+        return 0
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as a missing one
+        for key, full_at in list(self._full_at.items()):
+            if full_at <= now:
+                del self._buckets[key]
+                del self._full_at[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._full_at.clear()
+
+
+class CacheBucketStore:
+
+    def take(self, limits):
+        now = time.time()
+        keys = [f'token-bucket:{key}' for key, _, _ in limits]
+        stored = cache.get_many(keys)
+        levels = [
+            _refill(stored.get(cache_key), capacity, per_second, now)
+            for cache_key, (_, capacity, per_second) in zip(keys, limits)
+        ]
+        wait = max(
+            [(1 - tokens) / per_second for tokens, (_, _, per_second) in zip(levels, limits) if tokens < 1],
+            default=0
+        )
+        if wait:
+            return wait
+        for cache_key, tokens, (_, capacity, per_second) in zip(keys, levels, limits):
+            # Kept until the bucket would be full again
+            cache.set(cache_key, (tokens - 1, now), int(capacity / per_second) + 1)
+        return 0
+
+
+_local = LocalBucketStore()
+_cache_store = CacheBucketStore()
+
+
+def get_store():
+    return _cache_store if getattr(settings, 'TOKEN_BUCKET_STORE', 'local') == 'cache' else _local
+
+
+def consume(scope, ident):
+    """
+    Take a token for `ident` (user id or client address) in `scope`.
+    Returns 0 when the request may go ahead, otherwise the seconds to wait.
+    """
+    rates = getattr(settings, 'TOKEN_BUCKET_RATES', {}).get(scope, {})
+    limits = []
+    user_rate = parse_rate(rates.get('user'))
+    if user_rate:
+        limits.append((f'{scope}:user:{ident}', *user_rate))
+    global_rate = parse_rate(rates.get('global'))
+    if global_rate:
+        limits.append((f'{scope}:global', *global_rate))
+    if not limits:
+        return 0
+    return get_store().take(limits)
+
+
+def reset_buckets():
+    _local.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle over the token buckets of `scope`"""
+    scope = None
+
+    def allow_request(self, request, view):
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        self._wait = consume(self.scope, ident)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class TypingAttemptThrottle(TokenBucketThrottle):
+    scope = 'typing_attempt'
+
+
+class BlogLikeThrottle(TokenBucketThrottle):
+    scope = 'blog_like'
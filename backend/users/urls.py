@@ -4,7 +4,8 @@ from .views import (
     MeView, UserViewSet, StudyGroupViewSet,
     SubscriptionPurchaseView, SubscriptionStatusView,
     AIChatView, AttendanceViewSet, AdminStatsViewSet,
-    TeacherStatsViewSet, TeacherAwardCoinsView
+    TeacherStatsViewSet, TeacherAwardCoinsView, ActivityHeatmapView, AIChatCacheView,
+    TeacherBulkAwardCoinsView
 )
 
 router = DefaultRouter()
@@ -17,9 +18,12 @@ router.register(r'attendance', AttendanceViewSet, basename='attendance')
 
 urlpatterns = [
     path('me/', MeView.as_view(), name='me'),
+    path('me/activity/', ActivityHeatmapView.as_view(), name='me-activity'),
     path('subscription/purchase/', SubscriptionPurchaseView.as_view(), name='subscription-purchase'),
     path('subscription/status/', SubscriptionStatusView.as_view(), name='subscription-status'),
     path('ai-chat/', AIChatView.as_view(), name='ai-chat'),
+    path('ai-chat/cache/', AIChatCacheView.as_view(), name='ai-chat-cache'),
     path('teacher/award-coins/', TeacherAwardCoinsView.as_view(), name='teacher-award-coins'),
+    path('teacher/award-coins/bulk/', TeacherBulkAwardCoinsView.as_view(), name='teacher-award-coins-bulk'),
     path('', include(router.urls)),
 ]
@@ -2,29 +2,54 @@ from rest_framework import generics, viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from datetime import timedelta, datetime
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
 from django.conf import settings
-from .models import User, StudyGroup, Attendance
+from django.db import transaction
+from .models import User, StudyGroup, Attendance, CoinLedgerEntry
+from .ledger import post_entry, post_entries, InsufficientFunds
+from .entitlements import premium_active, is_entitled
+from .activity import touch, streak, heatmap
+from .schedule import next_lessons, DAY_NAMES
+from .metrics import get_metrics
+from .reports import attendance_report, invalidate_attendance_report, month_start, MAX_MONTHS
 from .serializers import UserSerializer, StudyGroupSerializer, AttendanceSerializer
-import os
-from courses.models import Course
+from .filters import StudyGroupFilter, UserFilter, AttendanceFilter
+from .pagination import UserCursorPagination
+from .exports import export_response, rows
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .ai import (
+    get_provider, get_limiter, build_prompt, next_chunk, reply_events, cached_events, ReleasingStream,
+    ProviderUnavailable, Busy
+)
+from .ai_cache import get_response_cache
+from .throttling import consume
+from .authentication import authenticate_jwt, revoke_tokens
+
+def parse_month(value):
+    """First day of a YYYY-MM month, or None when value is empty. Raises ValueError when malformed."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m').date()
 
 class MeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        today = timezone.now().date()
         
-        # Update activity streak
-        if user.last_activity_date != today:
-            if user.last_activity_date == today - timedelta(days=1):
-                user.activity_days += 1
-            else:
-                user.activity_days = 1
-            user.last_activity_date = today
-            user.save()
+        # Activity is buffered and the streak computed from it, so this view never writes
+        touch(user)
+        user.activity_days, user.last_activity_date = streak(user.pk)
             
         serializer = UserSerializer(user)
         return Response(serializer.data)
@@ -37,10 +62,33 @@ class MeView(APIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ActivityHeatmapView(APIView):
+    """Daily activity of the current user over the last year, oldest day first"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        start, days = heatmap(request.user.pk)
+        length, last_active = streak(request.user.pk)
+        return Response({
+            'start': start,
+            'end': start + timedelta(days=len(days) - 1),
+            'days': days,
+            'active_days': sum(days),
+            'streak': length,
+            'last_active': last_active
+        })
+
 class UserViewSet(viewsets.ModelViewSet):
-    """Admin viewset for managing all users"""
+    """
+    Admin viewset for managing all users.
+    The list takes ?search=, ?role=, ?group=, ?premium=, ?has_premium=, ?is_active= and
+    ?joined_after= / ?joined_before=; send ?page_size= (max 200) to get cursor pages,
+    then follow `next`.
+    """
     queryset = User.objects.all()
     permission_classes = [permissions.IsAdminUser]
+    filterset_class = UserFilter
+    pagination_class = UserCursorPagination
     
     def get_serializer_class(self):
         from .serializers import AdminUserSerializer
@@ -58,17 +106,38 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user.role = new_role
-        user.save()
+        if user.role != new_role:
+            user.role = new_role
+            user.save(update_fields=['role'])
+            revoke_tokens(user)
         
         return Response({
             'message': f'User role changed to {new_role}',
             'user': self.get_serializer(user).data
         })
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream users as CSV/XLSX; takes the list filters and ?filetype="""
+        users = self.filter_queryset(self.get_queryset()).order_by('id')
+        fields = [
+            'id', 'username', 'first_name', 'last_name', 'email', 'role', 'language', 'is_active',
+            'coins', 'points', 'has_premium', 'premium_expires_at', 'max_wpm', 'date_joined', 'last_login'
+        ]
+        return export_response(request, 'users', fields, rows(users, *fields))
+
 class StudyGroupViewSet(viewsets.ModelViewSet):
+    """
+    Study groups visible to the current user.
+    The list takes ?ordering=students_count (or name, teachers_count, id; prefix - to reverse),
+    ?min_students= / ?max_students= / ?min_teachers= / ?max_teachers=, ?is_active= and ?teacher=.
+    """
     serializer_class = StudyGroupSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = StudyGroupFilter
+    ordering_fields = ['id', 'name', 'students_count', 'teachers_count']
+    ordering = ['id']
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -78,24 +147,26 @@ class StudyGroupViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = StudyGroup.objects.select_related('teacher').prefetch_related('students', 'teachers')
+        queryset = StudyGroup.objects.select_related('teacher').with_member_counts()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related('students')
         
         if user.role == 'ADMIN':
             return queryset
         if user.role == 'TEACHER':
-            return queryset.filter(teachers=user) | queryset.filter(teacher=user)
-        return queryset.filter(students=user)
+            return queryset.taught_by(user)
+        return queryset.attended_by(user)
 
 class AdminStatsViewSet(viewsets.ViewSet):
-    """Dashboard statistics for admin"""
+    """
+    Dashboard statistics for admin, served from the latest metrics snapshot
+    (see users/metrics.py). ?refresh=1 recomputes them first.
+    """
     permission_classes = [permissions.IsAdminUser]
 
     def list(self, request):
-        return Response({
-            "users_count": User.objects.count(),
-            "courses_count": Course.objects.count(),
-            "groups_count": StudyGroup.objects.count()
-        })
+        force = request.query_params.get('refresh') in ('1', 'true')
+        return Response(get_metrics(force=force))
 
 class SubscriptionPurchaseView(APIView):
     """Purchase premium subscription for 100 coins"""
@@ -105,24 +176,21 @@ class SubscriptionPurchaseView(APIView):
         user = request.user
         
         # Check if already has active premium
-        if user.has_premium and user.premium_expires_at and user.premium_expires_at > timezone.now():
+        if premium_active(user):
             return Response(
                 {'error': 'You already have an active premium subscription'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if user has enough coins
-        if user.coins < 100:
-            return Response(
-                {'error': f'Insufficient coins. You have {user.coins} coins, need 100'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Deduct coins and activate premium
-        user.coins -= 100
-        user.has_premium = True
-        user.premium_expires_at = timezone.now() + timedelta(days=30)  # 30 days premium
-        user.save()
+        # Deduct coins and activate premium; the debit fails if the balance is too low
+        try:
+            with transaction.atomic():
+                post_entry(user, -100, CoinLedgerEntry.Reason.SUBSCRIPTION, reference='premium:30d')
+                user.has_premium = True
+                user.premium_expires_at = timezone.now() + timedelta(days=30)  # 30 days premium
+                user.save(update_fields=['has_premium', 'premium_expires_at'])
+        except InsufficientFunds as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'message': 'Premium subscription activated successfully!',
@@ -136,88 +204,117 @@ class SubscriptionStatusView(APIView):
     
     def get(self, request):
         user = request.user
-        is_active = user.has_premium and (
-            user.premium_expires_at is None or user.premium_expires_at > timezone.now()
-        )
-        
         return Response({
-            'has_premium': is_active,
+            'has_premium': premium_active(user),
+            'is_entitled': is_entitled(user),
             'expires_at': user.premium_expires_at,
             'coins': user.coins
         })
 
-class AIChatView(APIView):
-    """AI Chat integration with Gemini API"""
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def post(self, request):
-        message = request.data.get('message', '').strip()
-        
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AIChatView(View):
+    """
+    AI tutor chat (see users/ai.py): POST {"message": "..."} answers {"reply", "timestamp"}.
+    With ?stream=1 or Accept: text/event-stream the reply is streamed as server-sent
+    `delta` events followed by `done` (or `error`). Async, so serve it through config.asgi.
+    Repeated questions are answered from the reply cache (users/ai_cache.py) with "cached": true.
+    """
+
+    async def post(self, request):
+        user = await sync_to_async(authenticate_jwt)(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # The bucket and reply cache may live in a shared cache; keep their I/O off the event loop
+        wait = await sync_to_async(consume)('ai_chat', user.pk)
+        if wait:
+            response = JsonResponse({'error': 'Too many questions, slow down a little'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        message = str(data.get('message') or '').strip() if isinstance(data, dict) else ''
         if not message:
-            return Response(
-                {'error': 'Message is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
+            return JsonResponse({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        streaming = request.GET.get('stream') == '1' or 'text/event-stream' in request.headers.get('Accept', '')
+        replies = get_response_cache()
+        reply = await sync_to_async(replies.get)(message, user.language) if replies else None
+        if reply is not None:
+            if streaming:
+                return event_stream_response(cached_events(reply))
+            return JsonResponse({'reply': reply, 'timestamp': timezone.now(), 'cached': True})
+
+        async def remember(reply):
+            if replies:
+                await sync_to_async(replies.set)(message, user.language, reply)
+
         try:
-            # Import Gemini API
-            try:
-                import google.generativeai as genai
-            except ImportError:
-                print("Error: google-generativeai package not installed")
-                return Response(
-                    {'error': 'AI service configuration error (missing package)'},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            
-            # Get API key from environment
-            api_key = os.environ.get('GEMINI_API_KEY')
-            if not api_key:
-                print("Error: GEMINI_API_KEY not found in environment")
-                return Response(
-                    {'error': 'AI service is not configured (missing key)'},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            
-            # Configure and call Gemini
-            try:
-                genai.configure(api_key=api_key)
-                # Fallback to stable 'gemini-pro' model as 'gemini-1.5-flash' was not found
-                model = genai.GenerativeModel('gemini-pro')
-                
-                context = f"""You are a helpful programming tutor for MarsSpace educational platform. 
-You help students learn programming concepts in a clear and friendly way.
-Student question: {message}"""
-                
-                response = model.generate_content(context)
-                
-                if not response or not response.text:
-                   raise ValueError("Empty response from AI")
-                   
-                return Response({
-                    'reply': response.text,
-                    'timestamp': timezone.now()
-                })
-            except Exception as gen_error:
-                print(f"Gemini API Error: {gen_error}")
-                return Response(
-                    {'error': f'AI Error: {str(gen_error)}'},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            
-        except Exception as e:
-            # Catch all other errors
-            import traceback
-            traceback.print_exc()
-            print(f"AI Chat Internal Error: {str(e)}")
-            return Response(
-                {'error': f'Internal AI Error: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            provider = await sync_to_async(get_provider)()
+            release = await get_limiter().acquire()
+        except ProviderUnavailable as error:
+            return JsonResponse({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Busy as busy:
+            response = JsonResponse({'error': str(busy)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(busy.retry_after)
+            return response
+
+        # Wait for the first chunk before answering, so failures still get an error status
+        chunks = provider.stream(build_prompt(message, user.language)).__aiter__()
+        try:
+            first = await next_chunk(chunks)
+            if first is None:
+                raise ProviderUnavailable('AI Error: Empty response from AI')
+        except ProviderUnavailable as error:
+            release()
+            return JsonResponse({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if streaming:
+            return event_stream_response(ReleasingStream(reply_events(first, chunks, remember), release))
+
+        parts = [first]
+        try:
+            while (chunk := await next_chunk(chunks)) is not None:
+                parts.append(chunk)
+        except ProviderUnavailable as error:
+            return JsonResponse({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        finally:
+            release()
+        await remember(''.join(parts))
+        return JsonResponse({'reply': ''.join(parts), 'timestamp': timezone.now()})
+
+
+class AIChatCacheView(APIView):
+    """Hit/miss counters of this process's AI reply cache (GET); DELETE empties it"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        replies = get_response_cache()
+        return Response(replies.stats() if replies else {'enabled': False})
+
+    def delete(self, request):
+        replies = get_response_cache()
+        if replies:
+            replies.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class TeacherStatsViewSet(viewsets.ViewSet):
-    """Dashboard statistics for teachers and admins"""
+    """
+    Dashboard statistics for teachers and admins.
+    Pass ?upcoming=N for the next N lessons (default 5).
+    """
     permission_classes = [permissions.IsAuthenticated]
+    max_upcoming = 20
 
     def list(self, request):
         user = request.user
@@ -229,99 +326,35 @@ class TeacherStatsViewSet(viewsets.ViewSet):
             groups = StudyGroup.objects.all()
             total_students = User.objects.filter(role='STUDENT').count()
         else:
-            groups = StudyGroup.objects.filter(teachers=user) | StudyGroup.objects.filter(teacher=user)
-            groups = groups.distinct()
+            groups = StudyGroup.objects.taught_by(user)
             total_students = User.objects.filter(learning_groups__in=groups, role='STUDENT').distinct().count()
         
-        # Find next lesson
+        # Next lessons come from the lesson slot index
+        group_ids = None if user.role == 'ADMIN' else groups.values('id')
+        try:
+            upcoming_count = min(max(int(request.query_params.get('upcoming', 5)), 1), self.max_upcoming)
+        except ValueError:
+            upcoming_count = 5
         now = timezone.now()
-        current_weekday = now.weekday()  # 0=Monday, 6=Sunday
-        current_time = now.time()
-        
-        # Map day names to integers
-        day_mapping = {
-            'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3, 
-            'Friday': 4, 'Saturday': 5, 'Sunday': 6
-        }
-        
-        next_lesson = None
-        min_seconds_until = None
-        
-        for group in groups.filter(is_active=True):
-            if not group.days_of_week or not group.start_time:
-                continue
-            
-            # Normalize day input to integers
-            lesson_days = []
-            try:
-                # Provide defaults if needed
-                raw_days = group.days_of_week
-                if isinstance(raw_days, list):
-                    for d in raw_days:
-                        if isinstance(d, int):
-                            lesson_days.append(d)
-                        elif str(d) in day_mapping:
-                            lesson_days.append(day_mapping[str(d)])
-                        elif str(d).isdigit():
-                            lesson_days.append(int(d))
-                elif isinstance(raw_days, str):
-                    # Handle comma separated string
-                    parts = raw_days.split(',')
-                    for p in parts:
-                        p = p.strip()
-                        if p in day_mapping:
-                            lesson_days.append(day_mapping[p])
-                        elif p.isdigit():
-                            lesson_days.append(int(p))
-            except Exception as e:
-                print(f"Error parsing schedule for group {group.id}: {e}")
-                continue
-            
-            if not lesson_days:
-                continue
-
-            # Find next lesson day for this group
-            for day in lesson_days:
-                # Calculate days until this lesson
-                days_until = (day - current_weekday) % 7
-                
-                # If lesson is today
-                if days_until == 0:
-                    # Check if it hasn't started yet
-                    if current_time < group.start_time:
-                        # Calculate seconds until lesson starts
-                        lesson_datetime = datetime.combine(now.date(), group.start_time)
-                        now_datetime = datetime.combine(now.date(), current_time)
-                        seconds_until = int((lesson_datetime - now_datetime).total_seconds())
-                    else:
-                        # Lesson already passed today, check next week
-                        seconds_until = days_until * 86400 + 7 * 86400
-                        seconds_until += int((datetime.combine(now.date(), group.start_time) - datetime.combine(now.date(), current_time)).total_seconds())
-                else:
-                    # Lesson is in future days
-                    seconds_until = days_until * 86400
-                    # Add time difference
-                    lesson_datetime = datetime.combine(now.date(), group.start_time)
-                    now_datetime = datetime.combine(now.date(), current_time)
-                    seconds_until += int((lesson_datetime - now_datetime).total_seconds())
-                
-                # Update next_lesson if this is sooner
-                if min_seconds_until is None or seconds_until < min_seconds_until:
-                    min_seconds_until = seconds_until
-                    next_lesson = {
-                        'group_id': group.id,
-                        'group_name': group.name,
-                        'weekday': day,
-                        'day_name': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][day],
-                        'start_time': group.start_time.strftime('%H:%M'),
-                        'end_time': group.end_time.strftime('%H:%M') if group.end_time else None,
-                        'seconds_until': seconds_until
-                    }
+        upcoming = [
+            {
+                'group_id': slot.group_id,
+                'group_name': slot.group.name,
+                'weekday': slot.weekday,
+                'day_name': DAY_NAMES[slot.weekday],
+                'start_time': slot.start_time.strftime('%H:%M'),
+                'end_time': slot.end_time.strftime('%H:%M') if slot.end_time else None,
+                'starts_at': starts_at,
+                'seconds_until': int((starts_at - now).total_seconds())
+            }
+            for slot, starts_at in next_lessons(group_ids, limit=upcoming_count, now=now)
+        ]
         
         return Response({
             'total_students': total_students,
             'active_groups': groups.filter(is_active=True).count(),
-            'next_lesson': next_lesson
+            'next_lesson': upcoming[0] if upcoming else None,
+            'upcoming_lessons': upcoming
         })
 
 class AttendanceViewSet(viewsets.ModelViewSet):
@@ -329,6 +362,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filterset_class = AttendanceFilter
     
     def get_permissions(self):
         """Allow teachers and admins to create/update attendance"""
@@ -354,7 +388,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             return queryset
         
         if user.role == 'TEACHER':
-            return queryset.filter(group__in=StudyGroup.objects.filter(teachers=user) | StudyGroup.objects.filter(teacher=user))
+            return queryset.filter(group__in=StudyGroup.objects.taught_by(user).values('id'))
         
         return queryset.filter(student=user)
     
@@ -362,6 +396,54 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         # Auto-set marked_by to current user
         serializer.save(marked_by=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream attendance marks as CSV/XLSX. Takes the list filters: ?group_id=, ?date=,
+        ?date_after= / ?date_before=, ?student=, ?is_present= and ?filetype=
+        """
+        if request.user.role not in ['TEACHER', 'ADMIN']:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        marks = self.filter_queryset(self.get_queryset()).order_by('date', 'group_id', 'student_id')
+        header = ['date', 'group_id', 'group', 'student_id', 'student', 'is_present', 'marked_by', 'marked_at', 'notes']
+        data = rows(
+            marks, 'date', 'group_id', 'group__name', 'student_id', 'student__username',
+            'is_present', 'marked_by__username', 'marked_at', 'notes'
+        )
+        return export_response(request, 'attendance', header, data)
+
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Attendance matrix, rates and absence streaks of a group.
+        ?group_id=<id>&start=YYYY-MM&end=YYYY-MM (both default to the current month, at most 12 months)
+        """
+        user = request.user
+        if user.role not in ['TEACHER', 'ADMIN']:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        groups = StudyGroup.objects.all() if user.role == 'ADMIN' else StudyGroup.objects.taught_by(user)
+        try:
+            group = groups.get(id=request.query_params.get('group_id'))
+        except (StudyGroup.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        this_month = month_start(timezone.localdate())
+        try:
+            first_month = parse_month(request.query_params.get('start')) or this_month
+            last_month = parse_month(request.query_params.get('end')) or first_month
+        except ValueError:
+            return Response({'error': 'start and end must be YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        months = (last_month.year - first_month.year) * 12 + last_month.month - first_month.month + 1
+        if not 1 <= months <= MAX_MONTHS:
+            return Response(
+                {'error': f'end must not be before start and the range is limited to {MAX_MONTHS} months'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(attendance_report(group, first_month, last_month))
+
     @action(detail=False, methods=['post'])
     def mark_attendance(self, request):
         """Mark attendance for a single student with time validation"""
@@ -396,18 +478,40 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def mark_bulk(self, request):
-        """Mark attendance for multiple students at once"""
+        """
+        Mark attendance for multiple students at once.
+        Send student_ids with a shared is_present (and optional notes), or
+        records: [{"student_id": 1, "is_present": false, "notes": "sick"}, ...].
+        All rows are upserted in one transaction.
+        """
         group_id = request.data.get('group_id')
         date = request.data.get('date')
-        student_ids = request.data.get('student_ids', [])
-        is_present = request.data.get('is_present', True)
-        
-        if not all([group_id, date, student_ids]):
+        records = request.data.get('records')
+        if records is None:
+            shared = {'is_present': request.data.get('is_present', True)}
+            if 'notes' in request.data:
+                shared['notes'] = request.data['notes']
+            records = [dict(shared, student_id=student_id) for student_id in request.data.get('student_ids', [])]
+        
+        if not all([group_id, date, records]):
             return Response(
-                {'error': 'group_id, date, and student_ids are required'},
+                {'error': 'group_id, date, and student_ids (or records) are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            if parse_date(str(date)) is None:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            marks = {}
+            for record in records:
+                marks[int(record['student_id'])] = record
+        except (TypeError, KeyError, ValueError):
+            return Response({'error': 'Every record needs a numeric student_id'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             group = StudyGroup.objects.get(id=group_id)
         except StudyGroup.DoesNotExist:
@@ -426,25 +530,88 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                      {'error': 'Attendance can only be marked during class time'},
                      status=status.HTTP_400_BAD_REQUEST
                  )
-        
-        created_count = 0
-        for student_id in student_ids:
-            Attendance.objects.update_or_create(
+
+        members = set(
+            User.learning_groups.through.objects
+            .filter(studygroup_id=group.id, user_id__in=marks)
+            .values_list('user_id', flat=True)
+        )
+        outsiders = sorted(set(marks) - members)
+        if outsiders:
+            return Response(
+                {'error': 'Some students are not in this group', 'student_ids': outsiders},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = [
+            Attendance(
                 student_id=student_id,
-                group_id=group_id,
+                group=group,
                 date=date,
-                defaults={
-                    'is_present': is_present,
-                    'marked_by': request.user
-                }
+                is_present=record.get('is_present', True),
+                notes=record.get('notes') or '',
+                marked_by=request.user
             )
-            created_count += 1
-        
+            for student_id, record in marks.items()
+        ]
+        with transaction.atomic():
+            invalidate_attendance_report(group.id, [date])
+            existing = set(
+                Attendance.objects
+                .filter(group=group, date=date, student_id__in=marks)
+                .values_list('student_id', flat=True)
+            )
+            # Records without notes keep the notes already stored
+            for with_notes in (True, False):
+                batch = [row for row in rows if ('notes' in marks[row.student_id]) == with_notes]
+                if batch:
+                    Attendance.objects.bulk_create(
+                        batch,
+                        update_conflicts=True,
+                        unique_fields=['student', 'group', 'date'],
+                        update_fields=['is_present', 'marked_by', 'notes'] if with_notes else ['is_present', 'marked_by']
+                    )
+
         return Response({
-            'message': f'Attendance marked for {created_count} students',
-            'count': created_count
+            'message': f'Attendance marked for {len(rows)} students',
+            'count': len(rows),
+            'inserted': len(rows) - len(existing),
+            'updated': len(existing),
+            'records': [
+                {'student_id': row.student_id, 'is_present': row.is_present, 'created': row.student_id not in existing}
+                for row in rows
+            ]
         })
 
+def check_group_access(user, group_id):
+    """None when user teaches the group, otherwise the error response"""
+    try:
+        if StudyGroup.objects.taught_by(user).filter(id=group_id).exists():
+            return None
+        exists = StudyGroup.objects.filter(id=group_id).exists()
+    except (ValueError, TypeError):
+        exists = False
+    if not exists:
+        return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'error': 'You do not have access to this group'}, status=status.HTTP_403_FORBIDDEN)
+
+
+def parse_award_amount(value):
+    """(amount, None) for a valid coin award, otherwise (None, error response)"""
+    try:
+        amount = int(value)
+    except (ValueError, TypeError):
+        return None, Response({'error': 'Invalid amount'}, status=status.HTTP_400_BAD_REQUEST)
+    if amount <= 0:
+        return None, Response({'error': 'Amount must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+    if amount > settings.COIN_AWARD_MAX_AMOUNT:
+        return None, Response(
+            {'error': f'Amount may not exceed {settings.COIN_AWARD_MAX_AMOUNT} coins'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return amount, None
+
+
 class TeacherAwardCoinsView(APIView):
     """Allow teachers to award coins to students"""
     permission_classes = [permissions.IsAuthenticated]
@@ -466,52 +633,120 @@ class TeacherAwardCoinsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            amount = int(amount)
-            if amount <= 0:
-                return Response(
-                    {'error': 'Amount must be positive'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except (ValueError, TypeError):
-            return Response(
-                {'error': 'Invalid amount'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        amount, invalid = parse_award_amount(amount)
+        if invalid:
+            return invalid
         
-        # Verify teacher has access to this group
-        try:
-            group = StudyGroup.objects.get(id=group_id)
-            if group.teacher != request.user and request.user not in group.teachers.all():
-                return Response(
-                    {'error': 'You do not have access to this group'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        except StudyGroup.DoesNotExist:
-            return Response(
-                {'error': 'Group not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        denied = check_group_access(request.user, group_id)
+        if denied:
+            return denied
         
         # Verify student exists and is in the group
         try:
             student = User.objects.get(id=student_id)
-            if group not in student.learning_groups.all():
-                return Response(
-                    {'error': 'Student is not in this group'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except User.DoesNotExist:
+        except (User.DoesNotExist, ValueError, TypeError):
             return Response(
                 {'error': 'Student not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        if not User.learning_groups.through.objects.filter(studygroup_id=group_id, user_id=student.id).exists():
+            return Response(
+                {'error': 'Student is not in this group'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Award coins
-        student.coins += amount
-        student.save()
+        post_entry(student, amount, CoinLedgerEntry.Reason.TEACHER_AWARD, reference=f'teacher:{request.user.id}')
         
         return Response({
             'message': f'Successfully awarded {amount} coins to {student.username}',
             'student_coins': student.coins
         })
+
+
+class TeacherBulkAwardCoinsView(APIView):
+    """
+    Award coins to many students of a group at once:
+    {"group_id": 1, "awards": [{"student_id": 2, "amount": 10}, ...]} or
+    {"group_id": 1, "amount": 5} for every student of the group.
+    All awards are posted in one transaction and the new balances are returned.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'TEACHER':
+            return Response({'error': 'Only teachers can award coins'}, status=status.HTTP_403_FORBIDDEN)
+
+        group_id = request.data.get('group_id')
+        awards = request.data.get('awards')
+        if not group_id or (awards is None and request.data.get('amount') is None):
+            return Response(
+                {'error': 'group_id and awards (or amount) are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        denied = check_group_access(request.user, group_id)
+        if denied:
+            return denied
+
+        try:
+            if awards is None:
+                amount, invalid = parse_award_amount(request.data.get('amount'))
+                if invalid:
+                    return invalid
+                student_ids = User.learning_groups.through.objects.filter(studygroup_id=group_id).values_list('user_id', flat=True)
+                amounts = {student_id: amount for student_id in student_ids}
+            else:
+                amounts = {}
+                for award in awards:
+                    student_id = int(award['student_id'])
+                    if student_id in amounts:
+                        return Response(
+                            {'error': 'Each student may appear only once', 'student_id': student_id},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    amounts[student_id], invalid = parse_award_amount(award['amount'])
+                    if invalid:
+                        invalid.data['student_id'] = student_id
+                        return invalid
+        except (TypeError, KeyError, ValueError):
+            return Response(
+                {'error': 'Every award needs a numeric student_id and amount'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not amounts:
+            return Response({'error': 'No students to award'}, status=status.HTTP_400_BAD_REQUEST)
+        if sum(amounts.values()) > settings.COIN_AWARD_MAX_TOTAL:
+            return Response(
+                {'error': f'A bulk award may not exceed {settings.COIN_AWARD_MAX_TOTAL} coins in total'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if awards is not None:
+            members = set(
+                User.learning_groups.through.objects
+                .filter(studygroup_id=group_id, user_id__in=amounts)
+                .values_list('user_id', flat=True)
+            )
+            outsiders = sorted(set(amounts) - members)
+            if outsiders:
+                return Response(
+                    {'error': 'Some students are not in this group', 'student_ids': outsiders},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        with transaction.atomic():
+            post_entries(amounts, CoinLedgerEntry.Reason.TEACHER_AWARD, reference=f'teacher:{request.user.id}')
+            balances = list(User.objects.filter(id__in=amounts).order_by('id').values_list('id', 'username', 'coins'))
+
+        total = sum(amounts.values())
+        return Response({
+            'message': f'Successfully awarded {total} coins to {len(amounts)} students',
+            'count': len(amounts),
+            'total': total,
+            'awards': [
+                {'student_id': student_id, 'username': username, 'amount': amounts[student_id], 'student_coins': coins}
+                for student_id, username, coins in balances
+            ]
+        })